@@ -0,0 +1,144 @@
+import collections
+import json
+import os
+import sys
+
+from ._budget import format_size
+from ._core import LambdaPackage
+from . import _dists, _files, _importtime
+
+#: What imports from the standard library are attributed to.
+STDLIB = '(stdlib)'
+
+DistributionCost = collections.namedtuple(
+    'DistributionCost', 'name cumulative_us self_us modules size')
+DistributionCost.__doc__ = """
+What a distribution costs a Lambda function.  ``cumulative_us`` is
+the microseconds spent importing its modules, including the modules
+of other distributions they import; ``self_us`` excludes every
+module but its own.  ``modules`` is how many of its modules were
+imported, and ``size`` how many bytes it takes up in the staging
+directory.
+"""
+
+
+def module_owners(owners):
+    """
+    Map the names of top-level modules and packages to the names of
+    the distributions that installed them, given ``owners`` from
+    :py:func:`betareduce._dists.top_level_owners`.
+    """
+    return {top.split('.', 1)[0]: name for top, name in owners.items()
+            if not top.endswith('.dist-info')}
+
+
+def parents(costs):
+    """
+    Returns the name of the module that imported each of ``costs``,
+    in the order ``python -X importtime`` reports them, or
+    :py:class:`None` for the module imported directly.  Each module is
+    reported after those it imports, so its parent is the next one
+    reported one level up.
+    """
+    latest = {}
+    found = []
+    for cost in reversed(costs):
+        found.append(latest.get(cost.depth - 1))
+        latest[cost.depth] = cost.module
+    return found[::-1]
+
+
+def attribute(module, modules,
+              _stdlib=getattr(sys, 'stdlib_module_names',
+                              sys.builtin_module_names)):
+    """
+    Returns the name of the distribution that ``module`` belongs to,
+    according to ``modules`` from :py:func:`module_owners`, or
+    :py:data:`STDLIB`.  Modules no distribution claims are attributed
+    to their top-level package, as with
+    :py:func:`betareduce._dists.owner`.
+    """
+    top = module.split('.', 1)[0]
+    if top in modules:
+        return modules[top]
+    if top in _stdlib:
+        return STDLIB
+    return top
+
+
+def analyze(root, fqpn, interpreter=None,
+            _measure=_importtime.measure,
+            _find_distributions=_dists.find_distributions,
+            _scan=_files.scan):
+    """
+    Import the module of the handler that ``fqpn`` names from the
+    staging directory ``root`` with
+    :py:func:`betareduce._importtime.measure`, and rank the
+    distributions there by how much of the import they account for.
+
+    :param interpreter: (optional) passed to
+        :py:func:`betareduce._importtime.measure`.
+
+    :raises ValueError: ...when given an invalid FQPN.
+    :raises subprocess.CalledProcessError: ...when the module can't be
+        imported.
+
+    :returns: a 2-tuple of the :py:class:`list` of
+        :py:class:`betareduce._importtime.ImportCost` measured and a
+        :py:class:`list` of :py:class:`DistributionCost`, one for each
+        distribution that was imported or takes up space, by
+        ``cumulative_us`` and then ``size``, most expensive first.
+    """
+    module, _ = LambdaPackage(root, fqpn).split_fqpn(fqpn)
+    costs = _measure(root, module, interpreter=interpreter)
+    owners = _dists.top_level_owners(_find_distributions(root))
+    modules = module_owners(owners)
+    totals = collections.defaultdict(lambda: [0, 0, 0, 0])
+    for cost, parent in zip(costs, parents(costs)):
+        name = attribute(cost.module, modules)
+        total = totals[name]
+        if parent is None or attribute(parent, modules) != name:
+            total[0] += cost.cumulative_us
+        total[1] += cost.self_us
+        total[2] += 1
+    for record in _scan(root):
+        # unclaimed files are attributed to the module they'd be
+        # imported as, as unclaimed imports are.
+        top = record.arcname.split(os.sep, 1)[0]
+        totals[owners.get(top, top.split('.', 1)[0])][3] += record.size
+    rows = [DistributionCost(name, *total) for name, total in totals.items()]
+    rows.sort(key=lambda row: (-row.cumulative_us, -row.size, row.name))
+    return costs, rows
+
+
+def format_report(module, costs, rows, top=None):
+    """
+    Returns a report of ``rows`` from :py:func:`analyze`, importing
+    which took the time ``costs`` records for ``module``, as a
+    :py:class:`str` table.  With ``top``, only that many rows are
+    shown.
+    """
+    total = sum(cost.cumulative_us for cost in costs if cost.depth == 1)
+    lines = ['importing %s took %.1f ms' % (module, total / 1000.0),
+             '%-30s %13s %10s %8s %12s' % ('distribution', 'cumulative ms',
+                                           'self ms', 'modules', 'size')]
+    for row in rows[:top]:
+        lines.append('%-30s %13.1f %10.1f %8d %12s'
+                     % (row.name, row.cumulative_us / 1000.0,
+                        row.self_us / 1000.0, row.modules,
+                        format_size(row.size)))
+    return '\n'.join(lines) + '\n'
+
+
+def dump_report(module, costs, rows, fileobj, top=None):
+    """
+    Write ``rows`` from :py:func:`analyze`, and the ``top`` most
+    expensive of ``costs`` by cumulative time, into ``fileobj`` as
+    JSON.
+    """
+    json.dump({'module': module,
+               'distributions': [row._asdict() for row in rows[:top]],
+               'imports': [cost._asdict() for cost in
+                           _importtime.heaviest(costs, top or len(costs))]},
+              fileobj, indent=2)
+    fileobj.write('\n')
@@ -0,0 +1,170 @@
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import logging
+import subprocess
+import threading
+
+from ._core import LambdaPackage, create
+
+logger = logging.getLogger(__name__)
+
+#: How many of the last lines a command writes are kept, to be
+#: attached to the :py:exc:`subprocess.CalledProcessError` raised if
+#: it fails.
+TAIL_LINES = 200
+
+
+async def run_logged(cmd,
+                     _create_subprocess_exec=asyncio.create_subprocess_exec,
+                     _logger=logger):
+    """
+    Run ``cmd`` without blocking the event loop, logging each line of
+    its standard output and error as it's written.  If the coroutine
+    is cancelled, the command is killed.
+
+    :raises subprocess.CalledProcessError: ...when ``cmd`` fails,
+        with the last :py:data:`TAIL_LINES` lines of its output.
+    """
+    process = await _create_subprocess_exec(*cmd, stdout=subprocess.PIPE,
+                                            stderr=subprocess.STDOUT)
+    tail = collections.deque(maxlen=TAIL_LINES)
+    try:
+        async for line in process.stdout:
+            tail.append(line)
+            _logger.info("%s: %s", cmd[0],
+                         line.decode('utf-8', 'replace').rstrip())
+        returncode = await process.wait()
+    except asyncio.CancelledError:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+        await process.wait()
+        raise
+    _logger.info("command: %s, exited with %d", cmd, returncode)
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd,
+                                            output=b''.join(tail))
+
+
+class CommandRunner(object):
+    """
+    Runs commands for threads other than the event loop's with
+    :py:func:`run_logged` on ``loop``, and cancels them all at once.
+
+    :param loop: the event loop to run commands on.
+    :type loop: :py:class:`asyncio.AbstractEventLoop`
+    """
+
+    def __init__(self, loop, _run_logged=run_logged):
+        self.loop = loop
+        #: whether :py:meth:`cancel` has been called.
+        self.cancelled = False
+        self._run_logged = _run_logged
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def run(self, cmd):
+        """
+        Run ``cmd`` on the event loop and wait for it to finish.
+
+        :raises concurrent.futures.CancelledError: ...when the runner
+            was cancelled before or while ``cmd`` ran.
+        :raises subprocess.CalledProcessError: ...when ``cmd`` fails.
+        """
+        with self._lock:
+            if self.cancelled:
+                raise concurrent.futures.CancelledError()
+            future = asyncio.run_coroutine_threadsafe(
+                self._run_logged(cmd), self.loop)
+            self._futures.add(future)
+        try:
+            return future.result()
+        finally:
+            with self._lock:
+                self._futures.discard(future)
+
+    def cancel(self):
+        """
+        Kill the commands that are running and refuse to run more.
+        """
+        with self._lock:
+            self.cancelled = True
+            for future in self._futures:
+                future.cancel()
+
+
+class RunnerPackage(LambdaPackage):
+    """
+    A :py:class:`betareduce._core.LambdaPackage` that runs ``pip
+    install`` and ``compileall`` with a :py:class:`CommandRunner`.
+
+    :param runner: the runner.
+    :type runner: :py:class:`CommandRunner`
+    """
+
+    def __init__(self, root, fqpn, runner):
+        super(RunnerPackage, self).__init__(root, fqpn)
+        self.runner = runner
+
+    def install(self, args):
+        self.runner.run(self.install_command(args))
+
+    def compile_bytecode(self, interpreter=None, sourceless=False,
+                         unchecked_hash=False):
+        self.runner.run(self.compile_command(
+            interpreter=interpreter, sourceless=sourceless,
+            unchecked_hash=unchecked_hash))
+
+
+async def async_create(fileobj, pip_args, fqpn, executor=None,
+                       _create=create, _CommandRunner=CommandRunner,
+                       _RunnerPackage=RunnerPackage, **kwargs):
+    """
+    A coroutine that creates a Lambda package as
+    :py:func:`betareduce._core.create` does, without blocking the
+    event loop, so that one process can build many packages at once.
+
+    :py:func:`betareduce._core.create` runs in ``executor``, but
+    ``pip install`` and ``compileall`` run on the event loop with
+    :py:func:`run_logged`, which logs their output line by line.
+    Wheelhouse and sync installs, which run ``pip`` several times,
+    stay in the executor.
+
+    If the coroutine is cancelled, running commands are killed, the
+    build stops before the next one starts, and the temporary
+    directory, if any, is removed before the cancellation propagates.
+    Compression can't be interrupted, so a build cancelled while
+    compressing stops once the package is written.
+
+    :param executor: (optional) the
+        :py:class:`concurrent.futures.Executor` to build in.  Defaults
+        to the event loop's default executor.
+
+    The remaining parameters are as for
+    :py:func:`betareduce._core.create`, which see.
+
+    :returns: a :py:class:`zipfile.ZipFile` object representing the
+        package.
+    """
+    loop = asyncio.get_running_loop()
+    runner = _CommandRunner(loop)
+    future = loop.run_in_executor(executor, functools.partial(
+        _create, fileobj, pip_args, fqpn,
+        _LambdaPackage=functools.partial(_RunnerPackage, runner=runner),
+        **kwargs))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        runner.cancel()
+        # the build must finish cleaning up before anything else
+        # touches fileobj or the staging directory.
+        try:
+            zip_obj = await future
+        except BaseException:
+            pass
+        else:
+            zip_obj.close()
+        raise
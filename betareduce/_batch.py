@@ -0,0 +1,214 @@
+import collections
+import concurrent.futures
+import json
+import logging
+import os
+
+from ._cache import DEFAULT_MAX_SIZE, cache_key
+from ._core import (LambdaPackage, automatic_tempdir, check_compile_bytecode,
+                    check_prewarm, prepare, write_package)
+from ._dedup import check_dedup
+from ._filters import resolve_rules
+from ._incremental import file_digest
+from . import _files, _zip
+
+logger = logging.getLogger(__name__)
+
+#: The default number of bytes of compressed members
+#: :py:class:`SharedCompression` holds in memory.
+DEFAULT_SHARED_SIZE = 1024 * 1024 * 256
+
+Entry = collections.namedtuple('Entry', 'outfile fqpn pip_args')
+Entry.__doc__ = """
+A package to build: the path ``outfile`` to write it to, the FQPN of
+its handler function, and the arguments to pass ``pip install``.
+"""
+
+
+def read_manifest(path):
+    """
+    Read the batch manifest at ``path``: a JSON list of objects, each
+    with an ``"outfile"``, an ``"fqpn"``, and a list of
+    ``"requirements"`` to pass ``pip install``, e.g.::
+
+        [{"outfile": "orders.zip",
+          "fqpn": "orders.handlers.handle",
+          "requirements": ["-r", "requirements.txt", "./orders"]}]
+
+    :raises ValueError: ...when the manifest is malformed.
+
+    :returns: a :py:class:`list` of :py:class:`Entry`
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, list):
+        raise ValueError("%s: manifest must be a list of packages" % (path,))
+    entries = []
+    for number, item in enumerate(manifest):
+        try:
+            entry = Entry(outfile=item['outfile'],
+                          fqpn=item['fqpn'],
+                          pip_args=list(item['requirements']))
+        except (KeyError, TypeError):
+            raise ValueError('%s: package %d needs an "outfile", an "fqpn"'
+                             ' and a list of "requirements"'
+                             % (path, number))
+        entries.append(entry)
+    outfiles = [entry.outfile for entry in entries]
+    duplicates = sorted(set(outfile for outfile in outfiles
+                            if outfiles.count(outfile) > 1))
+    if duplicates:
+        raise ValueError("%s: more than one package is written to %s"
+                         % (path, ', '.join(duplicates)))
+    return entries
+
+
+def group_entries(entries, _cache_key=cache_key):
+    """
+    Group ``entries`` whose ``pip`` arguments would install the same
+    staging tree, as identified by
+    :py:func:`betareduce._cache.cache_key`.
+
+    :returns: a :py:class:`collections.OrderedDict` mapping keys to
+        :py:class:`list`\\ s of :py:class:`Entry`, in the order each
+        key first appears in ``entries``.
+    """
+    groups = collections.OrderedDict()
+    for entry in entries:
+        groups.setdefault(_cache_key(entry.pip_args), []).append(entry)
+    return groups
+
+
+class SharedCompression(_zip.CompressionCache):
+    """
+    A :py:class:`betareduce._zip.CompressionCache` shared between the
+    archives of a batch, so that a file common to several packages is
+    compressed only once.  Members are identified by their contents,
+    so identical files in different staging directories are shared
+    too.  It can be passed to
+    :py:meth:`betareduce._core.LambdaPackage.to_zipfile` as
+    ``compressor``.
+
+    :param max_size: (optional) the most bytes of compressed data to
+        hold in memory.  Once it's reached, further members are
+        compressed as usual but not shared.
+    :type max_size: :py:class:`int`
+    """
+
+    def __init__(self, max_size=DEFAULT_SHARED_SIZE, _digest=file_digest):
+        super(SharedCompression, self).__init__(max_size)
+        self._digest = _digest
+        self._digests = {}
+
+    def key(self, filename):
+        stat_result = _files.stat(filename)
+        identity = (os.path.abspath(filename), stat_result.st_size,
+                    stat_result.st_mtime)
+        digest = self._digests.get(identity)
+        if digest is None:
+            digest = self._digests[identity] = self._digest(filename)
+        return digest
+
+
+def build_all(entries, workers=1, exclude_extension_modules=True,
+              cache_dir=None, cache_max_size=DEFAULT_MAX_SIZE,
+              compile_bytecode=None, bytecode_interpreter=None,
+              unchecked_hash=False, wheelhouse=None, target=None, strip=(),
+              deterministic=False, shared_max_size=DEFAULT_SHARED_SIZE,
+              _automatic_tempdir=automatic_tempdir,
+              _LambdaPackage=LambdaPackage,
+              _group_entries=group_entries,
+              _prepare=prepare, _write_package=write_package,
+              _SharedCompression=SharedCompression,
+              _Executor=concurrent.futures.ThreadPoolExecutor,
+              _open=open, _remove=os.remove,
+              _source_date_time=_zip.source_date_time,
+              _logger=logger, **options):
+    """
+    Build every package in ``entries``.  Packages with the same
+    dependencies share one staging directory, so their requirements
+    are installed once, and every package shares compressed members
+    with the others.  Up to ``workers`` staging directories are
+    installed and packaged concurrently.
+
+    A package that fails to build is removed, and the first failure
+    is raised once every other package has been built.
+
+    :param entries: the packages to build.
+    :type entries: iterable of :py:class:`Entry`
+    :param workers: (optional) the number of staging directories to
+        install and package concurrently.
+    :type workers: :py:class:`int`
+    :param shared_max_size: (optional) the most bytes of compressed
+        members to hold in memory for sharing.
+    :type shared_max_size: :py:class:`int`
+
+    The remaining parameters are as for
+    :py:func:`betareduce._core.create`, which see.
+
+    :returns: a :py:class:`list` of the paths of the packages built.
+    """
+    check_compile_bytecode(compile_bytecode, target=target,
+                           bytecode_interpreter=bytecode_interpreter)
+    check_prewarm(options.get('lazy_handler', False),
+                  options.get('prewarm', ()))
+    if options.get('compression') is not None:
+        _zip.compression_preset(options['compression'])
+    if options.get('layout') is not None:
+        _zip.layout_class(options['layout'])
+    check_dedup(options.get('dedup'), layout=options.get('layout'))
+    options['strip_rules'] = resolve_rules(
+        strip, keep_bytecode=compile_bytecode == 'both')
+    options['target'] = target
+    if deterministic:
+        options['date_time'] = _source_date_time()
+    groups = _group_entries(entries)
+    shared = _SharedCompression(max_size=shared_max_size)
+
+    def build_group(group):
+        built = []
+        errors = []
+        with _automatic_tempdir() as root_dir:
+            package = _LambdaPackage(root=root_dir, fqpn=group[0].fqpn)
+            _prepare(package, group[0].pip_args,
+                     cache_dir=cache_dir, cache_max_size=cache_max_size,
+                     compile_bytecode=compile_bytecode,
+                     bytecode_interpreter=bytecode_interpreter,
+                     unchecked_hash=unchecked_hash, wheelhouse=wheelhouse,
+                     target=target)
+            for entry in group:
+                package = _LambdaPackage(root=root_dir, fqpn=entry.fqpn)
+                try:
+                    with _open(entry.outfile, 'wb') as fileobj:
+                        _write_package(
+                            package, fileobj,
+                            exclude_extension_modules=(
+                                exclude_extension_modules),
+                            compressor=shared,
+                            sourceless=compile_bytecode == 'sourceless',
+                            **options).close()
+                except Exception as e:
+                    _logger.error("failed to build %s: %s", entry.outfile, e)
+                    _remove(entry.outfile)
+                    errors.append(e)
+                else:
+                    built.append(entry.outfile)
+        return built, errors
+
+    built = []
+    errors = []
+    with _Executor(max_workers=workers) as executor:
+        futures = [executor.submit(build_group, group)
+                   for group in groups.values()]
+        for future in futures:
+            try:
+                group_built, group_errors = future.result()
+            except Exception as e:
+                group_built, group_errors = [], [e]
+            built.extend(group_built)
+            errors.extend(group_errors)
+    _logger.info("built %d packages from %d installs; shared %d"
+                 " compressed members", len(built), len(groups), shared.hits)
+    if errors:
+        raise errors[0]
+    return built
@@ -0,0 +1,297 @@
+import argparse
+import collections
+import functools
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from ._core import LambdaPackage
+from ._filters import StripFilter, resolve_rules
+from ._zip import COMPRESSION_PRESETS
+
+Shape = collections.namedtuple(
+    'Shape', 'directories depth files file_size huge_files huge_size'
+    ' extensions')
+Shape.__doc__ = """
+The shape of a synthetic staging tree: ``directories`` top-level
+packages, each nested ``depth`` deep, with ``files`` modules of about
+``file_size`` bytes at each level and ``extensions`` extension
+modules beside them, plus ``huge_files`` data files of ``huge_size``
+bytes at the top.
+"""
+
+#: The shapes of staging tree to benchmark, by name.
+SHAPES = collections.OrderedDict([
+    ('small-files', Shape(directories=40, depth=2, files=50, file_size=512,
+                          huge_files=0, huge_size=0, extensions=0)),
+    ('huge-files', Shape(directories=2, depth=1, files=5, file_size=4096,
+                         huge_files=4, huge_size=16 * 1024 ** 2,
+                         extensions=0)),
+    ('deep', Shape(directories=4, depth=12, files=8, file_size=1024,
+                   huge_files=0, huge_size=0, extensions=0)),
+    ('extensions', Shape(directories=20, depth=2, files=10, file_size=1024,
+                         huge_files=0, huge_size=0, extensions=10)),
+])
+
+#: Results that take this much longer than the previous commit's are
+#: reported as regressions.
+DEFAULT_THRESHOLD = 0.2
+
+_WORDS = ('def', 'return', 'self', 'import', 'class', 'value', 'None',
+          'for', 'in', 'if', 'else', 'yield', 'lambda', 'path', '=', '(',
+          ')', ':', '\n    ', '\n')
+
+
+def _source(rng, size):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words).encode('ascii')[:size]
+
+
+def make_tree(root, shape, seed=0):
+    """
+    Write a synthetic staging tree of ``shape`` under ``root``.  The
+    tree is the same for the same ``shape`` and ``seed``: modules hold
+    compressible, source-like text, and extension modules and huge
+    files incompressible bytes.
+
+    :returns: the number of files written.
+    """
+    rng = random.Random(seed)
+    written = 0
+    suffix = LambdaPackage.BINARY_SUFFIXES[0]
+    for package in range(shape.directories):
+        directory = os.path.join(root, 'package%d' % (package,))
+        for level in range(shape.depth):
+            os.makedirs(directory)
+            for module in range(shape.files):
+                path = os.path.join(directory, 'module%d.py' % (module,))
+                with open(path, 'wb') as f:
+                    f.write(_source(rng, shape.file_size))
+            for extension in range(shape.extensions):
+                path = os.path.join(directory,
+                                    '_native%d%s' % (extension, suffix))
+                with open(path, 'wb') as f:
+                    f.write(rng.randbytes(shape.file_size))
+            written += shape.files + shape.extensions
+            directory = os.path.join(directory, 'level%d' % (level,))
+    for huge in range(shape.huge_files):
+        with open(os.path.join(root, 'data%d.bin' % (huge,)), 'wb') as f:
+            for _ in range(shape.huge_size // (1024 * 1024)):
+                f.write(rng.randbytes(1024 * 1024))
+        written += 1
+    return written
+
+
+def _files(package):
+    list(package.files())
+
+
+def _filters(package):
+    strip = StripFilter(package.root, resolve_rules(['aggressive']))
+    for record in package.files():
+        package.not_extension_module(record) and strip(record)
+
+
+def _relativize_path(package):
+    for record in package.files():
+        package.relativize_path(record)
+
+
+def _to_zipfile(package, preset='stored', jobs=1):
+    fileobj = io.BytesIO()
+    compression, compresslevel = COMPRESSION_PRESETS[preset]
+    package.to_zipfile(fileobj, filter=package.not_extension_module,
+                       jobs=jobs, compression=compression,
+                       compresslevel=compresslevel).close()
+    return len(fileobj.getvalue())
+
+
+#: The benchmarks to run on each shape, by name.  Those that write an
+#: archive return its size.
+BENCHMARKS = collections.OrderedDict([
+    ('files', _files),
+    ('filters', _filters),
+    ('relativize_path', _relativize_path),
+    ('to_zipfile', _to_zipfile),
+    ('to_zipfile-jobs4', lambda package: _to_zipfile(package, jobs=4)),
+] + [('to_zipfile-%s' % (preset,),
+      functools.partial(_to_zipfile, preset=preset, jobs=4))
+     for preset in COMPRESSION_PRESETS if preset != 'stored'])
+
+
+def best_time(function, repeat, _clock=time.perf_counter):
+    """
+    Returns the fewest seconds any of ``repeat`` calls to
+    ``function`` took, and what the last returned.
+    """
+    times = []
+    for _ in range(repeat):
+        start = _clock()
+        returned = function()
+        times.append(_clock() - start)
+    return min(times), returned
+
+
+def current_commit(_check_output=subprocess.check_output):
+    """
+    Returns the commit checked out in the working directory, or
+    :py:class:`None` outside a Git repository.
+    """
+    try:
+        output = _check_output(['git', 'rev-parse', 'HEAD'],
+                               stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('ascii').strip()
+
+
+def run(shapes=SHAPES, benchmarks=tuple(BENCHMARKS), repeat=3,
+        commit=None, _mkdtemp=tempfile.mkdtemp, _rmtree=shutil.rmtree):
+    """
+    Run ``benchmarks`` on a staging tree of each of ``shapes``.
+
+    :param shapes: (optional) the shapes of tree to benchmark.
+    :type shapes: a mapping of names to :py:class:`Shape`
+    :param benchmarks: (optional) the names of the benchmarks in
+        :py:data:`BENCHMARKS` to run.
+    :type benchmarks: iterable of :py:class:`str`
+
+    :returns: a :py:class:`list` of results, each a :py:class:`dict`
+        with the ``commit``, ``shape``, ``benchmark``, best
+        ``seconds`` of ``repeat`` runs, ``files`` in the tree, and
+        for benchmarks that write an archive, its size in ``bytes``.
+    """
+    results = []
+    for shape in shapes:
+        root = _mkdtemp(prefix='betareduce-bench-')
+        try:
+            files = make_tree(root, shapes[shape])
+            package = LambdaPackage(root, 'package0.module0.handler')
+            for benchmark in benchmarks:
+                function = BENCHMARKS[benchmark]
+                seconds, size = best_time(lambda: function(package), repeat)
+                results.append({'commit': commit, 'shape': shape,
+                                'benchmark': benchmark, 'seconds': seconds,
+                                'files': files, 'bytes': size,
+                                'python': sys.version.split()[0]})
+        finally:
+            _rmtree(root)
+    return results
+
+
+def read_results(path):
+    """
+    Returns the results recorded in the JSON lines file at ``path``,
+    or an empty :py:class:`list` if there is none.
+    """
+    try:
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except (IOError, OSError):
+        return []
+
+
+def compare(results, history, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare ``results`` with the most recent of ``history`` for a
+    different commit.
+
+    :returns: a 2-tuple of a :py:class:`list` of ``(result,
+        previous, ratio)`` 3-tuples, one for each result with a
+        previous result for the same shape and benchmark, where
+        ``ratio`` is how many times longer it took, and a
+        :py:class:`list` of those whose ratio exceeds ``1 +
+        threshold``.
+    """
+    previous = {}
+    for result in history:
+        if result['commit'] != results[0]['commit']:
+            previous[result['shape'], result['benchmark']] = result
+    compared = []
+    for result in results:
+        before = previous.get((result['shape'], result['benchmark']))
+        if before is not None and before['seconds'] > 0:
+            compared.append((result, before,
+                             result['seconds'] / before['seconds']))
+    regressions = [comparison for comparison in compared
+                   if comparison[2] > 1 + threshold]
+    return compared, regressions
+
+
+parser = argparse.ArgumentParser(
+    description="Benchmark the packaging pipeline on synthetic staging"
+    " trees.")
+parser.add_argument('-s', '--shape',
+                    action='append',
+                    choices=list(SHAPES),
+                    help='benchmark this shape of tree; may be repeated.'
+                    ' Defaults to all of them.')
+parser.add_argument('-b', '--benchmark',
+                    action='append',
+                    choices=list(BENCHMARKS),
+                    help='run this benchmark; may be repeated.  Defaults'
+                    ' to all of them.')
+parser.add_argument('-r', '--repeat',
+                    type=int,
+                    default=3,
+                    help='run each benchmark this many times and keep the'
+                    ' best.')
+parser.add_argument('-o', '--output',
+                    help='append results to this JSON lines file and'
+                    ' compare them with the previous commit\'s there.')
+parser.add_argument('--threshold',
+                    type=float,
+                    default=DEFAULT_THRESHOLD,
+                    help='fail if a benchmark takes this fraction longer'
+                    ' than at the previous commit, e.g. 0.2.')
+
+
+def main(_argv=sys.argv[1:], _run=run, _current_commit=current_commit,
+         _stdout=sys.stdout):
+    """
+    Benchmark the packaging pipeline on synthetic staging trees, so
+    that it needs neither ``pip`` nor a network connection.  With
+    ``--output``, results are appended to a file, keyed by the
+    current commit, and compared with the most recent results there
+    for another commit, failing if any regressed.
+    """
+    args = parser.parse_args(_argv)
+    shapes = collections.OrderedDict((name, SHAPES[name])
+                                     for name in args.shape or SHAPES)
+    results = _run(shapes=shapes,
+                   benchmarks=args.benchmark or tuple(BENCHMARKS),
+                   repeat=args.repeat, commit=_current_commit())
+    for result in results:
+        _stdout.write('%-12s %-22s %10.4fs %s\n'
+                      % (result['shape'], result['benchmark'],
+                         result['seconds'],
+                         '' if result.get('bytes') is None else
+                         '%12d bytes' % (result['bytes'],)))
+    if args.output is None:
+        return
+    history = read_results(args.output)
+    with open(args.output, 'a') as f:
+        for result in results:
+            f.write(json.dumps(result, sort_keys=True) + '\n')
+    compared, regressions = compare(results, history, args.threshold)
+    for result, before, ratio in regressions:
+        _stdout.write('regression: %s %s took %.2fx as long as at %s\n'
+                      % (result['shape'], result['benchmark'], ratio,
+                         before['commit']))
+    if regressions:
+        parser.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import collections
+import logging
+
+from . import _dists
+
+logger = logging.getLogger(__name__)
+
+#: AWS Lambda's limit on the unzipped size of a deployment package.
+LAMBDA_MAX_SIZE = 250 * 1000 * 1000
+
+#: AWS Lambda's limit on the size of a zipped deployment package
+#: uploaded directly.
+LAMBDA_MAX_ZIPPED_SIZE = 50 * 1000 * 1000
+
+# the local file header and central directory record of each member
+# are this many bytes, plus its name and extra field in each.
+_MEMBER_OVERHEAD = 30 + 46
+
+
+def format_size(size):
+    """
+    Returns ``size`` bytes as a human readable :py:class:`str`.
+    """
+    for unit in ('bytes', 'KiB', 'MiB'):
+        if abs(size) < 1024:
+            break
+        size /= 1024.0
+    else:
+        unit = 'GiB'
+    if unit == 'bytes':
+        return '%d bytes' % (size,)
+    return '%.1f %s' % (size, unit)
+
+
+class SizeBudgetExceeded(Exception):
+    """
+    Raised when a package grows past its size budget.
+
+    :param message: describes which budget was exceeded.
+    :param breakdown: the per-distribution breakdown of the package
+        so far, as returned by :py:meth:`SizeBudget.breakdown`.
+    """
+
+    def __init__(self, message, breakdown):
+        super(SizeBudgetExceeded, self).__init__(message)
+        self.breakdown = breakdown
+
+    def __str__(self):
+        lines = [self.args[0]]
+        lines.extend('  %-40s %12s %12s' % (name, format_size(size),
+                                             format_size(compressed))
+                     for name, size, compressed in self.breakdown)
+        return '\n'.join(lines)
+
+
+class SizeBudget(object):
+    """
+    Tracks the uncompressed and compressed size of a package as its
+    members are written, attributing them to the distributions under
+    ``root`` that installed them, and fails as soon as either exceeds
+    its limit.
+
+    :param root: the path to the staging directory.
+    :type root: :py:class:`str`
+    :param max_size: (optional) the limit on the total uncompressed
+        size of the members, in bytes.
+    :type max_size: :py:class:`int`
+    :param max_compressed_size: (optional) the limit on the size of
+        the archive, in bytes.
+    :type max_compressed_size: :py:class:`int`
+    """
+
+    def __init__(self, root, max_size=None, max_compressed_size=None,
+                 _find_distributions=_dists.find_distributions,
+                 _logger=logger):
+        self.max_size = max_size
+        self.max_compressed_size = max_compressed_size
+        self.size = 0
+        self.compressed_size = 0
+        self.members = 0
+        self._owners = _dists.top_level_owners(_find_distributions(root))
+        self._by_owner = collections.defaultdict(lambda: [0, 0])
+        self._logger = _logger
+
+    def add(self, zinfo, arcname=None):
+        """
+        Account for the member described by ``zinfo``, which has been
+        written.
+
+        :param zinfo: the written member.
+        :type zinfo: :py:class:`zipfile.ZipInfo`
+        :param arcname: (optional) the member's path relative to the
+            staging directory, if that isn't its name in the archive.
+        :type arcname: :py:class:`str`
+        :raises SizeBudgetExceeded: ...when the package has grown
+            past a limit.
+        """
+        compressed = (zinfo.compress_size + _MEMBER_OVERHEAD +
+                      2 * (len(zinfo.filename.encode('utf-8')) +
+                           len(zinfo.extra)))
+        self.size += zinfo.file_size
+        self.compressed_size += compressed
+        self.members += 1
+        owner = _dists.owner(self._owners, arcname or zinfo.filename)
+        totals = self._by_owner[owner]
+        totals[0] += zinfo.file_size
+        totals[1] += compressed
+
+        for kind, total, limit in [
+                ('uncompressed', self.size, self.max_size),
+                ('compressed', self.compressed_size,
+                 self.max_compressed_size)]:
+            if limit is not None and total > limit:
+                raise SizeBudgetExceeded(
+                    "package exceeds its %s size budget of %s: %s after"
+                    " %d files.  Largest distributions (uncompressed,"
+                    " compressed):"
+                    % (kind, format_size(limit), format_size(total),
+                       self.members),
+                    self.breakdown())
+
+    def breakdown(self):
+        """
+        Returns a :py:class:`list` of ``(distribution, size,
+        compressed_size)`` tuples, largest uncompressed size first.
+        """
+        return sorted(((name, size, compressed)
+                       for name, (size, compressed)
+                       in self._by_owner.items()),
+                      key=lambda row: (-row[1], row[0]))
+
+    def report(self):
+        """
+        Log the package's total sizes and its breakdown by
+        distribution.
+        """
+        self._logger.info("package is %s uncompressed, %s compressed,"
+                          " in %d files",
+                          format_size(self.size),
+                          format_size(self.compressed_size),
+                          self.members)
+        for name, size, compressed in self.breakdown():
+            self._logger.info("  %s: %s uncompressed, %s compressed",
+                              name, format_size(size),
+                              format_size(compressed))
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import sysconfig
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+#: The default upper bound, in bytes, on the size of an install cache.
+DEFAULT_MAX_SIZE = 2 * 1024 ** 3
+
+_FILE_OPTIONS = ('-r', '-c')
+_LONG_OPTIONS = {'--requirement': '-r', '--constraint': '-c'}
+_ENTRY_METADATA = 'entry.json'
+_ENTRY_TREE = 'tree'
+
+
+def interpreter_tag():
+    """
+    Returns a :py:class:`str` that identifies the running
+    interpreter and the platform for which it installs packages.
+    """
+    return '{}-{}-{}'.format(sys.implementation.cache_tag,
+                             sys.version.split()[0],
+                             sysconfig.get_platform())
+
+
+def normalize_pip_args(pip_args):
+    """
+    Split ``--option=value`` and ``-rvalue`` forms of ``pip``
+    arguments into separate arguments, and abbreviate long
+    requirement and constraint options, so that equivalent command
+    lines normalize to the same list.
+
+    :param pip_args: the arguments to pass ``pip install``
+    :type pip_args: :py:class:`list` of :py:class:`str`
+
+    :returns: :py:class:`list` of :py:class:`str`
+    """
+    normalized = []
+    for arg in pip_args:
+        if arg.startswith('--') and '=' in arg:
+            normalized.extend(arg.split('=', 1))
+        elif arg[:2] in _FILE_OPTIONS and len(arg) > 2:
+            normalized.extend([arg[:2], arg[2:]])
+        else:
+            normalized.append(arg)
+    return [_LONG_OPTIONS.get(arg, arg) for arg in normalized]
+
+
+def _hash_file(hasher, path):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 64), b''):
+            hasher.update(chunk)
+
+
+def _hash_directory(hasher, path, _walk=os.walk):
+    for dirpath, dirnames, filenames in _walk(path):
+        dirnames[:] = sorted(name for name in dirnames
+                             if not name.startswith('.') and
+                             name != '__pycache__')
+        for filename in sorted(filenames):
+            filepath = os.path.join(dirpath, filename)
+            hasher.update(os.path.relpath(filepath, path).encode('utf-8'))
+            _hash_file(hasher, filepath)
+
+
+def _hash_requirements_file(hasher, path, _seen):
+    """
+    Hash a requirements file and any files it includes with ``-r``
+    or ``-c``.
+    """
+    path = os.path.abspath(path)
+    if path in _seen:
+        return
+    _seen.add(path)
+    _hash_file(hasher, path)
+    with open(path) as f:
+        lines = f.read().splitlines()
+    for line in lines:
+        words = normalize_pip_args(line.split())
+        if len(words) == 2 and words[0] in _FILE_OPTIONS:
+            included = os.path.join(os.path.dirname(path), words[1])
+            if os.path.isfile(included):
+                _hash_requirements_file(hasher, included, _seen)
+
+
+def cache_key(pip_args, _interpreter_tag=interpreter_tag):
+    """
+    Compute a key that identifies the staging tree that ``pip
+    install`` would produce from ``pip_args``.
+
+    The key covers the normalized arguments, the contents of any
+    requirement and constraint files and of any local paths they
+    name, and the interpreter and platform tag.
+
+    :param pip_args: the arguments to pass ``pip install``
+    :type pip_args: :py:class:`list` of :py:class:`str`
+
+    :returns: :py:class:`str`
+    """
+    hasher = hashlib.sha256()
+    hasher.update(_interpreter_tag().encode('utf-8'))
+    seen = set()
+    previous = None
+    for arg in normalize_pip_args(pip_args):
+        hasher.update(b'\0' + arg.encode('utf-8'))
+        if previous in _FILE_OPTIONS and os.path.isfile(arg):
+            _hash_requirements_file(hasher, arg, seen)
+        elif os.path.isfile(arg):
+            _hash_file(hasher, arg)
+        elif os.path.isdir(arg):
+            _hash_directory(hasher, arg)
+        previous = arg
+    return hasher.hexdigest()
+
+
+def link_tree(source, destination,
+              _link=os.link, _copy=shutil.copy2, _walk=os.walk):
+    """
+    Populate ``destination`` with the files under ``source``,
+    hardlinking them when possible and copying them otherwise.
+    Existing files in ``destination`` are replaced.
+
+    :returns: the total size in bytes of the files under ``source``.
+    """
+    size = 0
+    for dirpath, dirnames, filenames in _walk(source):
+        target_dir = os.path.join(destination,
+                                  os.path.relpath(dirpath, source))
+        if not os.path.isdir(target_dir):
+            os.makedirs(target_dir)
+        for filename in filenames:
+            source_path = os.path.join(dirpath, filename)
+            target_path = os.path.join(target_dir, filename)
+            if os.path.lexists(target_path):
+                os.unlink(target_path)
+            try:
+                _link(source_path, target_path)
+            except OSError:
+                _copy(source_path, target_path)
+            size += os.lstat(source_path).st_size
+    return size
+
+
+class InstallCache(object):
+    """
+    A persistent, size-bounded cache of installed staging trees.
+    Entries are evicted in least-recently-used order.
+
+    :param directory: the directory in which cached trees are kept.
+        It will be created if it does not exist.
+    :type directory: :py:class:`str`
+    :param max_size: (optional) the maximum total size in bytes of
+        all cached trees.
+    :type max_size: :py:class:`int`
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE,
+                 _cache_key=cache_key):
+        self.directory = directory
+        self.max_size = max_size
+        self._cache_key = _cache_key
+
+    def key(self, pip_args):
+        """
+        Returns the cache key for ``pip_args``.
+        """
+        return self._cache_key(pip_args)
+
+    def _entry(self, key):
+        return os.path.join(self.directory, key)
+
+    def restore(self, key, root, _link_tree=link_tree, _logger=logger):
+        """
+        Populate ``root`` with the tree cached under ``key``.
+
+        :returns: :py:class:`True` on a cache hit and
+            :py:class:`False` otherwise.
+        """
+        entry = self._entry(key)
+        tree = os.path.join(entry, _ENTRY_TREE)
+        if not os.path.isdir(tree):
+            _logger.info("install cache miss: %s", key)
+            return False
+        _link_tree(tree, root)
+        os.utime(os.path.join(entry, _ENTRY_METADATA))
+        _logger.info("install cache hit: %s", key)
+        return True
+
+    def store(self, key, root, _copy=shutil.copy2, _logger=logger):
+        """
+        Copy the tree under ``root`` into the cache under ``key``,
+        then evict old entries until the cache fits ``max_size``.
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        staging = tempfile.mkdtemp(prefix='.' + key, dir=self.directory)
+        try:
+            size = link_tree(root, os.path.join(staging, _ENTRY_TREE),
+                             _link=_copy)
+            with open(os.path.join(staging, _ENTRY_METADATA), 'w') as f:
+                json.dump({'size': size}, f)
+            os.rename(staging, self._entry(key))
+        except OSError:
+            # another build stored this key first; or we failed to.
+            shutil.rmtree(staging, ignore_errors=True)
+        else:
+            _logger.info("stored %d bytes in install cache: %s", size, key)
+        self.evict()
+
+    def entries(self):
+        """
+        Returns a :py:class:`list` of ``(last_used, size, key)``
+        tuples describing every entry in the cache, oldest first.
+        """
+        entries = []
+        for key in os.listdir(self.directory):
+            metadata = os.path.join(self._entry(key), _ENTRY_METADATA)
+            try:
+                with open(metadata) as f:
+                    size = json.load(f)['size']
+                last_used = os.stat(metadata).st_mtime
+            except (OSError, ValueError, KeyError):
+                continue
+            entries.append((last_used, size, key))
+        return sorted(entries)
+
+    def evict(self, _rmtree=shutil.rmtree, _logger=logger):
+        """
+        Remove least recently used entries until the total size of
+        the cache is no more than ``max_size``.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_size:
+                break
+            _logger.info("evicting %d bytes from install cache: %s",
+                         size, key)
+            _rmtree(self._entry(key))
+            total -= size
@@ -0,0 +1,154 @@
+import importlib.machinery
+import os
+import re
+import struct
+
+from . import _files
+
+#: A file that isn't an extension module.
+PURE = 'pure'
+
+#: An extension module the interpreter classified for can load.
+EXTENSION = 'extension'
+
+#: An extension module built for another Python version or platform.
+FOREIGN = 'foreign'
+
+#: The suffixes of the extension modules this interpreter loads.
+HOST_SUFFIXES = tuple(importlib.machinery.EXTENSION_SUFFIXES)
+
+#: The suffixes of extension modules on any platform, untagged.
+UNTAGGED_SUFFIXES = ('.so', '.pyd')
+
+#: The machines, as wheels name them, that ELF ``e_machine`` values
+#: identify.
+ELF_MACHINES = {
+    3: 'i686',
+    22: 's390x',
+    40: 'armv7l',
+    62: 'x86_64',
+    183: 'aarch64',
+}
+
+#: Matches the tags with which extension modules name the
+#: interpreters and ABIs they're built for, such as
+#: ``cpython-311-x86_64-linux-gnu``, ``cp311-win_amd64``, ``abi3`` and
+#: ``pypy39-pp73-x86_64-linux-gnu``.  Other dots in a name, as in the
+#: ``libgeos-3.11.so`` that auditwheel vendors into ``*.libs``, are
+#: part of a version.
+INTERPRETER_TAG = re.compile(
+    r'^(cpython-\d|cp\d|abi\d|pypy|pp\d|graalpy|pyston)')
+
+_ELF_MAGIC = b'\x7fELF'
+# e_ident is 16 bytes, followed by e_type and e_machine, whose byte
+# order e_ident[5] gives.
+_ELF_HEADER_SIZE = 20
+_ELF_BYTE_ORDERS = {1: '<', 2: '>'}
+
+
+def elf_machine(path, _open=open):
+    """
+    Returns the machine, as wheels name it, that the ELF binary at
+    ``path`` was built for, or :py:class:`None` if it isn't an ELF
+    binary for a known machine or can't be read.
+    """
+    try:
+        with _open(path, 'rb') as f:
+            header = f.read(_ELF_HEADER_SIZE)
+    except (IOError, OSError):
+        return None
+    if len(header) < _ELF_HEADER_SIZE or not header.startswith(_ELF_MAGIC):
+        return None
+    byte_order = _ELF_BYTE_ORDERS.get(header[5])
+    if byte_order is None:
+        return None
+    machine, = struct.unpack(byte_order + 'H', header[18:20])
+    return ELF_MACHINES.get(machine)
+
+
+def is_extension(filename, suffixes=HOST_SUFFIXES):
+    """
+    Returns :py:class:`True` if ``filename`` names an extension
+    module, for this interpreter or any other, judging by its name
+    alone.
+
+    :param suffixes: (optional) further suffixes of extension
+        modules.  Defaults to :py:data:`HOST_SUFFIXES`.
+    :type suffixes: :py:class:`tuple` of :py:class:`str`
+    """
+    return (os.path.splitext(filename)[1] in UNTAGGED_SUFFIXES or
+            filename.endswith(suffixes))
+
+
+class Classifier(object):
+    """
+    Classifies files as :py:data:`PURE`, :py:data:`EXTENSION` or
+    :py:data:`FOREIGN` for an interpreter, by their names and, for
+    extension modules named for it, by the machine their ELF headers
+    name.  Each file is classified once: results are remembered by
+    its device, inode and modification time, which
+    :py:class:`betareduce._files.FileRecord`\\ s carry without a
+    system call.
+
+    :param suffixes: the suffixes of the extension modules the
+        interpreter loads, as
+        :py:data:`importlib.machinery.EXTENSION_SUFFIXES` lists them
+        for this one.
+    :type suffixes: iterable of :py:class:`str`
+    :param machine: (optional) the machine the interpreter runs on, as
+        wheels name it.  If not given, ELF headers aren't inspected.
+    :type machine: :py:class:`str`
+    """
+
+    def __init__(self, suffixes, machine=None, _elf_machine=elf_machine,
+                 _stat=_files.stat):
+        self.suffixes = tuple(suffixes)
+        self.machine = machine
+        self._tagged = tuple(suffix for suffix in self.suffixes
+                             if suffix.count('.') > 1)
+        self._untagged = tuple(suffix for suffix in self.suffixes
+                               if suffix.count('.') == 1)
+        self._elf_machine = _elf_machine
+        self._stat = _stat
+        self._classified = {}
+
+    def _classify_name(self, filename):
+        name = os.path.basename(filename)
+        if name.endswith(self._tagged):
+            return EXTENSION
+        stem, suffix = os.path.splitext(name)
+        tagged = INTERPRETER_TAG.match(stem.rpartition('.')[2])
+        if suffix in self._untagged and not ('.' in stem and tagged):
+            # untagged extension modules and shared libraries load on
+            # any interpreter that loads the suffix, if they're built
+            # for its machine.
+            return EXTENSION
+        if suffix in UNTAGGED_SUFFIXES or suffix in self._untagged:
+            return FOREIGN
+        return PURE
+
+    def classify(self, filename):
+        """
+        Returns :py:data:`PURE`, :py:data:`EXTENSION` or
+        :py:data:`FOREIGN` for ``filename``.
+
+        :param filename: path to a file
+        :type filename: :py:class:`str`
+        """
+        kind = self._classify_name(filename)
+        if kind != EXTENSION or self.machine is None:
+            return kind
+        try:
+            stat_result = self._stat(filename)
+        except (IOError, OSError):
+            return FOREIGN
+        identity = (stat_result.st_dev, stat_result.st_ino,
+                    stat_result.st_mtime)
+        kind = self._classified.get(identity)
+        if kind is None:
+            if self._elf_machine(filename) == self.machine:
+                kind = EXTENSION
+            else:
+                kind = FOREIGN
+            self._classified[identity] = kind
+        return kind
@@ -1,14 +1,178 @@
 import argparse
+import os
+import subprocess
 import sys
 import logging
 
-from ._core import create
+from ._analyze import analyze, dump_report, format_report
+from ._batch import build_all, read_manifest
+from ._core import BYTECODE_MODES, create, passthrough
+from ._budget import SizeBudgetExceeded
+from ._cache import DEFAULT_MAX_SIZE
+from ._dedup import DEDUP_MODES
+from ._profile import BuildProfile
+from ._target import ARCHITECTURES, Target
+from ._importtime import DEFAULT_TOP
+from . import _filters, _zip
 
+_SIZE_SUFFIXES = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
 
-parser = argparse.ArgumentParser(description="Create AWS Lambda package.")
+
+def parse_size(value):
+    """
+    Parse a size in bytes with an optional ``K``, ``M``, or ``G``
+    suffix, such as ``250M``.
+    """
+    number, suffix = value, ''
+    if value[-1:].upper() in _SIZE_SUFFIXES:
+        number, suffix = value[:-1], value[-1:].upper()
+    try:
+        return int(number) * _SIZE_SUFFIXES[suffix]
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid size: %r" % (value,))
+
+
+def parse_target(value):
+    """
+    Parse a Lambda runtime such as ``python3.11`` or
+    ``python3.12-arm64`` into a :py:class:`betareduce._target.Target`.
+    """
+    try:
+        return Target.parse(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+#: The options :py:data:`parser` and :py:data:`batch_parser` share.
+options = argparse.ArgumentParser(add_help=False)
+
+options.add_argument('-a', '--allow-extensions',
+                     action='store_true',
+                     default=False,
+                     help='allow extension modules; if not specified,'
+                     ' extension modules are removed.')
+options.add_argument('--cache-dir',
+                     help='path to a directory in which to cache installed'
+                     ' requirements; if not specified, nothing is cached.')
+options.add_argument('--cache-size',
+                     type=parse_size,
+                     default=DEFAULT_MAX_SIZE,
+                     help='the maximum size of the cache directory, e.g.'
+                     ' 500M or 2G; least recently used entries are evicted'
+                     ' first.')
+options.add_argument('-W', '--wheelhouse',
+                     help='install requirements by unpacking wheels from'
+                     ' this directory instead of with pip install; pip'
+                     ' wheel fills it the first time each set of'
+                     ' requirements is installed.')
+options.add_argument('-T', '--target',
+                     type=parse_target,
+                     metavar='RUNTIME',
+                     help='build for this Lambda runtime, e.g. python3.11'
+                     ' or python3.12-arm64 (architectures: %s), installing'
+                     ' only wheels built for it and keeping the extension'
+                     ' modules it can load.' % (', '.join(sorted(
+                         ARCHITECTURES)),))
+options.add_argument('-z', '--compression',
+                     choices=list(_zip.COMPRESSION_PRESETS),
+                     help='compress the package: "fast" takes the least'
+                     ' time, "smallest" makes the smallest package, and'
+                     ' "balanced" is in between.  Already compressed files,'
+                     ' such as images and archives, are stored.  If not'
+                     ' specified, nothing is compressed.')
+options.add_argument('--layout',
+                     choices=list(_zip.LAYOUTS),
+                     help='lay the package out for importing from the'
+                     ' archive: "zipimport" stores bytecode uncompressed'
+                     " and keeps each package's members together.  Best"
+                     ' combined with "--compile sourceless".')
+options.add_argument('--dedup',
+                     choices=DEDUP_MODES,
+                     help='find files with identical contents and log the'
+                     ' bytes they waste ("report"), or also replace them'
+                     ' with symlinks to the first copy ("link").  Identical'
+                     ' contents are compressed only once.')
+options.add_argument('-j', '--jobs',
+                     type=int,
+                     default=1,
+                     help='the number of files to compress concurrently.')
+options.add_argument('-c', '--compile',
+                     choices=BYTECODE_MODES,
+                     help='compile modules to bytecode and ship it'
+                     ' alongside their sources ("both") or instead of'
+                     ' them ("sourceless").')
+options.add_argument('--compile-interpreter',
+                     help='the Python interpreter with which to compile'
+                     ' bytecode; it must match the Lambda runtime.'
+                     ' Required with --target when this interpreter'
+                     " is another Python version than the target's.")
+options.add_argument('--unchecked-hash',
+                     action='store_true',
+                     default=False,
+                     help="compile bytecode that isn't validated against"
+                     ' its sources at import time, rather than against'
+                     ' a hash of them.')
+options.add_argument('-t', '--tree-shake',
+                     action='store_true',
+                     default=False,
+                     help="exclude modules the handler's module doesn't"
+                     ' import, directly or indirectly.')
+options.add_argument('-k', '--keep-module',
+                     action='append',
+                     default=[],
+                     metavar='PATTERN',
+                     help='when tree shaking, keep modules whose names'
+                     ' match this pattern, e.g. "mypackage.plugins.*",'
+                     ' because they are imported dynamically; may be'
+                     ' repeated.')
+options.add_argument('--lazy-handler',
+                     action='store_true',
+                     default=False,
+                     help="generate a handler module that imports the"
+                     " handler's module on the first invocation rather than"
+                     ' on a cold start, and logs how long that took.')
+options.add_argument('--prewarm',
+                     action='append',
+                     default=[],
+                     metavar='MODULE',
+                     help='with a lazy handler, import this module during'
+                     " Lambda's init phase instead; may be repeated."
+                     ' Implies --lazy-handler.')
+options.add_argument('-s', '--strip',
+                     action='append',
+                     default=[],
+                     choices=_filters.choices(),
+                     metavar='NAME',
+                     help='leave out files matched by this profile (%s) or'
+                     ' rule (%s) and report the bytes saved; may be'
+                     ' repeated.' % (', '.join(_filters.PROFILES),
+                                     ', '.join(_filters.RULES)))
+options.add_argument('--max-size',
+                     type=parse_size,
+                     help='fail as soon as the unzipped package exceeds'
+                     ' this size, e.g. 250M, and show which distributions'
+                     ' take up the most space.')
+options.add_argument('--max-zipped-size',
+                     type=parse_size,
+                     help='fail as soon as the zipped package exceeds this'
+                     ' size, e.g. 50M.')
+options.add_argument('--deterministic',
+                     action='store_true',
+                     default=False,
+                     help='build a reproducible package: sort members and'
+                     ' normalize their timestamps, to SOURCE_DATE_EPOCH if'
+                     ' set, and permissions.')
+options.add_argument('-q', '--quiet',
+                     action='store_true',
+                     default=False,
+                     help="don't emit any output")
+
+parser = argparse.ArgumentParser(description="Create AWS Lambda package.",
+                                 parents=[options])
 
 parser.add_argument('outfile',
-                    help='the name of the package.')
+                    help='the name of the package, or - to write it to'
+                    ' standard output.')
 parser.add_argument('fqpn',
                     help='The Fully Qualified Path Name (FQPN) specifying the'
                     'handler function.')
@@ -17,25 +181,182 @@ parser.add_argument('requirements', nargs='+',
 parser.add_argument('-d', '--staging-directory',
                     help='path to a directory install requirements into;'
                     ' if not specified a temporary directory will be used.')
-parser.add_argument('-a', '--allow-extensions',
+parser.add_argument('--sync',
                     action='store_true',
                     default=False,
-                    help='allow extension modules; if not specified,'
-                    ' extension modules are removed.')
-parser.add_argument('-q', '--quiet',
+                    help='bring an existing --staging-directory up to date'
+                    ' by installing only the distributions that were added'
+                    ' or changed and removing those that were dropped.')
+parser.add_argument('-i', '--incremental',
                     action='store_true',
                     default=False,
-                    help="don't emit any output")
+                    help='reuse unchanged members of an existing outfile'
+                    ' instead of recompressing them.')
+parser.add_argument('--profile',
+                    metavar='FILE',
+                    help='write how long each phase of the build took, and'
+                    ' the slowest and largest files, to this file as JSON,'
+                    ' or - to write them to standard error.')
+parser.add_argument('-l', '--layer',
+                    help='put dependencies in a Lambda layer at this path,'
+                    ' leaving only your own code in outfile; the layer is'
+                    ' only rewritten when its contents change.')
+
+batch_parser = argparse.ArgumentParser(
+    description="Create many AWS Lambda packages, installing each set of"
+    " requirements once.",
+    parents=[options])
+
+batch_parser.add_argument('manifest',
+                          help='a JSON list of packages to build, each an'
+                          ' object with an "outfile", an "fqpn", and a list'
+                          ' of "requirements" to pass through to pip.')
+batch_parser.add_argument('-w', '--workers',
+                          type=int,
+                          default=1,
+                          help='the number of sets of requirements to'
+                          ' install and package concurrently.')
+
+analyze_parser = argparse.ArgumentParser(
+    prog='betareduce analyze',
+    description="Rank the distributions in a staging directory by how"
+    " long importing a Lambda handler's module spends in each, alongside"
+    " how much space each takes up.")
+
+analyze_parser.add_argument('staging_directory',
+                            help='the staging directory the package was'
+                            ' installed into.')
+analyze_parser.add_argument('fqpn',
+                            help='the fully qualified path name of the'
+                            ' Lambda handler whose module to import.')
+analyze_parser.add_argument('--interpreter',
+                            help='the Python interpreter to import with,'
+                            ' which should match the Lambda runtime.'
+                            ' Defaults to the one running betareduce.')
+analyze_parser.add_argument('-n', '--top',
+                            type=int,
+                            default=DEFAULT_TOP,
+                            help='the number of distributions to report.')
+analyze_parser.add_argument('--json',
+                            action='store_true',
+                            help='report as JSON, with the most expensive'
+                            ' individual imports too.')
+
 
+def build_options(args):
+    """
+    Returns the keyword arguments for :py:func:`betareduce._core.create`
+    or :py:func:`betareduce._batch.build_all` that ``args``, parsed
+    by a parser with :py:data:`options`, specify.
+    """
+    return dict(exclude_extension_modules=not args.allow_extensions,
+                cache_dir=args.cache_dir,
+                cache_max_size=args.cache_size,
+                wheelhouse=args.wheelhouse,
+                target=args.target,
+                compression=args.compression,
+                layout=args.layout,
+                dedup=args.dedup,
+                jobs=args.jobs,
+                max_size=args.max_size,
+                max_compressed_size=args.max_zipped_size,
+                compile_bytecode=args.compile,
+                bytecode_interpreter=args.compile_interpreter,
+                unchecked_hash=args.unchecked_hash,
+                tree_shake=args.tree_shake,
+                keep_modules=args.keep_module,
+                lazy_handler=args.lazy_handler or bool(args.prewarm),
+                prewarm=args.prewarm,
+                strip=args.strip,
+                deterministic=args.deterministic)
 
-def run(_argv=sys.argv[1:], _open=open, _create=create):
+
+def run_analyze(_argv=sys.argv[1:], _analyze=analyze, _stdout=sys.stdout):
+    args = analyze_parser.parse_args(_argv)
+    try:
+        costs, rows = _analyze(args.staging_directory, args.fqpn,
+                               interpreter=args.interpreter)
+    except ValueError as e:
+        analyze_parser.error(str(e))
+    except subprocess.CalledProcessError as e:
+        analyze_parser.exit(1, 'importing %s failed:\n%s\n' % (
+            args.fqpn, e.output.decode('utf-8', 'replace')))
+    module = args.fqpn.rpartition('.')[0]
+    if args.json:
+        dump_report(module, costs, rows, _stdout, top=args.top)
+    else:
+        _stdout.write(format_report(module, costs, rows, top=args.top))
+
+
+def run(_argv=sys.argv[1:], _open=open, _create=create,
+        _replace=os.replace, _remove=os.remove, _stdout=sys.stdout,
+        _stderr=sys.stderr, _BuildProfile=BuildProfile,
+        _run_analyze=run_analyze):
+    if _argv[:1] == ['analyze']:
+        return _run_analyze(_argv[1:], _stdout=_stdout)
     args = parser.parse_args(_argv)
     level = logging.ERROR if args.quiet else logging.DEBUG
     logging.basicConfig(level=level)
 
-    with _open(args.outfile, 'wb') as fileobj:
-        _create(fileobj,
+    kwargs = build_options(args)
+    kwargs['layer'] = args.layer
+    if args.sync:
+        if args.staging_directory is None:
+            parser.error("--sync requires --staging-directory")
+        kwargs['sync'] = True
+    if args.profile is not None:
+        kwargs['profile'] = _BuildProfile()
+    path = args.outfile
+    if args.incremental:
+        if args.outfile == '-':
+            parser.error("--incremental requires an outfile")
+        # the previous package must survive until the new one is
+        # written, so write beside it and then replace it.
+        kwargs['previous'] = args.outfile
+        path = args.outfile + '.partial'
+
+    if path == '-':
+        # the package streams through a pipe or terminal, which
+        # zipfile handles by writing data descriptors.
+        output = passthrough(_stdout.buffer)
+    else:
+        output = _open(path, 'wb')
+
+    try:
+        with output as fileobj:
+            zip_obj = _create(
+                fileobj,
                 args.requirements,
                 fqpn=args.fqpn,
                 root=args.staging_directory,
-                exclude_extension_modules=not args.allow_extensions)
+                **kwargs)
+            zip_obj.close()
+    except SizeBudgetExceeded as e:
+        if path != '-':
+            _remove(path)
+        parser.exit(1, '%s\n' % (e,))
+
+    if args.incremental:
+        _replace(path, args.outfile)
+
+    if args.profile == '-':
+        kwargs['profile'].dump(_stderr)
+    elif args.profile is not None:
+        with _open(args.profile, 'w') as f:
+            kwargs['profile'].dump(f)
+
+
+def run_batch(_argv=sys.argv[1:], _build_all=build_all,
+              _read_manifest=read_manifest):
+    args = batch_parser.parse_args(_argv)
+    level = logging.ERROR if args.quiet else logging.DEBUG
+    logging.basicConfig(level=level)
+
+    try:
+        entries = _read_manifest(args.manifest)
+    except (IOError, OSError, ValueError) as e:
+        batch_parser.error(str(e))
+    try:
+        _build_all(entries, workers=args.workers, **build_options(args))
+    except SizeBudgetExceeded as e:
+        batch_parser.exit(1, '%s\n' % (e,))
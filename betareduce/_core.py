@@ -1,17 +1,39 @@
 import contextlib
 import functools
-import imp
 import logging
 import os
 import subprocess
 import shutil
 import stat
+import sys
 import tempfile
 import textwrap
 import zipfile
 
+from ._budget import SizeBudget
+from ._cache import DEFAULT_MAX_SIZE, InstallCache
+from ._classify import HOST_SUFFIXES, is_extension
+from ._dedup import Deduplicator, check_dedup
+from ._filters import StripFilter, resolve_rules
+from ._imports import TreeShaker
+from ._incremental import IncrementalBuild
+from ._layer import FunctionFiles, write_layer
+from ._profile import NO_PROFILE
+from ._sync import StagingSync
+from ._wheels import Wheelhouse
+from . import _files, _zip
+
 logger = logging.getLogger(__name__)
 
+#: The names the module
+#: :py:meth:`LambdaPackage.generate_lazy_lambda_handler_module`
+#: generates keeps for itself, which the handler can't be called.
+LAZY_HANDLER_GLOBALS = frozenset([
+    'BETAREDUCE_IMPORT_TIMES', '_betareduce_handlers', '_betareduce_import',
+    '_betareduce_importlib', '_betareduce_json', '_betareduce_name',
+    '_betareduce_report', '_betareduce_sys', '_betareduce_time',
+])
+
 
 class LambdaPackage(object):
     """
@@ -23,32 +45,36 @@ class LambdaPackage(object):
         handler function.
     :type fqpn: :py:class:`str`
     """
-    BINARY_SUFFIXES = tuple(suffix for suffix, _, kind in imp.get_suffixes()
-                            if kind == imp.C_EXTENSION)
+    BINARY_SUFFIXES = HOST_SUFFIXES
 
     def __init__(self, root, fqpn):
         self.root = root
         self.fqpn = fqpn
 
-    def files(self, _walk=os.walk):
+    def files(self, sort=False, _scan=_files.scan):
         """
-        Yields all files underneath ``self.root``
+        Yields all files underneath ``self.root`` as
+        :py:class:`betareduce._files.FileRecord`\\ s, which carry
+        their paths relative to ``self.root`` and their metadata.
+
+        :param sort: (optional) if :py:class:`True`, yield the files in
+            each directory, and then its subdirectories, in sorted
+            order rather than the order the filesystem lists them in.
+        :type sort: :py:class:`bool`
         """
-        for dirpath, dirnames, filenames in _walk(self.root):
-            for filename in filenames:
-                yield os.path.join(dirpath, filename)
+        return _scan(self.root, sort=sort)
 
     def not_extension_module(self, filename, _logger=logger):
         """
-        Returns ``False`` if ``filename`` is an extension module and
-        ``True`` otherwise.
+        Returns ``False`` if ``filename`` is an extension module, for
+        this interpreter or any other, and ``True`` otherwise.
 
         :param filename: path to a Python module
         :type filename: :py:class:`str`
 
         :returns :py:class:`bool`:
         """
-        if filename.endswith(self.BINARY_SUFFIXES):
+        if is_extension(filename, self.BINARY_SUFFIXES):
             _logger.info("Detected extension module: %s", filename)
             return False
         return True
@@ -64,10 +90,79 @@ class LambdaPackage(object):
         :param args: the path to the source directory
         :type args: :py:class:`list` of :py:class:`str`s
         """
-        cmd = ['pip', 'install', '-t', self.root] + list(args)
+        cmd = self.install_command(args)
+        output = _check_output(cmd, stderr=subprocess.STDOUT)
+        _logger.info("command: %s, output:\n%s", cmd, output)
+
+    def install_command(self, args):
+        """
+        Returns the command :py:meth:`install` runs.
+        """
+        return ['pip', 'install', '-t', self.root] + list(args)
+
+    def compile_bytecode(self, interpreter=None, sourceless=False,
+                         unchecked_hash=False,
+                         _check_output=subprocess.check_output,
+                         _logger=logger):
+        """
+        Compile every Python module under ``self.root`` to bytecode
+        with ``python -m compileall``, so that Lambda doesn't compile
+        them on each cold start.
+
+        :param interpreter: (optional) the path to the Python
+            interpreter the Lambda runtime uses.  Bytecode is specific
+            to a Python version.  Defaults to this interpreter.
+        :type interpreter: :py:class:`str`
+        :param sourceless: (optional) if :py:class:`True`, write each
+            ``.pyc`` beside its ``.py`` so that it can be imported
+            without its source; see :py:meth:`not_compiled_source`.
+        :type sourceless: :py:class:`bool`
+        :param unchecked_hash: (optional) if :py:class:`True`, write
+            ``.pyc`` files that the runtime doesn't validate against
+            their sources.  Otherwise they're validated against a hash
+            of their sources, because modification times don't
+            survive being zipped.
+        :type unchecked_hash: :py:class:`bool`
+        """
+        cmd = self.compile_command(interpreter=interpreter,
+                                   sourceless=sourceless,
+                                   unchecked_hash=unchecked_hash)
         output = _check_output(cmd, stderr=subprocess.STDOUT)
         _logger.info("command: %s, output:\n%s", cmd, output)
 
+    def compile_command(self, interpreter=None, sourceless=False,
+                        unchecked_hash=False):
+        """
+        Returns the command :py:meth:`compile_bytecode` runs.
+        """
+        cmd = [interpreter or sys.executable, '-m', 'compileall',
+               '-q', '-j', '0']
+        if sourceless:
+            cmd.append('-b')
+        cmd.extend(['--invalidation-mode',
+                    'unchecked-hash' if unchecked_hash else 'checked-hash'])
+        cmd.append(self.root)
+        return cmd
+
+    def not_compiled_source(self, filename):
+        """
+        Returns ``False`` if ``filename`` is a Python source file that
+        has been compiled to a ``.pyc`` beside it, or is in a
+        ``__pycache__`` directory, and ``True`` otherwise.  Use this
+        to ship only the bytecode written by
+        :py:meth:`compile_bytecode` with ``sourceless=True``.
+
+        :param filename: path to a file
+        :type filename: :py:class:`str`
+
+        :returns :py:class:`bool`:
+        """
+        if '__pycache__' in filename.split(os.sep):
+            return False
+        if filename.endswith('.py'):
+            return not os.path.exists(filename + 'c')
+        return True
+
     def relativize_path(self, path):
         """
         Given a path into ``self.root``, remove the ``self.root``
@@ -123,7 +218,90 @@ class LambdaPackage(object):
         """.format(module_fqpn=module_fqpn,
                    callable_name=callable_name))
 
-    def write_lambda_handler_to_fileobj(self, fqpn, zip_obj, _logger=logger):
+    def generate_lazy_lambda_handler_module(self, module_fqpn,
+                                            callable_name, prewarm=()):
+        """
+        Generates Python source for a top-level Lambda module like
+        :py:meth:`generate_lambda_handler_module`'s, except that the
+        real module is only imported when the handler is first
+        invoked, so that cold starts don't pay for it until then.
+
+        Modules in ``prewarm`` are imported straight away instead,
+        during Lambda's init phase.  How long each import takes, and
+        how many modules it loads, is kept in the module's
+        ``BETAREDUCE_IMPORT_TIMES`` and printed as a line of JSON,
+        which Lambda sends to CloudWatch Logs.  The module's own names
+        are in :py:data:`LAZY_HANDLER_GLOBALS`, so that they can't
+        collide with the handler's.
+
+        :param module_fqpn: a Fully Qualified path name that specifies
+            the enclosing module of the Lambda handler function.
+        :type module_fqpn: :py:class:`str`
+        :param callable_name: The name of the Lambda handler function.
+        :type callable_name: :py:class:`str`
+        :param prewarm: (optional) the names of modules to import
+            during the init phase.
+        :type prewarm: iterable of :py:class:`str`
+        :raises ValueError: ...when ``callable_name`` is in
+            :py:data:`LAZY_HANDLER_GLOBALS`.
+
+        :return: :py:class:`str`
+        """
+        if callable_name in LAZY_HANDLER_GLOBALS:
+            raise ValueError("a lazy handler can't be named %s"
+                             % (callable_name,))
+        return textwrap.dedent("""\
+        import importlib as _betareduce_importlib
+        import json as _betareduce_json
+        import sys as _betareduce_sys
+        import time as _betareduce_time
+
+        #: (module, seconds, modules loaded) for each import made here.
+        BETAREDUCE_IMPORT_TIMES = []
+
+        # the handler, once imported, kept where the generated
+        # handler's name can't hide it.
+        _betareduce_handlers = {{}}
+
+
+        def _betareduce_import(name):
+            loaded = len(_betareduce_sys.modules)
+            start = _betareduce_time.perf_counter()
+            module = _betareduce_importlib.import_module(name)
+            BETAREDUCE_IMPORT_TIMES.append(
+                (name, _betareduce_time.perf_counter() - start,
+                 len(_betareduce_sys.modules) - loaded))
+            return module
+
+
+        def _betareduce_report(phase, times):
+            print(_betareduce_json.dumps({{
+                'betareduce_imports': phase, 'modules': [
+                    {{'module': name, 'seconds': round(seconds, 6),
+                      'loaded': loaded}}
+                    for name, seconds, loaded in times]}}), flush=True)
+
+
+        for _betareduce_name in {prewarm!r}:
+            _betareduce_import(_betareduce_name)
+        if BETAREDUCE_IMPORT_TIMES:
+            _betareduce_report('init', BETAREDUCE_IMPORT_TIMES)
+
+
+        def {callable_name}(event, context):
+            handler = _betareduce_handlers.get('handler')
+            if handler is None:
+                handler = _betareduce_handlers['handler'] = getattr(
+                    _betareduce_import({module_fqpn!r}), {callable_name!r})
+                _betareduce_report('invoke', BETAREDUCE_IMPORT_TIMES[-1:])
+            return handler(event, context)
+        """.format(module_fqpn=module_fqpn,
+                   callable_name=callable_name,
+                   prewarm=tuple(prewarm)))
+
+    def write_lambda_handler_to_fileobj(self, fqpn, zip_obj, date_time=None,
+                                        lazy=False, prewarm=(),
+                                        _logger=logger):
         """
         Given an FQPN, generate a module name for it, source for that
         module which imports the callable the FPQN specifies, and
@@ -133,23 +311,45 @@ class LambdaPackage(object):
             which is the callable that will be the Lambda handler
             function.
         :type fqpn: :py:class:`str`
+        :param date_time: (optional) the module's timestamp.  Defaults
+            to the earliest a Zip file can record.
+        :param lazy: (optional) if :py:class:`True`, write the module
+            :py:meth:`generate_lazy_lambda_handler_module` generates,
+            which imports the real one on the first invocation.
+        :type lazy: :py:class:`bool`
+        :param prewarm: (optional) with ``lazy``, the names of modules
+            to import during Lambda's init phase.
+        :type prewarm: iterable of :py:class:`str`
 
         :raises ValueError: ...when given an invalid FQPN.
         """
         real_module_name, callable_name = self.split_fqpn(fqpn)
         module_name = 'lambda_entry'
         filename = module_name + '.py'
-        module_source = self.generate_lambda_handler_module(real_module_name,
-                                                            callable_name)
+        if lazy:
+            module_source = self.generate_lazy_lambda_handler_module(
+                real_module_name, callable_name, prewarm=prewarm)
+        else:
+            module_source = self.generate_lambda_handler_module(
+                real_module_name, callable_name)
         info = zipfile.ZipInfo(filename)
+        if date_time is not None:
+            info.date_time = date_time
         info.external_attr = (stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH) << 16
 
         zip_obj.writestr(info, module_source)
         _logger.info("FPQN for handler function %s now accessible as %s.%s",
                      fqpn, module_name, callable_name)
 
-    def to_zipfile(self, fileobj, filter=lambda path: True,
-                   _ZipFile=zipfile.ZipFile):
+    def to_zipfile(self, fileobj, filter=lambda path: True, jobs=1,
+                   previous=None, compressor=None, budget=None,
+                   date_time=None,
+                   prefix='', entry=True, profile=None,
+                   compression=zipfile.ZIP_STORED, compresslevel=None,
+                   lazy_handler=False, prewarm=(), layout=None,
+                   _ZipFile=zipfile.ZipFile,
+                   _write_members=_zip.write_members,
+                   _stream=_zip.stream):
         """
         Add all the files under ``self.root`` to the Zip file
         specified by ``fileobj``.
@@ -162,15 +362,130 @@ class LambdaPackage(object):
             a given path will be included in the zip.  Should accept
             the path as its sole argument and should return
             :py:class:`True` if it should be included.
+        :param jobs: (optional) the number of files to compress
+            concurrently.  The archive is identical regardless.
+        :type jobs: :py:class:`int`
+        :param previous: (optional) an incremental build from which
+            to copy members that haven't changed.
+        :type previous:
+            :py:class:`betareduce._incremental.IncrementalBuild`
+        :param compressor: (optional) a cache of compressed data to
+            compress members with, or to copy them from.
+        :type compressor: :py:class:`betareduce._zip.CompressionCache`
+        :param budget: (optional) a size budget to charge each member
+            to as it's written.
+        :type budget: :py:class:`betareduce._budget.SizeBudget`
+        :param date_time: (optional) if given, make the archive
+            reproducible: members are written in sorted order, all
+            with this timestamp and with normalized permissions, so
+            that identical files produce identical bytes.
+        :type date_time: a :py:attr:`zipfile.ZipInfo.date_time`
+            6-tuple
+        :param prefix: (optional) prepended to the name of every
+            member.
+        :type prefix: :py:class:`str`
+        :param entry: (optional) if :py:class:`False`, don't add the
+            handler module.
+        :type entry: :py:class:`bool`
+        :param profile: (optional) a profile to record the time spent
+            enumerating, filtering and compressing files in, and each
+            member written.
+        :type profile: :py:class:`betareduce._profile.BuildProfile`
+        :param compression: (optional) the compression method, as
+            for :py:class:`zipfile.ZipFile`.  Files whose contents are
+            already compressed are stored regardless; see
+            :py:func:`betareduce._zip.member_compression`.
+        :param compresslevel: (optional) the compression level, as
+            for :py:class:`zipfile.ZipFile`.
+        :type compresslevel: :py:class:`int`
+        :param lazy_handler: (optional) if :py:class:`True`, the
+            handler module defers importing the real one until it's
+            first invoked.
+        :type lazy_handler: :py:class:`bool`
+        :param prewarm: (optional) with ``lazy_handler``, the names of
+            modules the handler module imports during Lambda's init
+            phase.
+        :type prewarm: iterable of :py:class:`str`
+        :param layout: (optional) the name of a layout in
+            :py:data:`betareduce._zip.LAYOUTS`.  With ``zipimport``,
+            bytecode is stored uncompressed, and members are written,
+            and listed in the central directory, package by package;
+            see :py:class:`betareduce._zip.ZipimportZipFile`.
+        :type layout: :py:class:`str`
         """
-        zip_obj = _ZipFile(fileobj, 'w')
-        for filename in self.files():
-            if filter(filename):
-                zip_obj.write(filename, self.relativize_path(filename))
-        self.write_lambda_handler_to_fileobj(self.fqpn, zip_obj)
+        if profile is None:
+            profile = NO_PROFILE
+        if layout is not None:
+            _ZipFile = _zip.layout_class(layout)
+        zip_obj = _ZipFile(fileobj, 'w', compression=compression,
+                           compresslevel=compresslevel)
+        records = profile.timed_iter('enumerate',
+                                     self.files(sort=date_time is not None))
+        filter = profile.timed('filter', filter)
+        members = ((record, prefix + record.arcname)
+                   for record in records if filter(record))
+        if layout is not None:
+            members = sorted(members, key=lambda member: _zip.zipimport_key(
+                member[1]))
+        kwargs = {}
+        if budget is not None and prefix:
+            kwargs['written'] = lambda zinfo: budget.add(
+                zinfo, zinfo.filename[len(prefix):])
+        elif budget is not None:
+            kwargs['written'] = budget.add
+        if date_time is not None:
+            kwargs['date_time'] = date_time
+        overrides = {}
+        if compressor is not None:
+            overrides = {'_compress': compressor.compress,
+                         '_stream': compressor.stream}
+        if previous is not None and overrides:
+            overrides = {
+                '_compress': functools.partial(
+                    previous.compress, _compress=overrides['_compress']),
+                '_stream': functools.partial(
+                    previous.stream, _stream=overrides['_stream'])}
+        elif previous is not None:
+            overrides = {'_compress': previous.compress,
+                         '_stream': previous.stream}
+        if profile is not NO_PROFILE:
+            overrides = {
+                '_compress': profile.compress(
+                    overrides.get('_compress', _zip.compress)),
+                '_stream': profile.stream(
+                    overrides.get('_stream', _stream))}
+        kwargs.update(overrides)
+        try:
+            if jobs > 1 or kwargs:
+                _write_members(zip_obj, members, jobs, **kwargs)
+            else:
+                for filename, arcname in members:
+                    _stream(zip_obj, filename, arcname)
+            if entry:
+                with profile.phase('handler'):
+                    self.write_lambda_handler_to_fileobj(
+                        self.fqpn, zip_obj, date_time=date_time,
+                        lazy=lazy_handler, prewarm=prewarm)
+                if budget is not None:
+                    budget.add(zip_obj.filelist[-1])
+        except BaseException:
+            # the caller never sees this zip_obj, so finish it here
+            # rather than when it's garbage collected.
+            zip_obj.close()
+            raise
         return zip_obj
 
 
+def all_of(*filters):
+    """
+    Combine ``filters`` into one that includes a path only if all of
+    them do.
+    """
+    if len(filters) == 1:
+        return filters[0]
+    return lambda path: all(f(path) for f in filters)
+
+
 @contextlib.contextmanager
 def automatic_tempdir(_mkdtemp=tempfile.mkdtemp,
                       _rmtree=shutil.rmtree,
@@ -188,6 +503,10 @@ def automatic_tempdir(_mkdtemp=tempfile.mkdtemp,
         _rmtree(tempdir)
 
 
+#: The values :py:func:`create` accepts for ``compile_bytecode``.
+BYTECODE_MODES = ('both', 'sourceless')
+
+
 @contextlib.contextmanager
 def passthrough(path):
     """
@@ -196,10 +515,229 @@ def passthrough(path):
     yield path
 
 
+def check_compile_bytecode(compile_bytecode, target=None,
+                           bytecode_interpreter=None,
+                           _version_info=sys.version_info):
+    """
+    Raise :py:exc:`ValueError` unless ``compile_bytecode`` is
+    :py:class:`None` or one of :py:data:`BYTECODE_MODES`, or if
+    bytecode for ``target`` would be compiled by this interpreter
+    when it's another Python version than the runtime's.
+    """
+    if compile_bytecode not in (None,) + BYTECODE_MODES:
+        raise ValueError("compile_bytecode must be one of %r; got %r"
+                         % (BYTECODE_MODES, compile_bytecode))
+    if (compile_bytecode is not None and target is not None and
+            bytecode_interpreter is None and
+            target.python_version != tuple(_version_info[:2])):
+        raise ValueError("bytecode for Python %d.%d can't be compiled by"
+                         " Python %d.%d; give bytecode_interpreter"
+                         % (target.python_version +
+                            tuple(_version_info[:2])))
+
+
+def check_prewarm(lazy_handler, prewarm):
+    """
+    Raise :py:exc:`ValueError` if ``prewarm`` is given without
+    ``lazy_handler``, or isn't a list of module names.
+    """
+    if prewarm and not lazy_handler:
+        raise ValueError("prewarm requires lazy_handler")
+    for name in prewarm:
+        if not all(part.isidentifier() for part in name.split('.')):
+            raise ValueError("prewarm must be module names; got %r"
+                             % (name,))
+
+
+def prepare(package, pip_args,
+            cache_dir=None, cache_max_size=DEFAULT_MAX_SIZE,
+            compile_bytecode=None, bytecode_interpreter=None,
+            unchecked_hash=False, wheelhouse=None, target=None,
+            profile=None, sync=False,
+            _InstallCache=InstallCache, _Wheelhouse=Wheelhouse,
+            _StagingSync=StagingSync):
+    """
+    Install the requirements specified and implied by ``pip_args``
+    into ``package``'s staging directory, from the cache if possible,
+    and compile them to bytecode if asked to.  See :py:func:`create`
+    for the parameters.
+
+    :param package: the package to install into.
+    :type package: :py:class:`LambdaPackage`
+    """
+    if profile is None:
+        profile = NO_PROFILE
+    if target is not None:
+        # as arguments, they distinguish the install in the caches.
+        pip_args = target.pip_args() + list(pip_args)
+    if sync:
+        install = _StagingSync(package.root, target=target).sync
+    elif wheelhouse is None:
+        install = package.install
+    else:
+        install = functools.partial(
+            _Wheelhouse(wheelhouse, download=target is not None).install,
+            root=package.root)
+    with profile.phase('install'):
+        if cache_dir is None:
+            install(pip_args)
+        else:
+            cache = _InstallCache(cache_dir, max_size=cache_max_size)
+            key = cache.key(pip_args)
+            if not cache.restore(key, package.root):
+                install(pip_args)
+                cache.store(key, package.root)
+    if compile_bytecode is not None:
+        with profile.phase('compile'):
+            package.compile_bytecode(
+                interpreter=bytecode_interpreter,
+                sourceless=compile_bytecode == 'sourceless',
+                unchecked_hash=unchecked_hash)
+
+
+def write_package(package, fileobj,
+                  exclude_extension_modules=True, jobs=1, previous=None,
+                  compressor=None, sourceless=False, tree_shake=False,
+                  keep_modules=(), strip_rules=(), max_size=None,
+                  max_compressed_size=None, date_time=None, layer=None,
+                  target=None, profile=None, compression=None,
+                  lazy_handler=False, prewarm=(), layout=None, dedup=None,
+                  _TreeShaker=TreeShaker, _StripFilter=StripFilter,
+                  _SizeBudget=SizeBudget, _FunctionFiles=FunctionFiles,
+                  _Deduplicator=Deduplicator, _write_layer=write_layer):
+    """
+    Write the prepared ``package`` into ``fileobj`` and report what
+    its filters excluded.  Returns a :py:class:`zipfile.ZipFile`
+    object representing the package.  See :py:func:`create` for the
+    parameters.
+
+    :param package: the package to write.
+    :type package: :py:class:`LambdaPackage`
+    :param previous: (optional) passed to
+        :py:meth:`LambdaPackage.to_zipfile`.
+    :param compressor: (optional) passed to
+        :py:meth:`LambdaPackage.to_zipfile`.
+    :param sourceless: (optional) if :py:class:`True`, leave out
+        sources that were compiled to bytecode beside them.
+    :type sourceless: :py:class:`bool`
+    :param strip_rules: (optional) the rules of files to leave out.
+    :type strip_rules: iterable of
+        :py:class:`betareduce._filters.Rule`
+    :param date_time: (optional) passed to
+        :py:meth:`LambdaPackage.to_zipfile`.
+    :param layer: (optional) passed to
+        :py:func:`betareduce._layer.write_layer`.
+    :param target: (optional) the runtime the package is built for;
+        only extension modules it can't load are excluded.
+    :type target: :py:class:`betareduce._target.Target`
+    :param profile: (optional) passed to
+        :py:meth:`LambdaPackage.to_zipfile`.
+    :param compression: (optional) the name of a compression preset
+        in :py:data:`betareduce._zip.COMPRESSION_PRESETS`.
+    :type compression: :py:class:`str`
+    :param lazy_handler: (optional) passed to
+        :py:meth:`LambdaPackage.to_zipfile`.
+    :param prewarm: (optional) passed to
+        :py:meth:`LambdaPackage.to_zipfile`.
+    :param layout: (optional) passed to
+        :py:meth:`LambdaPackage.to_zipfile`, but not to
+        :py:func:`betareduce._layer.write_layer`, as layers are
+        always extracted.
+    :param dedup: (optional) one of
+        :py:data:`betareduce._dedup.DEDUP_MODES`; see
+        :py:class:`betareduce._dedup.Deduplicator`.  Unless
+        ``compressor`` is given, it's also used to compress identical
+        contents only once.
+    :type dedup: :py:class:`str`
+    """
+    kwargs = {}
+    filters = []
+    if exclude_extension_modules:
+        if target is None:
+            filters.append(package.not_extension_module)
+        else:
+            filters.append(target.not_foreign_extension_module)
+    if sourceless:
+        filters.append(package.not_compiled_source)
+    # filters that report what they excluded once the package is
+    # written.
+    reporting = []
+    if strip_rules:
+        reporting.append(_StripFilter(package.root, strip_rules))
+    if tree_shake:
+        module_name, _ = package.split_fqpn(package.fqpn)
+        reporting.append(_TreeShaker(package.root, module_name,
+                                     keep=keep_modules))
+    deduplicator = None
+    if dedup is not None:
+        deduplicator = _Deduplicator(package.root, link=dedup == 'link')
+        reporting.append(deduplicator)
+    filters.extend(reporting)
+    if jobs > 1:
+        kwargs['jobs'] = jobs
+    if date_time is not None:
+        kwargs['date_time'] = date_time
+    if profile is not None:
+        kwargs['profile'] = profile
+    if compression is not None:
+        (kwargs['compression'],
+         kwargs['compresslevel']) = _zip.compression_preset(compression)
+    if max_size is not None or max_compressed_size is not None:
+        budget = _SizeBudget(package.root, max_size=max_size,
+                             max_compressed_size=max_compressed_size)
+        kwargs['budget'] = budget
+        reporting.append(budget)
+    if layer is not None:
+        module_name, _ = package.split_fqpn(package.fqpn)
+        function_files = _FunctionFiles(package.root, module_name)
+        # each file passes exactly one of the split filters, so the
+        # reporting filters see it only once.
+        _write_layer(package, layer,
+                     filter=all_of(lambda path: not function_files(path),
+                                   *filters),
+                     **kwargs)
+        filters.insert(0, function_files)
+    if filters:
+        kwargs['filter'] = all_of(*filters)
+    if previous is not None:
+        kwargs['previous'] = previous
+    if compressor is not None:
+        kwargs['compressor'] = compressor
+    elif deduplicator is not None:
+        kwargs['compressor'] = deduplicator
+    if lazy_handler:
+        kwargs['lazy_handler'] = True
+        kwargs['prewarm'] = tuple(prewarm)
+    if layout is not None:
+        kwargs['layout'] = layout
+    zip_obj = package.to_zipfile(fileobj, **kwargs)
+    if deduplicator is not None and deduplicator.link:
+        for zinfo in deduplicator.write_links(zip_obj, date_time=date_time):
+            if 'budget' in kwargs:
+                kwargs['budget'].add(zinfo)
+    for reporter in reporting:
+        reporter.report()
+    return zip_obj
+
+
 def create(fileobj, pip_args, fqpn, root=None,
            exclude_extension_modules=True,
+           cache_dir=None, cache_max_size=DEFAULT_MAX_SIZE, jobs=1,
+           previous=None, compile_bytecode=None,
+           bytecode_interpreter=None, unchecked_hash=False,
+           tree_shake=False, keep_modules=(), strip=(),
+           max_size=None, max_compressed_size=None, deterministic=False,
+           layer=None, wheelhouse=None, target=None, profile=None,
+           compression=None, sync=False, lazy_handler=False, prewarm=(),
+           layout=None, dedup=None,
            _automatic_tempdir=automatic_tempdir,
-           _passthrough=passthrough, _LambdaPackage=LambdaPackage):
+           _passthrough=passthrough, _LambdaPackage=LambdaPackage,
+           _InstallCache=InstallCache, _Wheelhouse=Wheelhouse,
+           _StagingSync=StagingSync,
+           _IncrementalBuild=IncrementalBuild,
+           _TreeShaker=TreeShaker, _StripFilter=StripFilter,
+           _SizeBudget=SizeBudget,
+           _source_date_time=_zip.source_date_time):
     """
     Create a Lambda package inside ``fileobj`` from the requirements
     specified and implied by ``pip_args``.  Returns a
@@ -221,18 +759,203 @@ def create(fileobj, pip_args, fqpn, root=None,
     :type root: :py:class:`str`
 
     :param exclude_extension_modules: (optional) if :py:class:`True`,
-        remove any extension modules in the created package
+        remove any extension modules in the created package, or with
+        ``target``, any that the target runtime can't load.
     :type exclude_extension_modules: :py:class:`bool`
+
+    :param cache_dir: (optional) a directory in which to cache
+        installed staging trees.  When the same ``pip_args``,
+        requirement files, and interpreter were used before, the
+        cached tree is linked into the staging directory instead of
+        running ``pip install``.
+    :type cache_dir: :py:class:`str`
+
+    :param cache_max_size: (optional) the maximum size in bytes of
+        the cache in ``cache_dir``.
+    :type cache_max_size: :py:class:`int`
+
+    :param jobs: (optional) the number of files to compress
+        concurrently.
+    :type jobs: :py:class:`int`
+
+    :param previous: (optional) the path of a previously built
+        package that the new one will replace.  Members that haven't
+        changed since are copied from it without recompressing, and
+        a manifest describing the new package is written beside it.
+    :type previous: :py:class:`str`
+
+    :param compile_bytecode: (optional) ``"both"`` to compile the
+        installed modules and ship bytecode alongside their sources,
+        or ``"sourceless"`` to ship only the bytecode.  If not given,
+        nothing is compiled.
+    :type compile_bytecode: :py:class:`str`
+
+    :param bytecode_interpreter: (optional) the Python interpreter
+        with which to compile bytecode; this must match the Lambda
+        runtime.  Defaults to this interpreter, which must then be the
+        same Python version as ``target``, if that's given.
+    :type bytecode_interpreter: :py:class:`str`
+
+    :param unchecked_hash: (optional) if :py:class:`True`, compile
+        bytecode that the runtime doesn't validate against its
+        sources, rather than against a hash of them.
+    :type unchecked_hash: :py:class:`bool`
+
+    :param tree_shake: (optional) if :py:class:`True`, exclude
+        modules that the handler's module doesn't transitively import,
+        and log what was dropped.
+    :type tree_shake: :py:class:`bool`
+
+    :param keep_modules: (optional) :py:mod:`fnmatch` patterns of
+        module names to keep when tree shaking because they're
+        imported dynamically.
+    :type keep_modules: iterable of :py:class:`str`
+
+    :param strip: (optional) the names of profiles or rules from
+        :py:mod:`betareduce._filters` identifying files to leave out,
+        such as tests, documentation and C sources.  The bytes each
+        rule saves are logged.  ``__pycache__`` directories are kept
+        when ``compile_bytecode`` is ``"both"``.
+    :type strip: iterable of :py:class:`str`
+
+    :param max_size: (optional) the most bytes the package may hold
+        once unzipped.  AWS Lambda allows
+        :py:data:`betareduce._budget.LAMBDA_MAX_SIZE`.
+    :type max_size: :py:class:`int`
+
+    :param max_compressed_size: (optional) the most bytes the zipped
+        package may take up.
+    :type max_compressed_size: :py:class:`int`
+
+    :param deterministic: (optional) if :py:class:`True`, build a
+        reproducible package whose bytes depend only on the contents
+        of its files.  Members are timestamped with
+        ``SOURCE_DATE_EPOCH`` from the environment, if it's set.
+    :type deterministic: :py:class:`bool`
+
+    :param wheelhouse: (optional) a directory of wheels from which to
+        install requirements by unpacking them, rather than with
+        ``pip install``.  The first time ``pip_args`` are installed,
+        ``pip wheel`` resolves them into it; after that, installing
+        them needs neither ``pip`` nor a network connection.
+    :type wheelhouse: :py:class:`str`
+
+    :param target: (optional) the Lambda runtime to build for, when
+        it isn't this interpreter's Python version and platform.
+        ``pip`` installs only wheels, which may include extension
+        modules, built for that runtime, and with a ``wheelhouse``,
+        downloads rather than builds them.
+    :type target: :py:class:`betareduce._target.Target`
+
+    :param compression: (optional) the name of a compression preset
+        in :py:data:`betareduce._zip.COMPRESSION_PRESETS`: ``stored``,
+        ``fast``, ``balanced`` or ``smallest``, which trade the time
+        the build takes against the size of the package.  Files
+        whose contents are already compressed, such as images and
+        archives, are stored either way.  If not given, nothing is
+        compressed.
+    :type compression: :py:class:`str`
+
+    :param layout: (optional) the name of a layout in
+        :py:data:`betareduce._zip.LAYOUTS`.  ``zipimport`` lays the
+        package out for importing straight from the archive: bytecode
+        is stored uncompressed, and each package's members are
+        written, and listed in the central directory, together.  It's
+        best combined with ``compile_bytecode='sourceless'``, as
+        :py:mod:`zipimport` only loads bytecode beside its source.
+    :type layout: :py:class:`str`
+
+    :param dedup: (optional) ``report`` to log the files whose
+        contents are identical to another's, and the bytes they waste,
+        and compress each such contents only once; or ``link`` to also
+        write the duplicates as symlinks to the first copy, which the
+        Lambda extractor creates when it unpacks the package.  ``link``
+        can't be combined with ``layer`` or ``layout``.
+    :type dedup: :py:class:`str`
+
+    :param sync: (optional) if :py:class:`True`, bring the existing
+        staging directory ``root`` up to date with ``pip_args``,
+        installing only the distributions that were added or changed
+        since it was last installed into and removing those that were
+        dropped; see :py:class:`betareduce._sync.StagingSync`.  It
+        can't be combined with ``cache_dir`` or ``wheelhouse``.
+    :type sync: :py:class:`bool`
+
+    :param lazy_handler: (optional) if :py:class:`True`, the
+        generated ``lambda_entry`` module imports the handler's module
+        when it's first invoked rather than when it's loaded, and
+        prints how long that took.
+    :type lazy_handler: :py:class:`bool`
+
+    :param prewarm: (optional) with ``lazy_handler``, the names of
+        modules for ``lambda_entry`` to import during Lambda's init
+        phase, before the first invocation.
+    :type prewarm: iterable of :py:class:`str`
+
+    :param profile: (optional) a profile in which to record how long
+        each phase of the build took, and the slowest and largest
+        members; see :py:class:`betareduce._profile.BuildProfile`.
+    :type profile: :py:class:`betareduce._profile.BuildProfile`
+
+    :param layer: (optional) the path of a Lambda layer into which to
+        put the package's dependencies, leaving only the function's
+        own code, that of the distribution providing the handler's
+        module, and the handler module in ``fileobj``.  The layer is
+        only rewritten when its contents change.
+    :type layer: :py:class:`str`
+
+    :raises betareduce._budget.SizeBudgetExceeded: ...as soon as the
+        package exceeds ``max_size`` or ``max_compressed_size``, with
+        a breakdown of its size by distribution.
     """
+    check_compile_bytecode(compile_bytecode, target=target,
+                           bytecode_interpreter=bytecode_interpreter)
+    check_prewarm(lazy_handler, prewarm)
+    if sync and root is None:
+        raise ValueError("sync requires a staging directory")
+    if sync and (cache_dir is not None or wheelhouse is not None):
+        raise ValueError("sync can't be combined with cache_dir or"
+                         " wheelhouse")
+    if compression is not None:
+        _zip.compression_preset(compression)
+    if layout is not None:
+        _zip.layout_class(layout)
+    check_dedup(dedup, layer=layer, layout=layout)
+    strip_rules = resolve_rules(strip,
+                                keep_bytecode=compile_bytecode == 'both')
+    date_time = _source_date_time() if deterministic else None
     if root is None:
         root_manager = _automatic_tempdir
     else:
         root_manager = functools.partial(_passthrough, root)
 
-    with root_manager() as root_dir:
+    with (profile or NO_PROFILE).around(root_manager(), 'tempdir',
+                                        'cleanup') as root_dir:
         package = _LambdaPackage(root=root_dir, fqpn=fqpn)
-        package.install(pip_args)
-        kwargs = {}
-        if exclude_extension_modules:
-            kwargs['filter'] = package.not_extension_module
-        return package.to_zipfile(fileobj, **kwargs)
+        prepare(package, pip_args,
+                cache_dir=cache_dir, cache_max_size=cache_max_size,
+                compile_bytecode=compile_bytecode,
+                bytecode_interpreter=bytecode_interpreter,
+                unchecked_hash=unchecked_hash, wheelhouse=wheelhouse,
+                target=target, profile=profile, sync=sync,
+                _InstallCache=_InstallCache, _Wheelhouse=_Wheelhouse,
+                _StagingSync=_StagingSync)
+        build = None
+        if previous is not None:
+            build = _IncrementalBuild(previous)
+        zip_obj = write_package(
+            package, fileobj,
+            exclude_extension_modules=exclude_extension_modules,
+            jobs=jobs, previous=build,
+            sourceless=compile_bytecode == 'sourceless',
+            tree_shake=tree_shake, keep_modules=keep_modules,
+            strip_rules=strip_rules, max_size=max_size,
+            max_compressed_size=max_compressed_size, date_time=date_time,
+            layer=layer, target=target, profile=profile,
+            compression=compression, lazy_handler=lazy_handler,
+            prewarm=prewarm, layout=layout, dedup=dedup,
+            _TreeShaker=_TreeShaker, _StripFilter=_StripFilter,
+            _SizeBudget=_SizeBudget)
+        if build is not None:
+            build.save()
+        return zip_obj
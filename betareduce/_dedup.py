@@ -0,0 +1,192 @@
+import collections
+import logging
+import os
+import posixpath
+import stat
+
+from ._incremental import file_digest
+from . import _files, _zip
+
+logger = logging.getLogger(__name__)
+
+#: What a :py:class:`Deduplicator` can do with duplicate files:
+#: report them, or also replace them with symlinks to the first copy.
+DEDUP_MODES = ('report', 'link')
+
+#: The most bytes of compressed data a :py:class:`Deduplicator` holds
+#: in memory by default.
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 64
+
+DuplicateGroup = collections.namedtuple('DuplicateGroup',
+                                        'digest size arcnames')
+DuplicateGroup.__doc__ = """
+Files with identical contents: their SHA-256 ``digest``, the ``size``
+of each, and their ``arcnames``, the first of which is the copy kept
+when the rest are linked.
+"""
+
+
+def wasted(group):
+    """
+    Returns the bytes the duplicates in ``group`` take up beyond the
+    first copy.
+    """
+    return group.size * (len(group.arcnames) - 1)
+
+
+def check_dedup(dedup, layer=None, layout=None):
+    """
+    Raise :py:exc:`ValueError` if ``dedup`` isn't :py:class:`None` or
+    one of :py:data:`DEDUP_MODES`, or links duplicates in a package
+    that can't hold them: one split into a layer, whose files can't
+    link to the function's, or one laid out to be imported from the
+    archive, which :py:mod:`zipimport` doesn't resolve links in.
+    """
+    if dedup not in (None,) + DEDUP_MODES:
+        raise ValueError("dedup must be one of %r; got %r"
+                         % (DEDUP_MODES, dedup))
+    if dedup == 'link' and (layer is not None or layout is not None):
+        raise ValueError("dedup='link' can't be combined with layer or"
+                         " layout")
+
+
+def symlink_info(filename, arcname, date_time=None):
+    """
+    Returns a :py:class:`zipfile.ZipInfo` for a symlink at
+    ``arcname`` in place of the file at ``filename``, as
+    :py:func:`betareduce._zip.member_info` would for the file itself.
+    The member's contents are the link's target.  The Lambda
+    extractor, like ``unzip``, makes members with a Unix symlink mode
+    into symlinks.
+    """
+    zinfo = _zip.member_info(filename, arcname, date_time)
+    zinfo.create_system = 3
+    zinfo.external_attr = (stat.S_IFLNK | 0o777) << 16
+    return zinfo
+
+
+class Deduplicator(_zip.CompressionCache):
+    """
+    A filter for :py:meth:`betareduce._core.LambdaPackage.to_zipfile`
+    that finds files with identical contents, such as vendored copies
+    of a library, license files and data files shared between
+    distributions, and reports the bytes they waste.
+
+    Before the first file is filtered, every file under ``root`` is
+    grouped by size, and only files that share a size are hashed, so
+    most files are never read.  Of the files that pass through the
+    filter, the first with given contents is kept.  With ``link``,
+    the rest are excluded and :py:meth:`write_links` writes symlinks
+    to it in their place.
+
+    As a :py:class:`betareduce._zip.CompressionCache`, it can also
+    be passed to :py:meth:`betareduce._core.LambdaPackage.to_zipfile`
+    as ``compressor``, so that contents shared by several files are
+    compressed only once.
+
+    :param root: the path to the staging directory.
+    :type root: :py:class:`str`
+    :param link: (optional) if :py:class:`True`, replace duplicates
+        with symlinks.
+    :type link: :py:class:`bool`
+    :param max_size: (optional) the most bytes of compressed data to
+        hold in memory.  Once it's reached, further duplicates are
+        compressed again.
+    :type max_size: :py:class:`int`
+    """
+
+    def __init__(self, root, link=False, max_size=DEFAULT_CACHE_SIZE,
+                 _scan=_files.scan, _digest=file_digest, _logger=logger):
+        super(Deduplicator, self).__init__(max_size)
+        self.root = root
+        self.link = link
+        #: maps digests to the arcnames of the files included with
+        #: those contents, in the order they were filtered.
+        self.included = collections.OrderedDict()
+        #: ``(filename, target)`` pairs of the duplicates excluded in
+        #: favor of a link to the arcname ``target``.
+        self.links = []
+        self._scan = _scan
+        self._digest = _digest
+        self._logger = _logger
+        self._digests = None
+        self._sizes = {}
+
+    def _build(self):
+        by_size = collections.defaultdict(list)
+        for record in self._scan(self.root):
+            by_size[record.size].append(record)
+        self._digests = {}
+        for records in by_size.values():
+            if len(records) > 1:
+                for record in records:
+                    self._digests[record.arcname] = self._digest(record)
+
+    def key(self, filename):
+        if self._digests is None:
+            self._build()
+        return self._digests.get(_files.arcname(filename, self.root))
+
+    def __call__(self, filename):
+        digest = self.key(filename)
+        if digest is None:
+            return True
+        included = self.included.setdefault(digest, [])
+        if included and self.link:
+            self.links.append((filename, included[0]))
+            return False
+        included.append(_files.arcname(filename, self.root))
+        self._sizes[digest] = _files.getsize(filename)
+        return True
+
+    def duplicates(self):
+        """
+        Returns a :py:class:`list` of :py:class:`DuplicateGroup` for
+        the contents of which more than one copy was filtered, those
+        wasting the most bytes first.
+        """
+        linked = collections.defaultdict(list)
+        for filename, target in self.links:
+            linked[target].append(_files.arcname(filename, self.root))
+        groups = [DuplicateGroup(digest, self._sizes[digest],
+                                 arcnames + linked[arcnames[0]])
+                  for digest, arcnames in self.included.items()
+                  if len(arcnames) + len(linked[arcnames[0]]) > 1]
+        groups.sort(key=lambda group: (-wasted(group), group.arcnames))
+        return groups
+
+    def report(self):
+        """
+        Log each set of duplicates and the bytes they waste or, with
+        ``link``, saved.
+
+        :returns: the :py:class:`list` of :py:meth:`duplicates`.
+        """
+        groups = self.duplicates()
+        verb = 'saved' if self.link else 'wasted'
+        for group in groups:
+            self._logger.info("%d copies of %s %s %d bytes",
+                              len(group.arcnames), ', '.join(group.arcnames),
+                              verb, wasted(group))
+        self._logger.info("%d duplicate files %s %d bytes",
+                          sum(len(group.arcnames) - 1 for group in groups),
+                          verb, sum(wasted(group) for group in groups))
+        return groups
+
+    def write_links(self, zip_obj, date_time=None):
+        """
+        Write a symlink into ``zip_obj`` for each duplicate excluded
+        in favor of a link.  ``date_time`` is passed to
+        :py:func:`symlink_info`.
+
+        :returns: a :py:class:`list` of the links'
+            :py:class:`zipfile.ZipInfo`.
+        """
+        written = []
+        for filename, target in self.links:
+            arcname = _files.arcname(filename, self.root).replace(os.sep, '/')
+            zinfo = symlink_info(filename, arcname, date_time)
+            zip_obj.writestr(zinfo, posixpath.relpath(
+                target.replace(os.sep, '/'), posixpath.dirname(arcname)))
+            written.append(zinfo)
+        return written
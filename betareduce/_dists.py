@@ -0,0 +1,80 @@
+import collections
+import csv
+import os
+
+Distribution = collections.namedtuple('Distribution',
+                                      'name version metadata_dir paths')
+Distribution.__doc__ = """
+An installed distribution.
+
+``name`` and ``version`` are as they appear in the name of its
+``.dist-info`` directory, ``metadata_dir`` is the name of that
+directory relative to the staging directory, and ``paths`` are the
+files listed in its ``RECORD``, relative to the staging directory.
+"""
+
+
+def read_record(root, metadata_dir):
+    """
+    Returns the paths listed in the ``RECORD`` of the
+    ``metadata_dir`` directory under ``root``, normalized and relative
+    to ``root``.  Paths that escape ``root``, such as scripts, are
+    omitted.
+    """
+    try:
+        with open(os.path.join(root, metadata_dir, 'RECORD')) as f:
+            rows = list(csv.reader(f))
+    except (IOError, OSError):
+        return []
+    paths = []
+    for row in rows:
+        if not row:
+            continue
+        path = os.path.normpath(row[0])
+        if not path.startswith(os.pardir):
+            paths.append(path)
+    return paths
+
+
+def find_distributions(root, _listdir=os.listdir):
+    """
+    Returns a :py:class:`list` of the :py:class:`Distribution`\\ s
+    installed in ``root``, sorted by name.
+    """
+    distributions = []
+    for entry in _listdir(root):
+        if not entry.endswith('.dist-info'):
+            continue
+        name, _, version = entry[:-len('.dist-info')].partition('-')
+        distributions.append(Distribution(name=name,
+                                          version=version,
+                                          metadata_dir=entry,
+                                          paths=read_record(root, entry)))
+    return sorted(distributions, key=lambda dist: dist.name.lower())
+
+
+def top_level_owners(distributions):
+    """
+    Map the top-level files and directories that ``distributions``
+    installed, including their ``.dist-info`` directories, to the
+    names of the distributions that installed them.
+
+    :returns: :py:class:`dict`
+    """
+    owners = {}
+    for dist in distributions:
+        owners[dist.metadata_dir] = dist.name
+        for path in dist.paths:
+            owners.setdefault(path.split(os.sep, 1)[0], dist.name)
+    return owners
+
+
+def owner(owners, arcname):
+    """
+    Returns the name of the distribution that installed ``arcname``,
+    a path relative to the staging directory, according to
+    ``owners``.  Files no distribution claims are attributed to their
+    top-level directory or module.
+    """
+    top = arcname.replace(os.sep, '/').split('/', 1)[0]
+    return owners.get(top, top)
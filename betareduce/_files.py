@@ -0,0 +1,111 @@
+import os
+
+
+class FileRecord(str):
+    """
+    The path to a file under a staging directory, along with the
+    metadata a single :py:func:`os.stat` returned for it.  It's a
+    :py:class:`str`, so filters that expect a path accept it
+    unchanged.
+
+    :param path: the path to the file.
+    :type path: :py:class:`str`
+    :param arcname: ``path`` relative to the staging directory.
+    :type arcname: :py:class:`str`
+    :param stat_result: the file's metadata.
+    :type stat_result: :py:class:`os.stat_result`
+    """
+
+    def __new__(cls, path, arcname, stat_result):
+        self = super(FileRecord, cls).__new__(cls, path)
+        self.arcname = arcname
+        self.stat_result = stat_result
+        return self
+
+    @property
+    def size(self):
+        return self.stat_result.st_size
+
+    @property
+    def mode(self):
+        return self.stat_result.st_mode
+
+    @property
+    def mtime(self):
+        return self.stat_result.st_mtime
+
+
+def _entry_stat(entry):
+    try:
+        return entry.stat()
+    except OSError:
+        # a dangling symlink; fail when it's written, as os.walk
+        # would have, rather than when it may yet be filtered out.
+        return entry.stat(follow_symlinks=False)
+
+
+def _scan(directory, prefix, sort, scandir):
+    try:
+        with scandir(directory) as iterator:
+            entries = list(iterator)
+    except OSError:
+        return
+    if sort:
+        entries.sort(key=lambda entry: entry.name)
+    subdirectories = []
+    for entry in entries:
+        arcname = os.path.join(prefix, entry.name) if prefix else entry.name
+        if entry.is_dir():
+            if not entry.is_symlink():
+                subdirectories.append((entry.path, arcname))
+        else:
+            yield FileRecord(entry.path, arcname, _entry_stat(entry))
+    for path, arcname in subdirectories:
+        for record in _scan(path, arcname, sort, scandir):
+            yield record
+
+
+def scan(root, sort=False, _scandir=os.scandir):
+    """
+    Yield a :py:class:`FileRecord` for every file under ``root``, in
+    the order :py:func:`os.walk` would: each directory's files before
+    its subdirectories', without following symlinks to directories.
+
+    :py:func:`os.scandir` provides each file's type without a system
+    call, and its metadata with one, so that nothing downstream has
+    to stat it again.
+
+    :param sort: (optional) if :py:class:`True`, yield the files in
+        each directory, and then its subdirectories, in sorted order
+        rather than the order the filesystem lists them in.
+    :type sort: :py:class:`bool`
+    """
+    return _scan(root, '', sort, _scandir)
+
+
+def stat(path, _stat=os.stat):
+    """
+    Returns the :py:class:`os.stat_result` of ``path``, without a
+    system call if it's a :py:class:`FileRecord`.
+    """
+    if isinstance(path, FileRecord):
+        return path.stat_result
+    return _stat(path)
+
+
+def getsize(path):
+    """
+    Returns the size of the file at ``path``, without a system call
+    if it's a :py:class:`FileRecord`.
+    """
+    return stat(path).st_size
+
+
+def arcname(path, root):
+    """
+    Returns ``path`` relative to the staging directory ``root``,
+    without any string manipulation if it's a :py:class:`FileRecord`.
+    """
+    if isinstance(path, FileRecord):
+        return path.arcname
+    return os.path.relpath(path, root)
@@ -0,0 +1,168 @@
+import collections
+import logging
+import os
+
+from . import _files
+
+logger = logging.getLogger(__name__)
+
+
+class Rule(object):
+    """
+    A named rule that identifies files a Lambda package can do
+    without.
+
+    :param name: the rule's name.
+    :type name: :py:class:`str`
+    :param excludes: a callable that accepts the components of a path
+        relative to the staging directory, as a :py:class:`tuple`,
+        and a callable that returns :py:class:`True` if the directory
+        with the components it's given is a package, and returns
+        :py:class:`True` if the file should be excluded.
+    """
+
+    def __init__(self, name, excludes):
+        self.name = name
+        self.excludes = excludes
+
+    def __repr__(self):
+        return 'Rule(%r)' % (self.name,)
+
+
+def _in_directory(names):
+    return lambda parts, is_package: any(part in names
+                                         for part in parts[:-1])
+
+
+def _in_data_directory(names):
+    # packages such as botocore.docs are imported, whatever their name.
+    return lambda parts, is_package: any(
+        part in names and not is_package(parts[:i + 1])
+        for i, part in enumerate(parts[:-1]))
+
+
+def _has_suffix(suffixes):
+    return lambda parts, is_package: parts[-1].endswith(suffixes)
+
+
+#: Metadata files that are kept when stripping ``.dist-info``
+#: directories, so that :py:mod:`importlib.metadata` can still find
+#: distributions and their entry points.
+DIST_INFO_KEEP = ('METADATA', 'entry_points.txt')
+
+
+def _unneeded_dist_info(parts, is_package):
+    return (len(parts) > 1 and
+            parts[0].endswith(('.dist-info', '.egg-info')) and
+            parts[-1] not in DIST_INFO_KEEP)
+
+
+#: All the rules, by name.
+RULES = collections.OrderedDict((rule.name, rule) for rule in [
+    Rule('pycache', _in_directory(('__pycache__',))),
+    Rule('tests', _in_directory(('tests', 'test'))),
+    Rule('dist-info', _unneeded_dist_info),
+    Rule('stubs', lambda parts, is_package: (parts[-1].endswith('.pyi') or
+                                             parts[-1] == 'py.typed')),
+    Rule('docs', lambda parts, is_package: (
+        _in_data_directory(('doc', 'docs', 'examples'))(parts, is_package) or
+        _has_suffix(('.rst', '.md'))(parts, is_package))),
+    Rule('c-sources', _has_suffix(('.c', '.h', '.cc', '.cpp', '.hpp',
+                                   '.pyx', '.pxd', '.pxi'))),
+])
+
+#: Named groups of rules.
+PROFILES = collections.OrderedDict([
+    ('safe', ('pycache', 'stubs', 'docs', 'c-sources')),
+    ('aggressive', ('pycache', 'stubs', 'docs', 'c-sources',
+                    'tests', 'dist-info')),
+])
+
+
+def resolve_rules(names, keep_bytecode=False, _logger=logger):
+    """
+    Expand a list of profile and rule names into rules.
+
+    :param names: profile and rule names.
+    :type names: iterable of :py:class:`str`
+    :param keep_bytecode: (optional) if :py:class:`True`, leave out
+        the ``pycache`` rule, because the package's bytecode was
+        compiled into ``__pycache__`` directories.
+    :type keep_bytecode: :py:class:`bool`
+    :raises ValueError: ...when given an unknown name.
+
+    :returns: a :py:class:`list` of :py:class:`Rule`, without
+        duplicates.
+    """
+    rules = []
+    for name in names:
+        if name in PROFILES:
+            expanded = PROFILES[name]
+        elif name in RULES:
+            expanded = (name,)
+        else:
+            raise ValueError("unknown profile or rule %r; choose from %s"
+                             % (name, ', '.join(choices())))
+        rules.extend(RULES[rule] for rule in expanded
+                     if RULES[rule] not in rules)
+    if keep_bytecode and RULES['pycache'] in rules:
+        _logger.info("keeping __pycache__ for the compiled bytecode")
+        rules.remove(RULES['pycache'])
+    return rules
+
+
+def choices():
+    """
+    Returns the names of all profiles and rules.
+    """
+    return list(PROFILES) + list(RULES)
+
+
+class StripFilter(object):
+    """
+    A filter for :py:meth:`betareduce._core.LambdaPackage.to_zipfile`
+    that excludes files matched by any of its rules, and tracks the
+    bytes each rule saved.  Directories that are packages, with an
+    ``__init__.py``, are checked for on the filesystem.
+
+    :param root: the path to the staging directory.
+    :type root: :py:class:`str`
+    :param rules: the rules to apply.
+    :type rules: iterable of :py:class:`Rule`
+    """
+
+    def __init__(self, root, rules, _getsize=_files.getsize,
+                 _isfile=os.path.isfile, _logger=logger):
+        self.root = root
+        self.rules = list(rules)
+        #: maps rule names to the bytes each has saved.
+        self.saved = collections.OrderedDict(
+            (rule.name, 0) for rule in self.rules)
+        self._getsize = _getsize
+        self._isfile = _isfile
+        self._logger = _logger
+        self._packages = {}
+
+    def _is_package(self, parts):
+        if parts not in self._packages:
+            self._packages[parts] = self._isfile(
+                os.path.join(self.root, *parts + ('__init__.py',)))
+        return self._packages[parts]
+
+    def __call__(self, filename):
+        parts = tuple(_files.arcname(filename, self.root).split(os.sep))
+        for rule in self.rules:
+            if rule.excludes(parts, self._is_package):
+                self.saved[rule.name] += self._getsize(filename)
+                return False
+        return True
+
+    def report(self):
+        """
+        Log the bytes saved by each rule.
+
+        :returns: a :py:class:`dict` mapping rule names to bytes saved.
+        """
+        for name, saved in self.saved.items():
+            self._logger.info("stripping %s saved %d bytes", name, saved)
+        return dict(self.saved)
@@ -0,0 +1,263 @@
+import ast
+import collections
+import fnmatch
+import logging
+import os
+
+from . import _files
+
+logger = logging.getLogger(__name__)
+
+_SOURCE_SUFFIXES = ('.py',)
+_MODULE_SUFFIXES = ('.py', '.pyc', '.so', '.pyd')
+_DYNAMIC_IMPORTERS = ('import_module', '__import__')
+
+
+def _module_stem(filename):
+    """
+    Returns the name of the module ``filename`` defines, or
+    :py:class:`None` if it isn't a module.  Extension modules and
+    cached bytecode carry tags such as ``.cpython-311-x86_64-linux-gnu``
+    between the module name and the suffix.
+    """
+    if not filename.endswith(_MODULE_SUFFIXES):
+        return None
+    stem = filename.split('.', 1)[0]
+    return stem if stem.isidentifier() else None
+
+
+class ModuleIndex(object):
+    """
+    An index of the modules and packages under ``root`` and the files
+    that belong to them.
+
+    :param root: the path to a staging directory.
+    :type root: :py:class:`str`
+    """
+
+    def __init__(self, root, _walk=os.walk):
+        self.root = root
+        #: maps module names to the files that implement them.
+        self.modules = collections.defaultdict(list)
+        #: maps every file under ``root`` to the module or regular
+        #: package that owns it, or :py:class:`None`.
+        self.owners = {}
+        #: the names of regular packages, i.e. those with ``__init__``.
+        self.packages = set()
+        self._index(_walk)
+
+    def _package_name(self, dirpath):
+        relative = os.path.relpath(dirpath, self.root)
+        if relative == os.curdir:
+            return ''
+        parts = relative.split(os.sep)
+        if parts[-1] == '__pycache__':
+            parts.pop()
+        if all(part.isidentifier() for part in parts):
+            return '.'.join(parts)
+        return None
+
+    def _index(self, walk):
+        # the nearest regular package enclosing each directory owns
+        # its data files.
+        enclosing = {}
+        for dirpath, dirnames, filenames in walk(self.root):
+            package = self._package_name(dirpath)
+            owner = enclosing.get(os.path.dirname(dirpath))
+            if package and '__init__' in map(_module_stem, filenames):
+                self.packages.add(package)
+                owner = package
+            enclosing[dirpath] = owner
+            for filename in filenames:
+                path = os.path.normpath(os.path.join(dirpath, filename))
+                stem = _module_stem(filename)
+                if package is None or stem is None:
+                    self.owners[path] = owner
+                    continue
+                if stem == '__init__':
+                    name = package
+                else:
+                    name = package + '.' + stem if package else stem
+                self.modules[name].append(path)
+                self.owners[path] = name
+
+    def source(self, name):
+        """
+        Returns the path of the source for the module ``name``, or
+        :py:class:`None` if it has none.
+        """
+        for path in self.modules.get(name, ()):
+            if (path.endswith(_SOURCE_SUFFIXES) and
+                    os.path.basename(os.path.dirname(path)) != '__pycache__'):
+                return path
+        return None
+
+
+def _imported_names(tree, name, is_package):
+    """
+    Yield the absolute names of the modules that the module ``name``,
+    whose syntax tree is ``tree``, may import.
+    """
+    package = name if is_package else name.rpartition('.')[0]
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield alias.name
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ''
+            if node.level:
+                parts = package.split('.')
+                if node.level > 1:
+                    parts = parts[:-(node.level - 1)]
+                base = '.'.join(part for part in parts + [base] if part)
+            if base:
+                yield base
+            for alias in node.names:
+                if alias.name != '*':
+                    yield (base + '.' if base else '') + alias.name
+        elif (isinstance(node, ast.Call) and node.args and
+              isinstance(node.args[0], ast.Constant) and
+              isinstance(node.args[0].value, str)):
+            func = node.func
+            func_name = getattr(func, 'attr', getattr(func, 'id', None))
+            if func_name in _DYNAMIC_IMPORTERS:
+                yield node.args[0].value
+
+
+class ImportGraph(object):
+    """
+    The static import graph of the modules under a staging directory.
+
+    Every ``import`` statement in a module counts, including those in
+    functions and ``try`` blocks, as do calls to
+    :py:func:`importlib.import_module` and :py:func:`__import__` with
+    a literal name.  Other dynamic imports can't be seen.
+
+    :param index: the modules under the staging directory.
+    :type index: :py:class:`ModuleIndex`
+    """
+
+    def __init__(self, index, _logger=logger):
+        self.index = index
+        self._logger = _logger
+
+    def imports(self, name):
+        """
+        Returns the :py:class:`set` of names of modules under the
+        staging directory that the module ``name`` imports.
+        """
+        source = self.index.source(name)
+        if source is None:
+            return set()
+        with open(source, 'rb') as f:
+            try:
+                tree = ast.parse(f.read(), source)
+            except (SyntaxError, ValueError):
+                self._logger.info("can't parse %s; ignoring its imports",
+                                  source)
+                return set()
+        found = set()
+        for imported in _imported_names(tree, name,
+                                        name in self.index.packages):
+            # "import six.moves.urllib" imports six even though
+            # six.moves isn't a module on disk.
+            while imported and imported not in self.index.modules:
+                imported = imported.rpartition('.')[0]
+            if imported:
+                found.add(imported)
+        return found
+
+    def reachable(self, roots):
+        """
+        Returns the :py:class:`set` of names of modules under the
+        staging directory transitively imported by ``roots``,
+        including ``roots`` themselves and every enclosing package.
+        """
+        seen = set()
+        queue = collections.deque(roots)
+        while queue:
+            name = queue.popleft()
+            if name in seen:
+                continue
+            seen.add(name)
+            parent = name.rpartition('.')[0]
+            if parent:
+                queue.append(parent)
+            queue.extend(self.imports(name) - seen)
+        return seen
+
+
+class TreeShaker(object):
+    """
+    A filter for :py:meth:`betareduce._core.LambdaPackage.to_zipfile`
+    that excludes modules the handler can never import, along with
+    the data files of regular packages it never imports.  Files that
+    don't belong to any package, such as ``.dist-info`` metadata, are
+    always included.
+
+    :param root: the path to the staging directory.
+    :type root: :py:class:`str`
+    :param entry: the name of the module containing the handler.
+    :type entry: :py:class:`str`
+    :param keep: (optional) :py:mod:`fnmatch` patterns of module
+        names that are imported dynamically, such as
+        ``"sqlalchemy.dialects.*"``; these and everything they import
+        are included.
+    :type keep: iterable of :py:class:`str`
+
+    :raises ValueError: ...when it first filters a file, if ``entry``
+        isn't under ``root``.
+    """
+
+    def __init__(self, root, entry, keep=(),
+                 _ModuleIndex=ModuleIndex, _logger=logger):
+        self.root = root
+        self.entry = entry
+        self.keep = tuple(keep)
+        #: the paths of the files that have been excluded.
+        self.dropped = []
+        self._ModuleIndex = _ModuleIndex
+        self._logger = _logger
+        self._index = None
+        self._reachable = None
+
+    def _build(self):
+        index = self._ModuleIndex(self.root)
+        if self.entry not in index.modules:
+            # every module would be unreachable, the handler's included.
+            raise ValueError("handler module %s not found under %s"
+                             % (self.entry, self.root))
+        self._index = index
+        roots = [self.entry]
+        roots.extend(name for name in self._index.modules
+                     if any(fnmatch.fnmatchcase(name, pattern)
+                            for pattern in self.keep))
+        graph = ImportGraph(self._index, _logger=self._logger)
+        self._reachable = graph.reachable(roots)
+
+    def __call__(self, filename):
+        if self._index is None:
+            self._build()
+        owner = self._index.owners.get(os.path.normpath(filename))
+        if owner is None or owner in self._reachable:
+            return True
+        self.dropped.append(filename)
+        return False
+
+    def report(self):
+        """
+        Log which modules were dropped and how many bytes that saved.
+
+        :returns: a :py:class:`list` of the dropped modules' names.
+        """
+        if self._index is None:
+            return []
+        owners = sorted(set(self._index.owners[os.path.normpath(path)]
+                            for path in self.dropped))
+        size = sum(_files.getsize(path) for path in self.dropped)
+        for owner in owners:
+            self._logger.info("tree shaking dropped %s", owner)
+        self._logger.info("tree shaking dropped %d files in %d modules"
+                          " (%d bytes)", len(self.dropped), len(owners),
+                          size)
+        return owners
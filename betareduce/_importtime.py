@@ -0,0 +1,79 @@
+import collections
+import re
+import subprocess
+import sys
+
+#: The default number of imports :py:func:`heaviest` returns.
+DEFAULT_TOP = 20
+
+# written to standard error just before the module is imported, so
+# that the interpreter's own start-up imports can be told apart.
+_MARKER = 'betareduce: importing'
+
+_LINE = re.compile(r'^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|( +)(\S+)\s*$')
+
+ImportCost = collections.namedtuple('ImportCost',
+                                    'module self_us cumulative_us depth')
+ImportCost.__doc__ = """
+How long importing ``module`` took, in microseconds: ``self_us``
+excluding the modules it imported and ``cumulative_us`` including
+them.  ``depth`` is 1 for modules imported directly, 2 for those they
+imported, and so on.
+"""
+
+
+def parse(output):
+    """
+    Returns an :py:class:`ImportCost` for each import ``python -X
+    importtime`` reported in ``output`` after the marker
+    :py:func:`measure` writes, in the order reported: each module
+    after those it imported.  Without the marker, every import is
+    returned.
+    """
+    lines = output.splitlines()
+    if _MARKER in lines:
+        lines = lines[lines.index(_MARKER) + 1:]
+    costs = []
+    for line in lines:
+        match = _LINE.match(line)
+        if match is not None:
+            self_us, cumulative_us, indent, module = match.groups()
+            costs.append(ImportCost(module, int(self_us), int(cumulative_us),
+                                    (len(indent) + 1) // 2))
+    return costs
+
+
+def measure(root, module, interpreter=None,
+            _check_output=subprocess.check_output):
+    """
+    Import ``module`` from the staging directory ``root`` in a fresh
+    interpreter run with ``-X importtime``, and return what each
+    import cost, as :py:func:`parse` does.  The interpreter is
+    isolated from the environment and its own ``site-packages``, so
+    only the standard library and ``root`` can be imported, as on
+    Lambda.
+
+    :param interpreter: (optional) the path of the interpreter to
+        run, which should match the Lambda runtime.  Defaults to this
+        interpreter.
+    :type interpreter: :py:class:`str`
+
+    :raises subprocess.CalledProcessError: ...when importing
+        ``module`` fails.
+    """
+    code = ('import sys; sys.path.insert(0, %r); sys.stderr.write(%r);'
+            ' sys.stderr.flush(); import %s' % (root, _MARKER + '\n',
+                                                 module))
+    cmd = [interpreter or sys.executable, '-I', '-S', '-X', 'importtime',
+           '-c', code]
+    output = _check_output(cmd, stderr=subprocess.STDOUT)
+    return parse(output.decode('utf-8', 'replace'))
+
+
+def heaviest(costs, top=DEFAULT_TOP):
+    """
+    Returns the ``top`` most expensive of ``costs`` by cumulative
+    time, most expensive first.
+    """
+    return sorted(costs, key=lambda cost: cost.cumulative_us,
+                  reverse=True)[:top]
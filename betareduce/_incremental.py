@@ -0,0 +1,201 @@
+import hashlib
+import json
+import logging
+import os
+import struct
+import zipfile
+
+from . import _files, _zip
+
+logger = logging.getLogger(__name__)
+
+#: Appended to an archive's path to name its manifest.
+MANIFEST_SUFFIX = '.manifest.json'
+
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+
+
+def manifest_path(archive):
+    """
+    Returns the path of the manifest that describes ``archive``.
+    """
+    return archive + MANIFEST_SUFFIX
+
+
+def file_digest(path):
+    """
+    Returns the hex SHA-256 digest of the contents of ``path``.
+    """
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_zip.CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def iter_raw(archive, zinfo):
+    """
+    Yield the still-compressed data of the member described by
+    ``zinfo`` from the archive at the path ``archive``, a chunk at a
+    time.
+    """
+    with open(archive, 'rb') as f:
+        f.seek(zinfo.header_offset)
+        header = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+        if header[0] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile("bad local header for %r in %r"
+                                     % (zinfo.filename, archive))
+        filename_length, extra_length = header[-2:]
+        f.seek(filename_length + extra_length, os.SEEK_CUR)
+        remaining = zinfo.compress_size
+        while remaining:
+            chunk = f.read(min(remaining, _zip.CHUNK_SIZE))
+            if not chunk:
+                raise zipfile.BadZipFile("truncated member %r in %r"
+                                         % (zinfo.filename, archive))
+            remaining -= len(chunk)
+            yield chunk
+
+
+def read_raw(archive, zinfo):
+    """
+    Read all the still-compressed data of the member described by
+    ``zinfo`` from the archive at the path ``archive``.
+    """
+    return b''.join(iter_raw(archive, zinfo))
+
+
+class IncrementalBuild(object):
+    """
+    Rebuilds an archive by copying the compressed data of members
+    that haven't changed since the ``previous`` archive was built,
+    and compressing only new or changed files.
+
+    A member is unchanged when the manifest stored beside
+    ``previous`` records the same size and modification time for
+    it, or failing that the same SHA-256 digest, and was compressed
+    with the same settings.
+
+    :param previous: the path of the previously built archive.  The
+        new manifest is written beside it by :py:meth:`save`, so the
+        new archive should replace it.
+    :type previous: :py:class:`str`
+    """
+
+    def __init__(self, previous, _logger=logger):
+        self.previous = previous
+        self.manifest_path = manifest_path(previous)
+        self.files = {}
+        self.reused = 0
+        self._logger = _logger
+        self._manifest = {}
+        self._members = {}
+        try:
+            with open(self.manifest_path) as f:
+                self._manifest = json.load(f)
+            with zipfile.ZipFile(previous) as zip_obj:
+                self._members = {zinfo.filename: zinfo
+                                 for zinfo in zip_obj.infolist()}
+        except (OSError, ValueError, zipfile.BadZipFile):
+            _logger.info("no usable previous build at %r; rebuilding",
+                         previous)
+            self._manifest = {}
+
+    def _previous_member(self, arcname, stat_result, compression):
+        """
+        Returns the manifest record and :py:class:`zipfile.ZipInfo`
+        of ``arcname`` in the previous archive if it was compressed
+        with the same settings and may not have changed, or ``(None,
+        None)``.
+        """
+        recorded = self._manifest.get(arcname)
+        zinfo = self._members.get(arcname)
+        if (recorded is None or zinfo is None or
+                recorded['compression'] != list(compression) or
+                recorded['size'] != stat_result.st_size or
+                zinfo.CRC != recorded['crc'] or
+                zinfo.file_size != recorded['size']):
+            return None, None
+        return recorded, zinfo
+
+    def _reuse(self, filename, arcname, compression):
+        """
+        Decide whether ``filename`` can be copied from the previous
+        archive.
+
+        :returns: a 2-tuple of the file's SHA-256 digest and either
+            the :py:class:`zipfile.ZipInfo` of its member in the
+            previous archive or :py:class:`None`.
+        """
+        stat_result = _files.stat(filename)
+        recorded, previous_zinfo = self._previous_member(
+            arcname, stat_result, compression)
+        unchanged = recorded is not None
+        if unchanged and recorded['mtime'] == stat_result.st_mtime:
+            digest = recorded['sha256']
+        else:
+            digest = file_digest(filename)
+        if not unchanged or recorded['sha256'] != digest:
+            previous_zinfo = None
+        self.files[arcname] = {'size': stat_result.st_size,
+                               'mtime': stat_result.st_mtime,
+                               'sha256': digest,
+                               'compression': list(compression)}
+        return previous_zinfo
+
+    def _reused_info(self, filename, arcname, previous_zinfo, date_time):
+        zinfo = _zip.member_info(filename, arcname, date_time)
+        zinfo.compress_type = previous_zinfo.compress_type
+        zinfo.CRC = previous_zinfo.CRC
+        zinfo.compress_size = previous_zinfo.compress_size
+        self.reused += 1
+        return zinfo
+
+    def compress(self, filename, arcname, compress_type, compresslevel,
+                 date_time=None,
+                 _compress=_zip.compress, _read_raw=read_raw):
+        """
+        A drop-in replacement for :py:func:`betareduce._zip.compress`
+        that reuses unchanged members of the previous archive and
+        records every member in the new manifest.
+        """
+        previous_zinfo = self._reuse(filename, arcname,
+                                     (compress_type, compresslevel))
+        if previous_zinfo is not None:
+            zinfo = self._reused_info(filename, arcname, previous_zinfo,
+                                      date_time)
+            data = _read_raw(self.previous, previous_zinfo)
+        else:
+            zinfo, data = _compress(filename, arcname,
+                                    compress_type, compresslevel, date_time)
+        self.files[arcname]['crc'] = zinfo.CRC
+        return zinfo, data
+
+    def stream(self, zip_obj, filename, arcname, date_time=None,
+               _stream=_zip.stream, _iter_raw=iter_raw):
+        """
+        A drop-in replacement for :py:func:`betareduce._zip.stream`
+        that copies unchanged members of the previous archive a chunk
+        at a time and records every member in the new manifest.
+        """
+        previous_zinfo = self._reuse(
+            filename, arcname,
+            _zip.archive_compression(zip_obj, arcname))
+        if previous_zinfo is not None:
+            zinfo = self._reused_info(filename, arcname, previous_zinfo,
+                                      date_time)
+            _zip.write_compressed(zip_obj, zinfo,
+                                  _iter_raw(self.previous, previous_zinfo))
+        else:
+            _stream(zip_obj, filename, arcname, date_time=date_time)
+            zinfo = zip_obj.getinfo(arcname)
+        self.files[arcname]['crc'] = zinfo.CRC
+
+    def save(self):
+        """
+        Write the manifest of the new archive beside ``previous``.
+        """
+        with open(self.manifest_path, 'w') as f:
+            json.dump(self.files, f, sort_keys=True)
+        self._logger.info("reused %d of %d members from %r",
+                          self.reused, len(self.files), self.previous)
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import os
+import zipfile
+
+from . import _dists, _files
+from ._incremental import file_digest
+
+logger = logging.getLogger(__name__)
+
+#: Where AWS Lambda looks for Python packages in a layer.
+LAYER_PREFIX = 'python/'
+
+#: Appended to a layer's path to name the file holding the digest of
+#: its contents.
+DIGEST_SUFFIX = '.sha256'
+
+
+def digest_path(layer):
+    """
+    Returns the path of the file that holds the digest of the layer
+    at ``layer``.
+    """
+    return layer + DIGEST_SUFFIX
+
+
+class FunctionFiles(object):
+    """
+    A filter for :py:meth:`betareduce._core.LambdaPackage.to_zipfile`
+    that includes only the function's own code: the files installed
+    by the distribution that provides the handler's module, or if no
+    distribution does, the handler's top-level package or module.
+
+    :param root: the path to the staging directory.
+    :type root: :py:class:`str`
+    :param module_name: the name of the module containing the
+        handler.
+    :type module_name: :py:class:`str`
+    """
+
+    def __init__(self, root, module_name,
+                 _find_distributions=_dists.find_distributions):
+        self.root = root
+        self.module_name = module_name
+        #: the top-level files and directories of the function's own
+        #: code.
+        self.top_levels = None
+        self._find_distributions = _find_distributions
+
+    def _build(self):
+        top = self.module_name.split('.', 1)[0]
+        owners = _dists.top_level_owners(self._find_distributions(self.root))
+        distribution = owners.get(top, owners.get(top + '.py'))
+        if distribution is None:
+            self.top_levels = {top, top + '.py'}
+        else:
+            # __pycache__ at the top level can hold the bytecode of
+            # any distribution's modules.
+            self.top_levels = {name for name, owner in owners.items()
+                               if owner == distribution and
+                               name != '__pycache__'}
+
+    def __call__(self, filename):
+        if self.top_levels is None:
+            self._build()
+        arcname = _files.arcname(filename, self.root)
+        return arcname.split(os.sep, 1)[0] in self.top_levels
+
+
+def layer_digest(members, settings=()):
+    """
+    Returns the hex SHA-256 digest that identifies a layer of
+    ``members``: their paths relative to the staging directory and
+    their contents, along with any ``settings`` that change how
+    they're written.
+
+    :param members: the files in the layer.
+    :type members: iterable of :py:class:`betareduce._files.FileRecord`
+    """
+    hasher = hashlib.sha256()
+    hasher.update(repr(tuple(settings)).encode('utf-8'))
+    for record in sorted(members, key=lambda record: record.arcname):
+        hasher.update(b'\0' + record.arcname.encode('utf-8') + b'\0' +
+                      file_digest(record).encode('ascii'))
+    return hasher.hexdigest()
+
+
+def write_layer(package, path, filter=lambda path: True, jobs=1,
+                budget=None, date_time=None, profile=None,
+                compression=zipfile.ZIP_STORED, compresslevel=None,
+                _open=open, _replace=os.replace, _remove=os.remove,
+                _logger=logger):
+    """
+    Write the files under ``package``'s staging directory that pass
+    ``filter`` into a Lambda layer at ``path``, beneath
+    :py:data:`LAYER_PREFIX`.
+
+    The digest of the layer's contents is stored beside it, and if
+    it's unchanged since the layer at ``path`` was written, the layer
+    isn't written again, so that it needn't be uploaded again.
+
+    :param package: the prepared package.
+    :type package: :py:class:`betareduce._core.LambdaPackage`
+    :param path: where to write the layer.
+    :type path: :py:class:`str`
+
+    The remaining parameters are passed to
+    :py:meth:`betareduce._core.LambdaPackage.to_zipfile`.  ``budget``
+    is charged for the layer's members even if it isn't rewritten.
+
+    :returns: :py:class:`True` if the layer was written and
+        :py:class:`False` if it was unchanged.
+    """
+    members = [record for record in package.files() if filter(record)]
+    digest = layer_digest(members, settings=(date_time, compression,
+                                             compresslevel))
+    try:
+        with open(digest_path(path)) as f:
+            previous_digest = f.read().strip()
+    except (IOError, OSError):
+        previous_digest = None
+    if previous_digest == digest and os.path.exists(path):
+        _logger.info("layer %s is unchanged (%s)", path, digest)
+        if budget is not None:
+            with zipfile.ZipFile(path) as zip_obj:
+                for zinfo in zip_obj.infolist():
+                    budget.add(zinfo, zinfo.filename[len(LAYER_PREFIX):])
+        return False
+
+    partial = path + '.partial'
+    selected = set(members)
+    try:
+        with _open(partial, 'wb') as fileobj:
+            package.to_zipfile(fileobj, filter=selected.__contains__,
+                               jobs=jobs, budget=budget, date_time=date_time,
+                               prefix=LAYER_PREFIX, entry=False,
+                               profile=profile, compression=compression,
+                               compresslevel=compresslevel).close()
+    except BaseException:
+        _remove(partial)
+        raise
+    _replace(partial, path)
+    with open(digest_path(path), 'w') as f:
+        f.write(digest + '\n')
+    _logger.info("wrote layer %s with %d files (%s)",
+                 path, len(members), digest)
+    return True
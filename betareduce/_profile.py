@@ -0,0 +1,204 @@
+import collections
+import contextlib
+import functools
+import heapq
+import json
+import sys
+import threading
+import time
+
+#: The default number of slowest and largest members a
+#: :py:class:`BuildProfile` reports.
+DEFAULT_TOP = 10
+
+Member = collections.namedtuple('Member',
+                                'arcname seconds size compressed_size')
+Member.__doc__ = """
+A member of a profiled archive: its name, the seconds spent
+compressing it, and its sizes before and after.
+"""
+
+
+class BuildProfile(object):
+    """
+    Times the phases of a build and the members it writes, for
+    :py:func:`betareduce._core.create` and
+    :py:meth:`betareduce._core.LambdaPackage.to_zipfile`.
+
+    Most phases are wall-clock time: ``tempdir``, ``install``,
+    ``compile``, ``handler`` and ``cleanup``.  ``enumerate``,
+    ``filter`` and ``compress`` are summed over every file, as
+    they're interleaved; with several jobs, ``compress`` is summed
+    across workers and may exceed the time the build took.
+
+    :param top: (optional) how many of the slowest and largest
+        members to report.
+    :type top: :py:class:`int`
+    """
+
+    def __init__(self, top=DEFAULT_TOP, _clock=time.perf_counter):
+        self.top = top
+        #: seconds spent in each phase, in the order they began.
+        self.phases = collections.OrderedDict()
+        #: a :py:class:`Member` for every member written.
+        self.members = []
+        self._clock = _clock
+        self._started = _clock()
+        self._lock = threading.Lock()
+
+    def add(self, phase, seconds):
+        """
+        Add ``seconds`` to the time spent in ``phase``.
+        """
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        A context manager that adds the time spent inside it to the
+        phase ``name``.
+        """
+        start = self._clock()
+        try:
+            yield
+        finally:
+            self.add(name, self._clock() - start)
+
+    @contextlib.contextmanager
+    def around(self, manager, setup, teardown):
+        """
+        A context manager that enters and exits ``manager``, timing
+        entering it as the phase ``setup`` and exiting it as the
+        phase ``teardown``.
+        """
+        with self.phase(setup):
+            value = manager.__enter__()
+        try:
+            yield value
+        except BaseException:
+            with self.phase(teardown):
+                if not manager.__exit__(*sys.exc_info()):
+                    raise
+        else:
+            with self.phase(teardown):
+                manager.__exit__(None, None, None)
+
+    def timed(self, phase, function):
+        """
+        Returns ``function`` wrapped to add the time each call takes
+        to ``phase``.
+        """
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            with self.phase(phase):
+                return function(*args, **kwargs)
+        return timed
+
+    def timed_iter(self, phase, iterable):
+        """
+        Yields from ``iterable``, adding the time each item takes to
+        produce to ``phase``.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.phase(phase):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def member(self, zinfo, seconds):
+        """
+        Record that the member ``zinfo`` took ``seconds`` to
+        compress.
+        """
+        with self._lock:
+            self.phases['compress'] = (self.phases.get('compress', 0.0) +
+                                       seconds)
+            self.members.append(Member(zinfo.filename, seconds,
+                                       zinfo.file_size, zinfo.compress_size))
+
+    def compress(self, compress):
+        """
+        Returns ``compress``, a :py:func:`betareduce._zip.compress`,
+        wrapped to record each member it compresses.
+        """
+        @functools.wraps(compress)
+        def profiled_compress(*args, **kwargs):
+            start = self._clock()
+            zinfo, data = compress(*args, **kwargs)
+            self.member(zinfo, self._clock() - start)
+            return zinfo, data
+        return profiled_compress
+
+    def stream(self, stream):
+        """
+        Returns ``stream``, a :py:func:`betareduce._zip.stream`,
+        wrapped to record each member it writes.
+        """
+        @functools.wraps(stream)
+        def profiled_stream(zip_obj, *args, **kwargs):
+            start = self._clock()
+            stream(zip_obj, *args, **kwargs)
+            self.member(zip_obj.filelist[-1], self._clock() - start)
+        return profiled_stream
+
+    def to_dict(self):
+        """
+        Returns the profile as a :py:class:`dict` that
+        :py:mod:`json` can serialize.
+        """
+        def members(key):
+            return [member._asdict()
+                    for member in heapq.nlargest(self.top, self.members,
+                                                 key=key)]
+
+        with self._lock:
+            return {
+                'seconds': self._clock() - self._started,
+                'phases': dict(self.phases),
+                'files': len(self.members),
+                'bytes_in': sum(member.size for member in self.members),
+                'bytes_out': sum(member.compressed_size
+                                 for member in self.members),
+                'slowest': members(lambda member: member.seconds),
+                'largest': members(lambda member: member.size),
+            }
+
+    def dump(self, fileobj):
+        """
+        Write the profile into ``fileobj`` as JSON.
+        """
+        json.dump(self.to_dict(), fileobj, indent=2)
+        fileobj.write('\n')
+
+
+class NullProfile(object):
+    """
+    A :py:class:`BuildProfile` that records nothing, for builds that
+    aren't profiled.
+    """
+
+    def phase(self, name):
+        return contextlib.nullcontext()
+
+    def around(self, manager, setup, teardown):
+        return manager
+
+    def timed(self, phase, function):
+        return function
+
+    def timed_iter(self, phase, iterable):
+        return iterable
+
+    def compress(self, compress):
+        return compress
+
+    def stream(self, stream):
+        return stream
+
+
+#: The :py:class:`NullProfile` used when no profile is given.
+NO_PROFILE = NullProfile()
@@ -0,0 +1,268 @@
+import glob
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+from ._dists import find_distributions
+from ._wheels import unpack_wheel
+
+logger = logging.getLogger(__name__)
+
+#: The ``pip`` options, and whether they take a value, that say
+#: where to find distributions, and so are passed on when fetching
+#: those that changed.
+INDEX_OPTIONS = {
+    '-i': True, '--index-url': True, '--extra-index-url': True,
+    '--no-index': False, '-f': True, '--find-links': True,
+    '--trusted-host': True, '--cert': True, '--client-cert': True,
+    '--pre': False, '--prefer-binary': False,
+}
+
+
+def canonical_name(name):
+    """
+    Returns ``name`` normalized as PEP 503 does, so that the names of
+    a distribution in ``pip``'s report and in its ``.dist-info``
+    directory compare equal.
+    """
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def index_options(pip_args):
+    """
+    Returns those of ``pip_args`` that are :py:data:`INDEX_OPTIONS`,
+    with their values.
+    """
+    options = []
+    args = iter(pip_args)
+    for arg in args:
+        option = arg.partition('=')[0]
+        if option not in INDEX_OPTIONS:
+            continue
+        options.append(arg)
+        if INDEX_OPTIONS[option] and '=' not in arg:
+            options.append(next(args, ''))
+    return options
+
+
+def requirement(item):
+    """
+    Returns a requirement that ``pip`` can fetch exactly the
+    distribution described by ``item``, an ``install`` entry of its
+    installation report, from.
+    """
+    info = item['download_info']
+    url = info['url']
+    vcs_info = info.get('vcs_info')
+    if vcs_info is not None:
+        url = '%s+%s@%s' % (vcs_info['vcs'], url, vcs_info['commit_id'])
+    if 'subdirectory' in info:
+        url += '#subdirectory=' + info['subdirectory']
+    return '%s @ %s' % (item['metadata']['name'], url)
+
+
+def read_direct_url(root, dist):
+    """
+    Returns the contents of the ``direct_url.json`` that ``pip``
+    writes into the ``.dist-info`` directory of distributions
+    installed from a URL or local path, or :py:class:`None` if
+    ``dist`` has none.
+    """
+    path = os.path.join(root, dist.metadata_dir, 'direct_url.json')
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+class StagingSync(object):
+    """
+    Brings an existing staging directory up to date with ``pip``'s
+    resolution of a set of requirements by installing only the
+    distributions that were added or changed and removing the ones
+    that were dropped, rather than reinstalling everything.
+
+    ``pip install --dry-run --report`` resolves the requirements
+    without installing anything, and the ``.dist-info`` directories
+    in the staging directory say what's already there.  A
+    distribution has changed when its version has, when it comes
+    from a different URL or VCS commit, or, because its contents can
+    change without its version doing so, when it's a local
+    directory.  Changed and added distributions are built into wheels
+    with ``pip wheel --no-deps`` and unpacked as
+    :py:class:`betareduce._wheels.Wheelhouse` does.
+
+    :param root: the staging directory.
+    :type root: :py:class:`str`
+    :param target: (optional) the Lambda runtime to build for; with
+        it, wheels are downloaded with ``pip download`` instead.
+    :type target: :py:class:`betareduce._target.Target`
+    """
+
+    def __init__(self, root, target=None,
+                 _check_output=subprocess.check_output,
+                 _unpack_wheel=unpack_wheel):
+        self.root = root
+        self.target = target
+        self._check_output = _check_output
+        self._unpack_wheel = _unpack_wheel
+
+    def resolve(self, pip_args):
+        """
+        Returns the ``install`` entries of the report of ``pip
+        install --dry-run`` for ``pip_args``, by canonical name.  As
+        ``--ignore-installed`` is passed, they describe every
+        distribution the requirements need.
+        """
+        cmd = ['pip', 'install', '--dry-run', '--ignore-installed',
+               '--quiet', '--report', '-'] + list(pip_args)
+        report = json.loads(self._check_output(cmd))
+        return {canonical_name(item['metadata']['name']): item
+                for item in report['install']}
+
+    def installed(self):
+        """
+        Returns the distributions installed in the staging directory,
+        as :py:class:`betareduce._dists.Distribution`\\ s by canonical
+        name.
+        """
+        return {canonical_name(dist.name): dist
+                for dist in find_distributions(self.root)}
+
+    def unchanged(self, item, dist):
+        """
+        Returns :py:class:`True` if ``dist``, an installed
+        distribution, is what ``item``, an entry of ``pip``'s report,
+        describes.
+        """
+        if item['metadata']['version'] != dist.version:
+            return False
+        if not item.get('is_direct'):
+            return True
+        if 'dir_info' in item['download_info']:
+            return False
+        return read_direct_url(self.root, dist) == item['download_info']
+
+    def plan(self, resolved, installed):
+        """
+        Compare ``resolved``, from :py:meth:`resolve`, with
+        ``installed``, from :py:meth:`installed`.
+
+        :returns: a 2-tuple of a :py:class:`list` of the report
+            entries to install and a :py:class:`list` of the
+            installed distributions to remove, both sorted by name.
+        """
+        install = []
+        remove = []
+        for name in sorted(set(resolved) | set(installed)):
+            item, dist = resolved.get(name), installed.get(name)
+            if dist is not None and item is not None and (
+                    self.unchanged(item, dist)):
+                continue
+            if dist is not None:
+                remove.append(dist)
+            if item is not None:
+                install.append(item)
+        return install, remove
+
+    def remove(self, dist):
+        """
+        Remove the files ``dist``'s ``RECORD`` lists, its
+        ``.dist-info`` directory, the bytecode compiled from its
+        modules, and any directories that leaves empty.
+        """
+        paths = set(dist.paths)
+        for path in dist.paths:
+            stem, extension = os.path.splitext(path)
+            if extension == '.py':
+                paths.add(stem + '.pyc')
+                paths.update(os.path.relpath(pyc, self.root)
+                             for pyc in glob.glob(os.path.join(
+                                 glob.escape(self.root),
+                                 glob.escape(os.path.dirname(path)),
+                                 '__pycache__',
+                                 glob.escape(os.path.basename(stem)) +
+                                 '.*.pyc')))
+        for path in paths:
+            try:
+                os.remove(os.path.join(self.root, path))
+            except OSError:
+                pass
+        shutil.rmtree(os.path.join(self.root, dist.metadata_dir),
+                      ignore_errors=True)
+        for directory in sorted({os.path.dirname(path) for path in paths},
+                                key=len, reverse=True):
+            while directory:
+                try:
+                    os.rmdir(os.path.join(self.root, directory))
+                except OSError:
+                    break
+                directory = os.path.dirname(directory)
+
+    def fetch(self, items, pip_args, directory, _logger=logger):
+        """
+        Build or download wheels of the distributions ``items``
+        describe into ``directory``, finding them with the
+        :py:func:`index_options` in ``pip_args``.
+
+        :returns: the paths of the wheels, by canonical name.
+        """
+        if self.target is not None:
+            cmd = ['pip', 'download', '--no-deps', '--dest', directory]
+            cmd += self.target.pip_args()
+        else:
+            cmd = ['pip', 'wheel', '--no-deps', '--wheel-dir', directory]
+        cmd += index_options(pip_args)
+        cmd += [requirement(item) for item in items]
+        output = self._check_output(cmd, stderr=subprocess.STDOUT)
+        _logger.info("command: %s, output:\n%s", cmd, output)
+        return {canonical_name(name.split('-', 1)[0]):
+                os.path.join(directory, name)
+                for name in os.listdir(directory) if name.endswith('.whl')}
+
+    def sync(self, pip_args, _logger=logger):
+        """
+        Install the requirements specified and implied by
+        ``pip_args`` into the staging directory, installing and
+        removing only what changed since the last time.
+        """
+        install, remove = self.plan(self.resolve(pip_args),
+                                    self.installed())
+        _logger.info("syncing %r: installing %s, removing %s",
+                     self.root,
+                     [item['metadata']['name'] for item in install],
+                     [dist.name for dist in remove])
+        for dist in remove:
+            self.remove(dist)
+        if not install:
+            return
+        built = tempfile.mkdtemp(prefix='.betareduce-sync-',
+                                 dir=os.path.dirname(
+                                     os.path.abspath(self.root)))
+        try:
+            wheels = self.fetch(install, pip_args, built, _logger=_logger)
+            for item in install:
+                wheel = wheels[canonical_name(item['metadata']['name'])]
+                self._unpack_wheel(wheel, self.root)
+                if item.get('is_direct'):
+                    self.write_direct_url(item, wheel)
+        finally:
+            shutil.rmtree(built)
+
+    def write_direct_url(self, item, wheel):
+        """
+        Record where the distribution ``item`` describes, unpacked
+        from ``wheel``, came from in its ``direct_url.json``, as
+        ``pip`` does when it installs from a URL, so that the next
+        sync can tell whether it changed.
+        """
+        name, version = os.path.basename(wheel).split('-')[:2]
+        path = os.path.join(self.root, '%s-%s.dist-info' % (name, version),
+                            'direct_url.json')
+        with open(path, 'w') as f:
+            json.dump(item['download_info'], f, sort_keys=True)
@@ -0,0 +1,139 @@
+import logging
+import re
+
+from . import _classify
+
+logger = logging.getLogger(__name__)
+
+#: The architectures AWS Lambda runs functions on, by the names it
+#: gives them, and the machine names wheels are tagged with.
+ARCHITECTURES = {'x86_64': 'x86_64', 'arm64': 'aarch64'}
+
+#: The version of glibc each generation of the Lambda Python runtimes
+#: provides: Amazon Linux 2 up to Python 3.11, and Amazon Linux 2023
+#: after.
+_GLIBC_VERSIONS = (((3, 11), 26), ((99, 0), 34))
+
+#: The oldest glibc a ``manylinux`` wheel may target (manylinux2014).
+_OLDEST_GLIBC = 17
+
+_RUNTIME = re.compile(r'^python(?P<major>\d+)\.(?P<minor>\d+)'
+                      r'(?:-(?P<architecture>[\w]+))?$')
+
+
+class Target(object):
+    """
+    The Lambda runtime a package is built for, which may differ from
+    the Python and platform building it.
+
+    :param python_version: the runtime's Python version, as a
+        ``(major, minor)`` :py:class:`tuple`.
+    :type python_version: :py:class:`tuple`
+    :param architecture: (optional) the function's architecture, as
+        Lambda names it: one of :py:data:`ARCHITECTURES`.
+    :type architecture: :py:class:`str`
+    """
+
+    def __init__(self, python_version, architecture='x86_64'):
+        if architecture not in ARCHITECTURES:
+            raise ValueError("architecture must be one of %s; got %r"
+                             % (', '.join(sorted(ARCHITECTURES)),
+                                architecture))
+        self.python_version = tuple(python_version)
+        self.architecture = architecture
+        self.machine = ARCHITECTURES[architecture]
+        self.glibc = next(glibc for version, glibc in _GLIBC_VERSIONS
+                          if self.python_version <= version)
+        #: classifies extension modules as the runtime would load them.
+        self.classifier = _classify.Classifier(
+            ['.%s.so' % (tag,) for tag in self.extension_tags] + ['.so'],
+            machine=self.machine)
+
+    @classmethod
+    def parse(cls, spec):
+        """
+        Returns the :py:class:`Target` that ``spec`` names: a Lambda
+        runtime identifier such as ``python3.11``, optionally
+        followed by an architecture, as in ``python3.12-arm64``.
+
+        :raises ValueError: ...when ``spec`` names no runtime.
+        """
+        match = _RUNTIME.match(spec)
+        if match is None:
+            raise ValueError("target must be of the form"
+                             " python<major>.<minor>[-<architecture>];"
+                             " got %r" % (spec,))
+        return cls((int(match.group('major')), int(match.group('minor'))),
+                   match.group('architecture') or 'x86_64')
+
+    def __repr__(self):
+        return '%s(%r, %r)' % (type(self).__name__, self.python_version,
+                               self.architecture)
+
+    @property
+    def abi(self):
+        """
+        The ABI tag of the runtime's interpreter, e.g. ``cp311``.
+        """
+        return 'cp%d%d' % self.python_version
+
+    @property
+    def platforms(self):
+        """
+        The platform tags of the wheels the runtime can load, newest
+        first.
+        """
+        platforms = ['manylinux_2_%d_%s' % (minor, self.machine)
+                     for minor in range(self.glibc, _OLDEST_GLIBC - 1, -1)]
+        # pip expands this to the older manylinux2010 and manylinux1.
+        platforms.append('manylinux2014_%s' % (self.machine,))
+        return platforms
+
+    @property
+    def extension_tags(self):
+        """
+        The tags that mark extension modules the runtime can load,
+        e.g. ``cpython-311-x86_64-linux-gnu`` and ``abi3``.
+        """
+        return ('cpython-%d%d-%s-linux-gnu' % (self.python_version +
+                                               (self.machine,)),
+                'abi3')
+
+    def pip_args(self):
+        """
+        Returns the arguments that make ``pip`` install wheels for
+        this runtime rather than for the interpreter running it.
+        Since nothing can be built for another platform, only wheels
+        are installed.
+
+        :returns: :py:class:`list` of :py:class:`str`
+        """
+        args = []
+        for platform in self.platforms:
+            args.extend(['--platform', platform])
+        args.extend(['--python-version', '%d.%d' % self.python_version,
+                     '--implementation', 'cp',
+                     '--abi', self.abi,
+                     '--only-binary', ':all:'])
+        return args
+
+    def not_foreign_extension_module(self, filename, _logger=logger):
+        """
+        Returns ``False`` if ``filename`` is an extension module the
+        runtime can't load, because it was built for another Python
+        version or machine, and ``True`` otherwise.  Untagged ``.so``
+        files, including shared libraries such as
+        ``numpy.libs/libopenblas64_p-r0-0cf96a72.3.23.dev.so`` whose
+        versions put dots in their names, are assumed to be for the
+        runtime's Python version, and are kept if they're built for
+        its machine.
+
+        :param filename: path to a file
+        :type filename: :py:class:`str`
+
+        :returns :py:class:`bool`:
+        """
+        if self.classifier.classify(filename) == _classify.FOREIGN:
+            _logger.info("Detected foreign extension module: %s", filename)
+            return False
+        return True
@@ -0,0 +1,164 @@
+import concurrent.futures
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import zipfile
+
+from ._cache import cache_key
+
+logger = logging.getLogger(__name__)
+
+# the parts of a wheel's .data directory that belong on sys.path.
+_LIBRARY_SCHEMES = ('purelib', 'platlib')
+
+
+def unpack_wheel(wheel, root, _open=open):
+    """
+    Install the wheel at the path ``wheel`` into ``root`` as ``pip
+    install -t`` would, by extracting it: its ``purelib`` and
+    ``platlib`` data go into ``root`` too, while scripts, headers and
+    other data are left out, as they're of no use to a Lambda
+    function.  ``RECORD`` is left as the wheel has it.
+
+    :raises zipfile.BadZipFile: ...when a member's path escapes
+        ``root``.
+
+    :returns: the number of files extracted.
+    """
+    name, version = os.path.basename(wheel).split('-')[:2]
+    data_prefix = '%s-%s.data/' % (name, version)
+    root = os.path.abspath(root)
+    extracted = 0
+    with zipfile.ZipFile(wheel) as zip_obj:
+        for zinfo in zip_obj.infolist():
+            arcname = zinfo.filename
+            if arcname.endswith('/'):
+                continue
+            if arcname.startswith(data_prefix):
+                scheme, _, arcname = arcname[len(data_prefix):].partition('/')
+                if scheme not in _LIBRARY_SCHEMES:
+                    continue
+            target = os.path.normpath(os.path.join(root, *arcname.split('/')))
+            if not target.startswith(root + os.sep):
+                raise zipfile.BadZipFile("%r in %r would be installed outside"
+                                         " %r" % (zinfo.filename, wheel, root))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with zip_obj.open(zinfo) as src, _open(target, 'wb') as dest:
+                shutil.copyfileobj(src, dest)
+            mode = (zinfo.external_attr >> 16) & 0o777
+            if mode & 0o111:
+                os.chmod(target, mode | 0o444)
+            extracted += 1
+    return extracted
+
+
+class Wheelhouse(object):
+    """
+    A directory of wheels from which to install requirements without
+    running ``pip install``.
+
+    The first time a set of ``pip`` arguments is installed, ``pip
+    wheel`` resolves it and builds or downloads the wheels it needs
+    into the wheelhouse, preferring those already there, and a lock
+    file records which wheels they were.  After that, the locked
+    wheels are simply unpacked into the staging directory, which
+    needs neither ``pip`` nor a network connection.
+
+    Like the install cache, locks are keyed on
+    :py:func:`betareduce._cache.cache_key`, so a change to a
+    requirements file or local package resolves it again.
+
+    :param directory: the wheelhouse directory.  It's created if
+        necessary.
+    :type directory: :py:class:`str`
+    :param download: (optional) if :py:class:`True`, resolve with
+        ``pip download``, which fetches existing wheels but builds
+        none, as installing for another platform requires.
+    :type download: :py:class:`bool`
+    """
+
+    def __init__(self, directory, download=False, _cache_key=cache_key):
+        self.directory = directory
+        self.download = download
+        self._cache_key = _cache_key
+
+    def lock_path(self, key):
+        """
+        Returns the path of the lock file for the key ``key``.
+        """
+        return os.path.join(self.directory, 'locks', key + '.json')
+
+    def locked(self, key):
+        """
+        Returns the paths of the wheels locked for ``key``, or
+        :py:class:`None` if there's no lock or a wheel it names is
+        missing.
+        """
+        try:
+            with open(self.lock_path(key)) as f:
+                names = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        paths = [os.path.join(self.directory, name) for name in names]
+        if not all(os.path.isfile(path) for path in paths):
+            return None
+        return paths
+
+    def resolve(self, pip_args, key,
+                _check_output=subprocess.check_output, _logger=logger):
+        """
+        Build or download the wheels ``pip_args`` need into the
+        wheelhouse with ``pip wheel``, lock them under ``key``, and
+        return their paths.
+        """
+        os.makedirs(os.path.join(self.directory, 'locks'), exist_ok=True)
+        built = tempfile.mkdtemp(prefix='.resolve-', dir=self.directory)
+        try:
+            if self.download:
+                cmd = ['pip', 'download', '--dest', built]
+            else:
+                cmd = ['pip', 'wheel', '--wheel-dir', built]
+            cmd += ['--find-links', self.directory] + list(pip_args)
+            output = _check_output(cmd, stderr=subprocess.STDOUT)
+            _logger.info("command: %s, output:\n%s", cmd, output)
+            names = sorted(name for name in os.listdir(built)
+                           if name.endswith('.whl'))
+            for name in names:
+                os.replace(os.path.join(built, name),
+                           os.path.join(self.directory, name))
+        finally:
+            shutil.rmtree(built)
+        lock_path = self.lock_path(key)
+        with open(lock_path + '.partial', 'w') as f:
+            json.dump(names, f)
+        os.replace(lock_path + '.partial', lock_path)
+        return [os.path.join(self.directory, name) for name in names]
+
+    def install(self, pip_args, root, jobs=None,
+                _Executor=concurrent.futures.ThreadPoolExecutor,
+                _unpack_wheel=unpack_wheel, _logger=logger):
+        """
+        Install the requirements specified and implied by
+        ``pip_args`` into ``root`` by unpacking their wheels
+        concurrently, resolving them first if they aren't locked.
+
+        :param jobs: (optional) the number of wheels to unpack at
+            once.  Defaults to
+            :py:class:`concurrent.futures.ThreadPoolExecutor`'s
+            default.
+        :type jobs: :py:class:`int`
+        """
+        key = self._cache_key(pip_args)
+        wheels = self.locked(key)
+        if wheels is None:
+            _logger.info("resolving %s into wheelhouse %r",
+                         pip_args, self.directory)
+            wheels = self.resolve(pip_args, key)
+        with _Executor(max_workers=jobs) as executor:
+            extracted = sum(executor.map(
+                lambda wheel: _unpack_wheel(wheel, root), wheels))
+        _logger.info("unpacked %d files from %d wheels into %r",
+                     extracted, len(wheels), root)
@@ -0,0 +1,578 @@
+import collections
+import concurrent.futures
+import errno
+import mmap
+import os
+import stat
+import threading
+import time
+import zipfile
+import zlib
+
+from . import _files
+
+#: How many bytes to read from a member file at a time.
+CHUNK_SIZE = 1024 * 64
+
+#: Files larger than this many bytes are streamed into the archive
+#: rather than compressed in memory.
+STREAM_THRESHOLD = 1024 * 1024 * 8
+
+#: Files of at least this many bytes are memory-mapped rather than
+#: read, and stored ones are copied into the archive by the kernel.
+MAP_THRESHOLD = 1024 * 1024
+
+#: How many bytes of a memory-mapped file to map at a time.  A
+#: multiple of :py:data:`mmap.ALLOCATIONGRANULARITY`.
+MAP_WINDOW = 1024 * 1024 * 16
+
+#: The compression methods :py:func:`compress` can produce.
+PARALLEL_COMPRESSION = (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+
+#: Compression presets, by name, as ``(compress_type, compresslevel)``
+#: pairs.  ``fast`` compresses several times faster than ``smallest``,
+#: which typically saves only a few percent more than ``balanced``.
+COMPRESSION_PRESETS = collections.OrderedDict([
+    ('stored', (zipfile.ZIP_STORED, None)),
+    ('fast', (zipfile.ZIP_DEFLATED, 1)),
+    ('balanced', (zipfile.ZIP_DEFLATED, 6)),
+    ('smallest', (zipfile.ZIP_DEFLATED, 9)),
+])
+
+#: The suffixes of files whose contents are already compressed, and
+#: so are stored rather than compressed again.
+COMPRESSED_SUFFIXES = frozenset([
+    '.zip', '.whl', '.egg', '.jar', '.gz', '.tgz', '.bz2', '.xz', '.lzma',
+    '.zst', '.br', '.7z', '.png', '.jpg', '.jpeg', '.gif', '.webp',
+    '.ico', '.woff', '.woff2', '.mp3', '.mp4', '.ogg',
+])
+
+#: What members of an archive in the ``zipimport`` layout are stored
+#: as well as :py:data:`COMPRESSED_SUFFIXES`: bytecode, which is
+#: what :py:mod:`zipimport` loads when it's there, so that it's read
+#: straight out of the archive rather than decompressed on import.
+ZIPIMPORT_STORED_SUFFIXES = COMPRESSED_SUFFIXES | frozenset(['.pyc'])
+
+#: The errors with which :py:func:`os.copy_file_range` and
+#: :py:func:`os.sendfile` refuse to copy between two files.
+UNSUPPORTED_COPY = frozenset([
+    errno.EBADF, errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK,
+    errno.EOPNOTSUPP, errno.EXDEV,
+])
+
+#: The earliest timestamp a Zip file can record.
+EARLIEST_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def source_date_time(_environ=os.environ):
+    """
+    Returns the timestamp to give every member of a reproducible
+    archive: the UTC time of ``SOURCE_DATE_EPOCH`` from the
+    environment if it's set, or the earliest time a Zip file can
+    record.
+
+    :raises ValueError: ...when ``SOURCE_DATE_EPOCH`` isn't an
+        integer.
+
+    :returns: a :py:attr:`zipfile.ZipInfo.date_time` 6-tuple.
+    """
+    epoch = _environ.get('SOURCE_DATE_EPOCH')
+    if epoch is None:
+        return EARLIEST_DATE_TIME
+    try:
+        epoch = int(epoch)
+    except ValueError:
+        raise ValueError("SOURCE_DATE_EPOCH must be an integer; got %r"
+                         % (epoch,))
+    return max(tuple(time.gmtime(epoch)[:6]), EARLIEST_DATE_TIME)
+
+
+def member_info(filename, arcname, date_time=None):
+    """
+    Returns a :py:class:`zipfile.ZipInfo` for the file at
+    ``filename`` stored as ``arcname``, like
+    :py:meth:`zipfile.ZipInfo.from_file` but without statting a
+    :py:class:`betareduce._files.FileRecord` again.
+
+    :param date_time: (optional) if given, the member's timestamp.
+        Its permissions are also normalized to read-only, or
+        read-only and executable, so that it doesn't depend on when
+        or by whom the file was installed.
+    """
+    stat_result = _files.stat(filename)
+    zinfo = zipfile.ZipInfo(arcname,
+                            time.localtime(stat_result.st_mtime)[:6])
+    zinfo.external_attr = (stat_result.st_mode & 0xFFFF) << 16
+    zinfo.file_size = stat_result.st_size
+    if date_time is not None:
+        mode = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+        if (zinfo.external_attr >> 16) & stat.S_IXUSR:
+            mode |= stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH
+        zinfo.date_time = date_time
+        zinfo.external_attr = (stat.S_IFREG | mode) << 16
+    return zinfo
+
+
+def compression_preset(name):
+    """
+    Returns the ``(compress_type, compresslevel)`` pair of the preset
+    ``name`` in :py:data:`COMPRESSION_PRESETS`.
+
+    :raises ValueError: ...when there's no such preset.
+    """
+    try:
+        return COMPRESSION_PRESETS[name]
+    except KeyError:
+        raise ValueError("compression must be one of %s; got %r"
+                         % (', '.join(COMPRESSION_PRESETS), name))
+
+
+def member_compression(arcname, compress_type, compresslevel,
+                       stored_suffixes=COMPRESSED_SUFFIXES):
+    """
+    Returns the ``(compress_type, compresslevel)`` with which to
+    write the member ``arcname`` of an archive compressed with
+    ``compress_type`` and ``compresslevel``: members with
+    ``stored_suffixes``, by default :py:data:`COMPRESSED_SUFFIXES`,
+    are stored, since compressing them again costs time and saves
+    next to nothing.
+    """
+    if (compress_type != zipfile.ZIP_STORED and
+            os.path.splitext(arcname)[1].lower() in stored_suffixes):
+        return zipfile.ZIP_STORED, None
+    return compress_type, compresslevel
+
+
+def archive_compression(zip_obj, arcname):
+    """
+    Returns the ``(compress_type, compresslevel)`` with which to
+    write the member ``arcname`` of ``zip_obj``, as
+    :py:func:`member_compression` chooses for its compression and,
+    if it's a :py:class:`ZipimportZipFile`, its stored suffixes.
+    """
+    return member_compression(
+        arcname, zip_obj.compression, zip_obj.compresslevel,
+        getattr(zip_obj, 'stored_suffixes', COMPRESSED_SUFFIXES))
+
+
+def zipimport_key(arcname):
+    """
+    A sort key that clusters the members of each package together:
+    top-level modules first, then each directory's members before
+    those of its subdirectories, with its ``__init__`` first and each
+    module's bytecode just before its source.
+    """
+    directory, _, name = arcname.rpartition('/')
+    stem, extension = os.path.splitext(name)
+    return (directory.split('/') if directory else [],
+            stem != '__init__', stem, extension != '.pyc', name)
+
+
+class ZipimportZipFile(zipfile.ZipFile):
+    """
+    A :py:class:`zipfile.ZipFile` laid out for :py:mod:`zipimport`:
+    members with :py:data:`ZIPIMPORT_STORED_SUFFIXES` are stored, and
+    its central directory is sorted by :py:func:`zipimport_key` when
+    it's closed, so that it lists each package's members together in
+    the order they were written when they were written in that order.
+    """
+    stored_suffixes = ZIPIMPORT_STORED_SUFFIXES
+
+    def close(self):
+        if self.fp is not None and self.mode != 'r':
+            self.filelist.sort(key=lambda zinfo: zipimport_key(
+                zinfo.filename))
+        super(ZipimportZipFile, self).close()
+
+
+#: The layouts an archive can be written in, by name, and the
+#: :py:class:`zipfile.ZipFile` classes that write them.
+LAYOUTS = collections.OrderedDict([
+    ('zipimport', ZipimportZipFile),
+])
+
+
+def layout_class(name):
+    """
+    Returns the :py:class:`zipfile.ZipFile` class that writes the
+    layout ``name`` in :py:data:`LAYOUTS`.
+
+    :raises ValueError: ...when there's no such layout.
+    """
+    try:
+        return LAYOUTS[name]
+    except KeyError:
+        raise ValueError("layout must be one of %s; got %r"
+                         % (', '.join(LAYOUTS), name))
+
+
+def read_chunks(f, size, offset=0, _mmap=mmap.mmap):
+    """
+    Yields the contents of the file object ``f`` from ``offset`` on,
+    a :py:data:`CHUNK_SIZE` :py:class:`memoryview` at a time.  Files
+    whose ``size`` is at least :py:data:`MAP_THRESHOLD` bytes are
+    memory-mapped a :py:data:`MAP_WINDOW` at a time and the rest read
+    into a single buffer, so no chunk is copied into a new
+    :py:class:`bytes` and memory use doesn't grow with the file.
+    Each chunk is only valid until the next is requested.
+    """
+    window = offset - offset % MAP_WINDOW
+    mapped = None
+    if size >= MAP_THRESHOLD and window < size:
+        try:
+            mapped = _mmap(f.fileno(), min(MAP_WINDOW, size - window),
+                           access=mmap.ACCESS_READ, offset=window)
+        except (OSError, ValueError):
+            pass
+    if mapped is None:
+        f.seek(offset)
+        buffer = bytearray(CHUNK_SIZE)
+        with memoryview(buffer) as view:
+            for length in iter(lambda: f.readinto(buffer), 0):
+                with view[:length] as chunk:
+                    yield chunk
+        return
+    while True:
+        length = len(mapped)
+        with mapped, memoryview(mapped) as view:
+            for start in range(max(offset - window, 0), length, CHUNK_SIZE):
+                with view[start:start + CHUNK_SIZE] as chunk:
+                    yield chunk
+        window += length
+        if window >= size:
+            return
+        mapped = _mmap(f.fileno(), min(MAP_WINDOW, size - window),
+                       access=mmap.ACCESS_READ, offset=window)
+
+
+def _copy_file_range(src, dest, offset, position, count):
+    return os.copy_file_range(src, dest, count, offset, position)
+
+
+def _sendfile(src, dest, offset, position, count):
+    os.lseek(dest, position, os.SEEK_SET)
+    return os.sendfile(dest, src, offset, count)
+
+
+#: The ways :py:func:`copy_range` can copy between files inside the
+#: kernel, best first.
+COPIERS = tuple(copier for name, copier in [
+    ('copy_file_range', _copy_file_range),
+    ('sendfile', _sendfile),
+] if hasattr(os, name))
+
+
+def copy_range(src, dest, count, _copiers=COPIERS):
+    """
+    Copy the first ``count`` bytes of the file object ``src`` to the
+    current position of the file object ``dest`` inside the kernel,
+    with :py:func:`os.copy_file_range` or :py:func:`os.sendfile`, and
+    leave ``dest`` after them.
+
+    :returns: the number of bytes copied, which is less than
+        ``count`` when neither can copy between these files, as with
+        in-memory files or on some filesystems.
+    """
+    try:
+        src_fd, dest_fd = src.fileno(), dest.fileno()
+    except (AttributeError, OSError):
+        return 0
+    dest.flush()
+    position = dest.tell()
+    copied = 0
+    for copier in _copiers:
+        try:
+            while copied < count:
+                length = copier(src_fd, dest_fd, copied, position + copied,
+                                count - copied)
+                if not length:
+                    break
+                copied += length
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_COPY:
+                raise
+        if copied == count:
+            break
+    dest.seek(position + copied)
+    return copied
+
+
+def compressor(compress_type, compresslevel):
+    """
+    Return a compressor like the one :py:class:`zipfile.ZipFile`
+    uses for ``compress_type`` and ``compresslevel``, or
+    :py:class:`None` for stored members.
+    """
+    if compress_type == zipfile.ZIP_DEFLATED:
+        if compresslevel is None:
+            compresslevel = zlib.Z_DEFAULT_COMPRESSION
+        return zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    return None
+
+
+def compress(filename, arcname, compress_type, compresslevel,
+             date_time=None, _open=open):
+    """
+    Read and compress the file at ``filename`` exactly as
+    :py:meth:`zipfile.ZipFile.write` would.  ``date_time`` is passed
+    to :py:func:`member_info`.  Stored files are read in one go, and
+    the compressor is fed from :py:func:`read_chunks`.
+
+    :returns: a 2-tuple of a :py:class:`zipfile.ZipInfo` describing
+        the member, including its CRC and sizes, and the compressed
+        :py:class:`bytes`.
+    """
+    zinfo = member_info(filename, arcname, date_time)
+    zinfo.compress_type = compress_type
+    zinfo.flag_bits = 0
+    compress_obj = compressor(compress_type, compresslevel)
+    with _open(filename, 'rb') as f:
+        if compress_obj is None:
+            data = f.read()
+            crc = zlib.crc32(data)
+            file_size = len(data)
+        else:
+            crc = 0
+            file_size = 0
+            chunks = []
+            for chunk in read_chunks(f, zinfo.file_size):
+                crc = zlib.crc32(chunk, crc)
+                file_size += len(chunk)
+                chunks.append(compress_obj.compress(chunk))
+            chunks.append(compress_obj.flush())
+            data = b''.join(chunks)
+    zinfo.CRC = crc
+    zinfo.file_size = file_size
+    zinfo.compress_size = len(data)
+    return zinfo, data
+
+
+def stream(zip_obj, filename, arcname, date_time=None):
+    """
+    Stream the file at ``filename`` into ``zip_obj`` a chunk at a
+    time, exactly as :py:meth:`zipfile.ZipFile.write` would.  On
+    unseekable files, such as pipes, sizes and the CRC follow the
+    member's data in a data descriptor.  ``date_time`` is passed to
+    :py:func:`member_info`.  Members are compressed as
+    :py:func:`archive_compression` chooses.
+
+    Chunks come from :py:func:`read_chunks`, and stored files of at
+    least :py:data:`MAP_THRESHOLD` bytes are written with
+    :py:func:`copy_stored`, so memory use doesn't grow with the size
+    of the file.
+    """
+    zinfo = member_info(filename, arcname, date_time)
+    zinfo.compress_type, zinfo._compresslevel = archive_compression(
+        zip_obj, arcname)
+    with open(filename, 'rb') as src:
+        if (zinfo.compress_type == zipfile.ZIP_STORED and
+                zinfo.file_size >= MAP_THRESHOLD):
+            copy_stored(zip_obj, zinfo, src)
+            return
+        with zip_obj.open(zinfo, 'w') as dest:
+            for chunk in read_chunks(src, zinfo.file_size):
+                dest.write(chunk)
+
+
+def copy_stored(zip_obj, zinfo, src, _copy_range=copy_range):
+    """
+    Write the file object ``src`` into ``zip_obj`` as the stored
+    member ``zinfo``.  Its CRC is computed from
+    :py:func:`read_chunks` first, so that the header is complete, and
+    its data then copied by :py:func:`copy_range`, falling back to
+    :py:func:`read_chunks` when that can't.  The result is the same as
+    :py:func:`write_compressed` produces.
+    """
+    crc = 0
+    size = 0
+    for chunk in read_chunks(src, zinfo.file_size):
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+    zinfo.CRC = crc
+    zinfo.file_size = zinfo.compress_size = size
+    zinfo.flag_bits = 0
+    _begin_member(zip_obj, zinfo)
+    copied = _copy_range(src, zip_obj.fp, size)
+    for chunk in read_chunks(src, size, offset=copied):
+        zip_obj.fp.write(chunk)
+    _end_member(zip_obj, zinfo)
+
+
+def _begin_member(zip_obj, zinfo):
+    if zip_obj._writing:
+        raise ValueError("Can't write to ZIP archive while an open"
+                         " writing handle exists")
+    zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+    if zip_obj._seekable:
+        zip_obj.fp.seek(zip_obj.start_dir)
+    zinfo.header_offset = zip_obj.fp.tell()
+    zip_obj._writecheck(zinfo)
+    zip_obj._didModify = True
+    zip_obj.fp.write(zinfo.FileHeader(zip64))
+
+
+def _end_member(zip_obj, zinfo):
+    zip_obj.filelist.append(zinfo)
+    zip_obj.NameToInfo[zinfo.filename] = zinfo
+    zip_obj.start_dir = zip_obj.fp.tell()
+
+
+def write_compressed(zip_obj, zinfo, data):
+    """
+    Write a member whose CRC, sizes and compressed ``data`` are
+    already known into ``zip_obj``.  The result is byte-for-byte
+    what :py:meth:`zipfile.ZipFile.write` produces on a seekable
+    file.  Because the header is complete, no data descriptor is
+    needed on unseekable files.
+
+    :param data: the compressed data, as :py:class:`bytes` or an
+        iterable of :py:class:`bytes` chunks.
+
+    This relies on the same :py:class:`zipfile.ZipFile` internals
+    that :py:meth:`zipfile.ZipFile.open` uses to write members.
+    """
+    _begin_member(zip_obj, zinfo)
+    if isinstance(data, bytes):
+        data = [data]
+    for chunk in data:
+        zip_obj.fp.write(chunk)
+    _end_member(zip_obj, zinfo)
+
+
+def write_members(zip_obj, members, jobs,
+                  threshold=STREAM_THRESHOLD, written=lambda zinfo: None,
+                  date_time=None,
+                  _Executor=concurrent.futures.ThreadPoolExecutor,
+                  _compress=compress, _stream=stream, _getsize=_files.getsize):
+    """
+    Compress ``members`` concurrently with ``jobs`` workers and
+    write them into ``zip_obj`` in the order given, so that the
+    archive is identical to one written serially.  Members are
+    compressed as :py:func:`archive_compression` chooses.
+
+    :py:mod:`zlib` and file reads release the GIL, so threads keep
+    every worker busy.  At most ``2 * jobs`` members are held in
+    memory at once, and files larger than ``threshold`` are
+    streamed instead, so memory use is bounded regardless of the
+    size of the archive.  So are members stored uncompressed of at
+    least :py:data:`MAP_THRESHOLD` bytes, which :py:func:`stream`
+    copies with :py:func:`copy_stored`.
+
+    :param zip_obj: the :py:class:`zipfile.ZipFile` to write to.
+    :param members: an iterable of ``(filename, arcname)`` pairs.
+    :param jobs: the number of workers.
+    :type jobs: :py:class:`int`
+    :param threshold: (optional) the size in bytes above which
+        files are streamed.
+    :type threshold: :py:class:`int`
+    :param written: (optional) called with the
+        :py:class:`zipfile.ZipInfo` of each member once it has been
+        written.
+    :param date_time: (optional) passed to :py:func:`member_info`
+        to make the archive reproducible.
+    """
+    compress_type = zip_obj.compression
+    if compress_type not in PARALLEL_COMPRESSION:
+        for filename, arcname in members:
+            _stream(zip_obj, filename, arcname, date_time=date_time)
+            written(zip_obj.filelist[-1])
+        return
+
+    def write(filename, arcname, future):
+        if future is None:
+            _stream(zip_obj, filename, arcname, date_time=date_time)
+            written(zip_obj.filelist[-1])
+        else:
+            zinfo, data = future.result()
+            write_compressed(zip_obj, zinfo, data)
+            written(zinfo)
+
+    pending = collections.deque()
+    with _Executor(max_workers=jobs) as executor:
+        for filename, arcname in members:
+            future = None
+            size = _getsize(filename)
+            compression = archive_compression(zip_obj, arcname)
+            # large stored files gain nothing from a worker, and
+            # streaming copies them in the kernel.
+            if size <= threshold and not (
+                    compression[0] == zipfile.ZIP_STORED and
+                    size >= MAP_THRESHOLD):
+                future = executor.submit(
+                    _compress, filename, arcname, *compression,
+                    date_time=date_time)
+            pending.append((filename, arcname, future))
+            if len(pending) >= 2 * jobs:
+                write(*pending.popleft())
+        while pending:
+            write(*pending.popleft())
+
+
+class CompressionCache(object):
+    """
+    Compressed data shared between members with the same contents,
+    so that those contents are compressed only once.  Subclasses
+    identify contents with :py:meth:`key`.  :py:meth:`compress` and
+    :py:meth:`stream` can be passed to :py:func:`write_members`.
+
+    :param max_size: the most bytes of compressed data to hold in
+        memory.  Once it's reached, further members are compressed as
+        usual but not shared.
+    :type max_size: :py:class:`int`
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        #: the number of bytes of compressed data held.
+        self.size = 0
+        #: the number of members whose compressed data was reused.
+        self.hits = 0
+        self._members = {}
+        self._lock = threading.Lock()
+
+    def key(self, filename):
+        """
+        Returns a hashable value identifying the contents of
+        ``filename``, or :py:class:`None` if they shouldn't be shared.
+        """
+        raise NotImplementedError
+
+    def compress(self, filename, arcname, compress_type, compresslevel,
+                 date_time=None, _compress=compress):
+        """
+        A drop-in replacement for :py:func:`compress` that reuses the
+        compressed data of members with the same contents and
+        compression settings.
+        """
+        key = self.key(filename)
+        if key is None:
+            return _compress(filename, arcname, compress_type,
+                             compresslevel, date_time)
+        key = key, compress_type, compresslevel
+        shared = self._members.get(key)
+        if shared is not None:
+            crc, data = shared
+            zinfo = member_info(filename, arcname, date_time)
+            zinfo.compress_type = compress_type
+            zinfo.flag_bits = 0
+            zinfo.CRC = crc
+            zinfo.compress_size = len(data)
+            with self._lock:
+                self.hits += 1
+            return zinfo, data
+        zinfo, data = _compress(filename, arcname, compress_type,
+                                compresslevel, date_time)
+        with self._lock:
+            if key not in self._members and (
+                    self.size + len(data) <= self.max_size):
+                self._members[key] = (zinfo.CRC, data)
+                self.size += len(data)
+        return zinfo, data
+
+    def stream(self, zip_obj, filename, arcname, date_time=None,
+               _stream=stream):
+        """
+        A drop-in replacement for :py:func:`stream`.  Streamed files
+        are too large to share in memory.
+        """
+        _stream(zip_obj, filename, arcname, date_time=date_time)
@@ -0,0 +1,137 @@
+from .. import _analyze as A
+from .._importtime import ImportCost
+from .test_sync import install, write
+import io
+import json
+import pytest
+
+COSTS = [
+    ImportCost('six', 100, 100, 3),
+    ImportCost('requests.api', 200, 300, 2),
+    ImportCost('decimal', 50, 50, 3),
+    ImportCost('idna', 400, 450, 2),
+    ImportCost('requests', 100, 850, 1),
+    ImportCost('handler', 30, 880, 1),
+]
+
+
+@pytest.fixture
+def root(tmpdir):
+    root = str(tmpdir.mkdir('staging'))
+    install(root, 'six', '1.16.0', ['six.py'])
+    install(root, 'requests', '2.31.0',
+            ['requests/__init__.py', 'requests/api.py'])
+    install(root, 'idna', '3.4', ['idna/__init__.py'])
+    write(root, 'handler.py', 'x' * 1000)
+    return root
+
+
+def test_parents():
+    """
+    :py:func:`betareduce._analyze.parents` finds the module that
+    imported each module.
+    """
+    assert A.parents(COSTS) == [
+        'requests.api', 'requests', 'idna', 'requests', None, None]
+
+
+def test_attribute():
+    """
+    :py:func:`betareduce._analyze.attribute` attributes modules to the
+    distributions that installed them, or else to the standard
+    library or their top-level package.
+    """
+    modules = A.module_owners({'six.py': 'six', 'yaml': 'PyYAML',
+                               '_yaml.cpython-311-x86_64-linux-gnu.so':
+                               'PyYAML',
+                               'PyYAML-6.0.dist-info': 'PyYAML'})
+    assert modules == {'six': 'six', 'yaml': 'PyYAML', '_yaml': 'PyYAML'}
+    assert A.attribute('yaml.loader', modules) == 'PyYAML'
+    assert A.attribute('_yaml', modules) == 'PyYAML'
+    assert A.attribute('json.decoder', modules) == A.STDLIB
+    assert A.attribute('handler', modules) == 'handler'
+
+
+def test_analyze(root):
+    """
+    :py:func:`betareduce._analyze.analyze` ranks distributions by the
+    cumulative cost of importing them, counting imports within a
+    distribution once, and reports how much space each takes up.
+    """
+    calls = []
+
+    def fake_measure(root, module, interpreter):
+        calls.append((root, module, interpreter))
+        return COSTS
+
+    costs, rows = A.analyze(root, 'handler.handler', interpreter='python3',
+                            _measure=fake_measure)
+
+    assert calls == [(root, 'handler', 'python3')]
+    assert costs == COSTS
+    assert [row[:4] for row in rows] == [
+        ('handler', 880, 30, 1),
+        ('requests', 850, 300, 2),
+        ('idna', 450, 400, 1),
+        ('six', 100, 100, 1),
+        (A.STDLIB, 50, 50, 1),
+    ]
+    sizes = {row.name: row.size for row in rows}
+    assert sizes['handler'] == 1000
+    assert sizes[A.STDLIB] == 0
+    assert sizes['requests'] > 0
+
+
+def test_analyze_invalid_fqpn(root):
+    """
+    :py:func:`betareduce._analyze.analyze` rejects invalid FQPNs
+    before importing anything.
+    """
+    with pytest.raises(ValueError):
+        A.analyze(root, 'handler', _measure=None)
+
+
+def test_analyze_imports(root):
+    """
+    :py:func:`betareduce._analyze.analyze` imports the module from the
+    staging directory.
+    """
+    write(root, 'six.py', 'import fractions\n')
+    write(root, 'handler.py', 'import six\n')
+    costs, rows = A.analyze(root, 'handler.handler')
+    names = [row.name for row in rows]
+    assert names.index('six') < names.index('requests')
+    assert {'handler', A.STDLIB} <= set(names)
+
+
+def test_format_report(root):
+    """
+    :py:func:`betareduce._analyze.format_report` tabulates the most
+    expensive distributions.
+    """
+    rows = [A.DistributionCost('requests', 850000, 300000, 2, 2048),
+            A.DistributionCost('six', 100000, 100000, 1, 10)]
+    report = A.format_report('handler', COSTS, rows, top=1)
+    lines = report.splitlines()
+    assert lines[0] == 'importing handler took 1.7 ms'
+    assert lines[1].split() == ['distribution', 'cumulative', 'ms',
+                                'self', 'ms', 'modules', 'size']
+    assert lines[2].split()[:4] == ['requests', '850.0', '300.0', '2']
+    assert len(lines) == 3
+
+
+def test_dump_report():
+    """
+    :py:func:`betareduce._analyze.dump_report` writes the report as
+    JSON.
+    """
+    rows = [A.DistributionCost('requests', 850, 300, 2, 2048)]
+    fileobj = io.StringIO()
+    A.dump_report('handler', COSTS, rows, fileobj, top=2)
+    report = json.loads(fileobj.getvalue())
+    assert report['module'] == 'handler'
+    assert report['distributions'] == [{
+        'name': 'requests', 'cumulative_us': 850, 'self_us': 300,
+        'modules': 2, 'size': 2048}]
+    assert [cost['module'] for cost in report['imports']] == [
+        'handler', 'requests']
@@ -0,0 +1,206 @@
+from .. import _async as A
+from .._core import automatic_tempdir
+from .test_core import fake_logger  # noqa: F401
+import asyncio
+import concurrent.futures
+import os
+import pytest
+import subprocess
+import sys
+import threading
+import time
+
+
+def python(code):
+    return [sys.executable, '-c', code]
+
+
+class TestRunLogged(object):
+    """
+    Tests for :py:func:`betareduce._async.run_logged`
+    """
+
+    def test_logs_lines(self, fake_logger):
+        """
+        :py:func:`betareduce._async.run_logged` logs each line the
+        command writes to standard output or error.
+        """
+        logger, logged = fake_logger
+        asyncio.run(A.run_logged(python(
+            'import sys; print("one"); print("two", file=sys.stderr)'),
+            _logger=logger))
+        assert [call.args[2] for call in logged['info'][:2]] == [
+            'one', 'two']
+
+    def test_failure(self, fake_logger):
+        """
+        :py:func:`betareduce._async.run_logged` raises
+        :py:exc:`subprocess.CalledProcessError` with the end of the
+        command's output when it fails.
+        """
+        logger, logged = fake_logger
+        with pytest.raises(subprocess.CalledProcessError) as info:
+            asyncio.run(A.run_logged(python(
+                'import sys; print("broken"); sys.exit(3)'),
+                _logger=logger))
+        assert info.value.returncode == 3
+        assert info.value.output.strip() == b'broken'
+
+    def test_cancel_kills(self, fake_logger):
+        """
+        :py:func:`betareduce._async.run_logged` kills the command when
+        it's cancelled.
+        """
+        logger, logged = fake_logger
+        processes = []
+
+        async def recording_exec(*args, **kwargs):
+            process = await asyncio.create_subprocess_exec(*args, **kwargs)
+            processes.append(process)
+            return process
+
+        async def cancel():
+            task = asyncio.ensure_future(A.run_logged(
+                python('import time; print("started", flush=True);'
+                       ' time.sleep(60)'),
+                _create_subprocess_exec=recording_exec, _logger=logger))
+            while not logged.get('info') and not task.done():
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        started = time.monotonic()
+        asyncio.run(cancel())
+        assert time.monotonic() - started < 30
+        [process] = processes
+        assert process.returncode is not None
+
+
+class TestCommandRunner(object):
+    """
+    Tests for :py:class:`betareduce._async.CommandRunner`
+    """
+
+    def test_run(self):
+        """
+        :py:meth:`betareduce._async.CommandRunner.run` runs commands on
+        the event loop from another thread.
+        """
+        ran = []
+
+        async def fake_run_logged(cmd):
+            ran.append((cmd, threading.current_thread()))
+            return 'result'
+
+        async def main():
+            runner = A.CommandRunner(asyncio.get_running_loop(),
+                                     _run_logged=fake_run_logged)
+            return await asyncio.get_running_loop().run_in_executor(
+                None, runner.run, ['pip'])
+
+        assert asyncio.run(main()) == 'result'
+        assert ran == [(['pip'], threading.main_thread())]
+
+    def test_cancelled(self):
+        """
+        :py:meth:`betareduce._async.CommandRunner.run` refuses to run
+        commands once the runner is cancelled.
+        """
+        runner = A.CommandRunner(None)
+        runner.cancel()
+        with pytest.raises(concurrent.futures.CancelledError):
+            runner.run(['pip'])
+
+
+class TestAsyncCreate(object):
+    """
+    Tests for :py:func:`betareduce._async.async_create`
+    """
+
+    def test_create(self):
+        """
+        :py:func:`betareduce._async.async_create` runs
+        :py:func:`betareduce._core.create` in the executor, with a
+        package that runs its commands on the event loop.
+        """
+        calls = []
+
+        def fake_create(fileobj, pip_args, fqpn, _LambdaPackage, **kwargs):
+            package = _LambdaPackage(root='root', fqpn=fqpn)
+            calls.append((fileobj, pip_args, fqpn, kwargs, package,
+                          threading.current_thread()))
+            return 'zip_obj'
+
+        assert asyncio.run(A.async_create(
+            'fileobj', ['requests'], 'handler.handler',
+            compression='fast', _create=fake_create)) == 'zip_obj'
+
+        [(fileobj, pip_args, fqpn, kwargs, package, thread)] = calls
+        assert (fileobj, pip_args, fqpn, kwargs) == (
+            'fileobj', ['requests'], 'handler.handler',
+            {'compression': 'fast'})
+        assert isinstance(package, A.RunnerPackage)
+        assert package.root == 'root'
+        assert thread is not threading.main_thread()
+
+    def test_commands(self):
+        """
+        :py:class:`betareduce._async.RunnerPackage` runs ``pip`` and
+        ``compileall`` with its runner.
+        """
+        class FakeRunner(object):
+            def __init__(self):
+                self.commands = []
+
+            def run(self, cmd):
+                self.commands.append(cmd)
+
+        runner = FakeRunner()
+        package = A.RunnerPackage('root', 'handler.handler', runner)
+        package.install(['requests'])
+        package.compile_bytecode(interpreter='python3.11', sourceless=True)
+        assert runner.commands == [
+            ['pip', 'install', '-t', 'root', 'requests'],
+            ['python3.11', '-m', 'compileall', '-q', '-j', '0', '-b',
+             '--invalidation-mode', 'checked-hash', 'root']]
+
+    def test_cancel_cleans_up(self, fake_logger):
+        """
+        Cancelling :py:func:`betareduce._async.async_create` kills
+        ``pip`` and removes the temporary directory before the
+        cancellation propagates.
+        """
+        logger, logged = fake_logger
+        roots = []
+
+        class SlowPackage(A.RunnerPackage):
+            def install_command(self, args):
+                return python('import time; print("started", flush=True);'
+                              ' time.sleep(60)')
+
+        def fake_create(fileobj, pip_args, fqpn, _LambdaPackage):
+            with automatic_tempdir() as root:
+                roots.append(root)
+                _LambdaPackage(root=root, fqpn=fqpn).install(pip_args)
+
+        def fake_runner(loop):
+            return A.CommandRunner(loop, _run_logged=lambda cmd: (
+                A.run_logged(cmd, _logger=logger)))
+
+        async def cancel():
+            task = asyncio.ensure_future(A.async_create(
+                'fileobj', ['requests'], 'handler.handler',
+                _create=fake_create, _CommandRunner=fake_runner,
+                _RunnerPackage=SlowPackage))
+            while not logged.get('info') and not task.done():
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        started = time.monotonic()
+        asyncio.run(cancel())
+        assert time.monotonic() - started < 30
+        [root] = roots
+        assert not os.path.exists(root)
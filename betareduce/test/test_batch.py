@@ -0,0 +1,293 @@
+from .. import _batch as B
+from .. import _core, _zip
+from .._target import Target
+from .test_core import Call, fake_logger  # noqa: F401
+import contextlib
+import io
+import json
+import os
+import pytest
+import sys
+import zipfile
+
+
+@pytest.fixture
+def write_manifest(tmpdir):
+    """
+    Returns a function that writes a manifest and returns its path.
+    """
+    def write_manifest(manifest):
+        path = str(tmpdir.join('manifest.json'))
+        with open(path, 'w') as f:
+            json.dump(manifest, f)
+        return path
+    return write_manifest
+
+
+def test_read_manifest(write_manifest):
+    """
+    :py:func:`betareduce._batch.read_manifest` reads the packages in
+    a manifest.
+    """
+    path = write_manifest([
+        {"outfile": "a.zip", "fqpn": "a.handler",
+         "requirements": ["-r", "requirements.txt"]},
+        {"outfile": "b.zip", "fqpn": "b.handler", "requirements": []},
+    ])
+    assert B.read_manifest(path) == [
+        B.Entry("a.zip", "a.handler", ["-r", "requirements.txt"]),
+        B.Entry("b.zip", "b.handler", []),
+    ]
+
+
+@pytest.mark.parametrize('manifest,message', [
+    ({"outfile": "a.zip"}, 'must be a list'),
+    ([{"outfile": "a.zip", "fqpn": "a.handler"}], 'package 0 needs'),
+    (["a.zip"], 'package 0 needs'),
+    ([{"outfile": "a.zip", "fqpn": "a.handler", "requirements": 1}],
+     'package 0 needs'),
+    ([{"outfile": "a.zip", "fqpn": "a.handler", "requirements": []},
+      {"outfile": "a.zip", "fqpn": "b.handler", "requirements": []}],
+     'more than one package is written to a.zip'),
+])
+def test_read_manifest_invalid(write_manifest, manifest, message):
+    """
+    :py:func:`betareduce._batch.read_manifest` rejects malformed
+    manifests.
+    """
+    with pytest.raises(ValueError) as info:
+        B.read_manifest(write_manifest(manifest))
+    assert message in str(info.value)
+
+
+def test_group_entries():
+    """
+    :py:func:`betareduce._batch.group_entries` groups packages by the
+    key of their requirements, in the order keys first appear.
+    """
+    entries = [B.Entry('a.zip', 'a.handler', ['x']),
+               B.Entry('b.zip', 'b.handler', ['y']),
+               B.Entry('c.zip', 'c.handler', ['x'])]
+    groups = B.group_entries(entries,
+                             _cache_key=lambda pip_args: pip_args[0])
+    assert list(groups.items()) == [
+        ('x', [entries[0], entries[2]]),
+        ('y', [entries[1]]),
+    ]
+
+
+@pytest.fixture
+def identical_files(tmpdir):
+    """
+    Two staging directories containing the same files.
+    """
+    paths = []
+    for directory in ['one', 'two']:
+        directory = tmpdir.mkdir(directory)
+        directory.join('common.py').write('common = 1\n' * 100)
+        directory.join('unique.py').write(directory.basename * 100)
+        paths.append(str(directory))
+    return paths
+
+
+class TestSharedCompression(object):
+    """
+    Tests for :py:class:`betareduce._batch.SharedCompression`
+    """
+
+    def test_shares_identical_files(self, identical_files):
+        """
+        Files with the same contents and compression settings are
+        compressed once, and the result is what
+        :py:func:`betareduce._zip.compress` would produce.
+        """
+        compressed = []
+
+        def recording_compress(filename, arcname, *args):
+            compressed.append(filename)
+            return _zip.compress(filename, arcname, *args)
+
+        shared = B.SharedCompression()
+        date_time = (2020, 2, 2, 12, 0, 0)
+        for directory in identical_files:
+            for name in ['common.py', 'unique.py']:
+                filename = os.path.join(directory, name)
+                zinfo, data = shared.compress(
+                    filename, name, zipfile.ZIP_DEFLATED, 9, date_time,
+                    _compress=recording_compress)
+                expected_zinfo, expected_data = _zip.compress(
+                    filename, name, zipfile.ZIP_DEFLATED, 9, date_time)
+                assert data == expected_data
+                assert zinfo.FileHeader() == expected_zinfo.FileHeader()
+        one, two = identical_files
+        assert compressed == [os.path.join(one, 'common.py'),
+                              os.path.join(one, 'unique.py'),
+                              os.path.join(two, 'unique.py')]
+        assert shared.hits == 1
+
+    def test_compression_settings(self, identical_files):
+        """
+        The same file compressed with different settings isn't
+        shared.
+        """
+        shared = B.SharedCompression()
+        filename = os.path.join(identical_files[0], 'common.py')
+        shared.compress(filename, 'common.py', zipfile.ZIP_DEFLATED, 1)
+        shared.compress(filename, 'common.py', zipfile.ZIP_DEFLATED, 9)
+        shared.compress(filename, 'common.py', zipfile.ZIP_STORED, None)
+        assert shared.hits == 0
+
+    def test_max_size(self, identical_files):
+        """
+        Members are only held while the total stays within
+        ``max_size``.
+        """
+        shared = B.SharedCompression(max_size=0)
+        for directory in identical_files:
+            shared.compress(os.path.join(directory, 'common.py'),
+                            'common.py', zipfile.ZIP_DEFLATED, None)
+        assert shared.hits == 0
+        assert shared.size == 0
+
+    def test_stream(self, identical_files):
+        """
+        Streamed files are written as usual.
+        """
+        streamed = []
+
+        def fake_stream(zip_obj, filename, arcname, date_time):
+            streamed.append(Call(args=(zip_obj, filename, arcname),
+                                 kwargs={'date_time': date_time}))
+
+        B.SharedCompression().stream('zip_obj', 'filename', 'arcname',
+                                     _stream=fake_stream)
+        assert streamed == [Call(args=('zip_obj', 'filename', 'arcname'),
+                                 kwargs={'date_time': None})]
+
+
+class TestBuildAll(object):
+    """
+    Tests for :py:func:`betareduce._batch.build_all`
+    """
+
+    @pytest.fixture
+    def entries(self):
+        return [B.Entry('a.zip', 'a.handler', ['-r', 'shared.txt']),
+                B.Entry('b.zip', 'b.handler', ['-r', 'other.txt']),
+                B.Entry('c.zip', 'c.handler', ['-r', 'shared.txt'])]
+
+    @pytest.fixture
+    def builder(self, tmpdir, entries, fake_logger):
+        """
+        Returns a function that runs
+        :py:func:`betareduce._batch.build_all` on ``entries`` with
+        fake installs, and the calls it made.
+        """
+        fake_logger, captured = fake_logger
+        calls = {'prepare': [], 'removed': [], 'tempdirs': 0}
+
+        @contextlib.contextmanager
+        def fake_automatic_tempdir():
+            calls['tempdirs'] += 1
+            yield str(tmpdir.mkdir('staging%d' % (calls['tempdirs'],)))
+
+        def fake_prepare(package, pip_args, **kwargs):
+            calls['prepare'].append(Call(args=(pip_args,), kwargs=kwargs))
+            with open(os.path.join(package.root, 'common.py'), 'w') as f:
+                f.write('common = 1\n' * 100)
+            with open(os.path.join(package.root, 'deps.txt'), 'w') as f:
+                f.write(' '.join(pip_args))
+
+        outputs = {}
+
+        @contextlib.contextmanager
+        def fake_open(path, mode):
+            assert mode == 'wb'
+            outputs[path] = io.BytesIO()
+            yield outputs[path]
+            outputs[path] = outputs[path].getvalue()
+
+        def build(**kwargs):
+            kwargs.setdefault('_write_package', _core.write_package)
+            built = B.build_all(
+                entries, exclude_extension_modules=False,
+                _automatic_tempdir=fake_automatic_tempdir,
+                _prepare=fake_prepare,
+                _group_entries=lambda entries: B.group_entries(
+                    entries, _cache_key=lambda pip_args: pip_args[-1]),
+                _open=fake_open,
+                _remove=calls['removed'].append,
+                _logger=fake_logger,
+                **kwargs)
+            return built, outputs, calls, captured
+
+        build.calls = calls
+        build.captured = captured
+        return build
+
+    def test_installs_once(self, builder):
+        """
+        Packages with the same requirements are built from one
+        installation, and their shared files compressed once.
+        """
+        built, outputs, calls, captured = builder(workers=2,
+                                                  cache_dir='cache')
+
+        assert built == ['a.zip', 'c.zip', 'b.zip']
+        assert calls['tempdirs'] == 2
+        # the two installs run concurrently, in either order.
+        assert sorted(call.args for call in calls['prepare']) == [
+            (['-r', 'other.txt'],), (['-r', 'shared.txt'],)]
+        assert all(call.kwargs['cache_dir'] == 'cache'
+                   for call in calls['prepare'])
+        for outfile, fqpn, pip_args in [('a.zip', 'a.handler', 'shared.txt'),
+                                        ('b.zip', 'b.handler', 'other.txt'),
+                                        ('c.zip', 'c.handler', 'shared.txt')]:
+            with zipfile.ZipFile(io.BytesIO(outputs[outfile])) as zip_obj:
+                assert zip_obj.read('deps.txt') == b'-r ' + pip_args.encode()
+                assert zip_obj.read('lambda_entry.py') == (
+                    'from %s import %s\n' % tuple(fqpn.split('.'))).encode()
+        assert captured['info'][-1].args[1:] == (3, 2, 3)
+
+    def test_deterministic(self, builder):
+        """
+        Packages are built reproducibly when asked to.
+        """
+        built, outputs, calls, captured = builder(
+            deterministic=True,
+            _source_date_time=lambda: (2020, 2, 2, 12, 0, 0))
+        with zipfile.ZipFile(io.BytesIO(outputs['a.zip'])) as zip_obj:
+            assert set(info.date_time for info in zip_obj.infolist()) == {
+                (2020, 2, 2, 12, 0, 0)}
+
+    def test_failure_builds_the_rest(self, builder):
+        """
+        A package that fails to build is removed while the rest are
+        still built, and the failure is raised afterwards.
+        """
+        written = []
+
+        def failing_write_package(package, fileobj, **kwargs):
+            if package.fqpn == 'a.handler':
+                raise ValueError("broken")
+            written.append(package.fqpn)
+            return _core.write_package(package, fileobj, **kwargs)
+
+        with pytest.raises(ValueError):
+            builder(_write_package=failing_write_package)
+        assert sorted(written) == ['b.handler', 'c.handler']
+        assert builder.calls['removed'] == ['a.zip']
+        [error] = builder.captured['error']
+        assert error.args[1:2] == ('a.zip',)
+
+    def test_invalid_options(self, builder):
+        """
+        Invalid options are rejected before anything is installed.
+        """
+        with pytest.raises(ValueError):
+            builder(compile_bytecode='sometimes')
+        with pytest.raises(ValueError):
+            builder(strip=['everything'])
+        with pytest.raises(ValueError):
+            builder(compile_bytecode='both', target=Target(
+                (3, 11) if sys.version_info[:2] != (3, 11) else (3, 12)))
@@ -0,0 +1,136 @@
+from .. import _bench as B
+import io
+import json
+import os
+import pytest
+
+TINY = B.Shape(directories=2, depth=2, files=3, file_size=64,
+               huge_files=1, huge_size=1024 * 1024, extensions=1)
+
+
+def tree(root):
+    contents = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path, 'rb') as f:
+                contents[os.path.relpath(path, root)] = f.read()
+    return contents
+
+
+def test_make_tree(tmpdir):
+    """
+    :py:func:`betareduce._bench.make_tree` writes the same tree of the
+    shape given for the same seed.
+    """
+    first, second = tmpdir.join('first'), tmpdir.join('second')
+    assert B.make_tree(str(first), TINY) == 17
+    B.make_tree(str(second), TINY)
+
+    contents = tree(str(first))
+    assert len(contents) == 17
+    assert contents == tree(str(second))
+    assert len(contents['data0.bin']) == 1024 * 1024
+    assert os.path.join('package1', 'level0', 'module2.py') in contents
+
+
+def test_run(tmpdir):
+    """
+    :py:func:`betareduce._bench.run` times each benchmark on each
+    shape and removes the trees it made.
+    """
+    roots = []
+
+    def fake_mkdtemp(prefix):
+        roots.append(str(tmpdir.join(str(len(roots)))))
+        return roots[-1]
+
+    results = B.run(shapes={'tiny': TINY}, repeat=1, commit='abc',
+                    _mkdtemp=fake_mkdtemp)
+
+    assert [result['benchmark'] for result in results] == list(B.BENCHMARKS)
+    assert all(result['shape'] == 'tiny' and result['commit'] == 'abc' and
+               result['files'] == 17 and result['seconds'] >= 0
+               for result in results)
+    assert not any(os.path.exists(root) for root in roots)
+
+
+def result(commit, benchmark, seconds):
+    return {'commit': commit, 'shape': 'tiny', 'benchmark': benchmark,
+            'seconds': seconds}
+
+
+def test_compare():
+    """
+    :py:func:`betareduce._bench.compare` compares results with the
+    most recent for another commit and finds regressions.
+    """
+    history = [result('old', 'files', 5.0), result('old', 'filters', 1.0),
+               result('older', 'to_zipfile', 1.0),
+               result('new', 'files', 0.1)]
+    results = [result('new', 'files', 1.0), result('new', 'filters', 1.5),
+               result('new', 'relativize_path', 1.0)]
+
+    compared, regressions = B.compare(results, history, threshold=0.2)
+
+    assert [(now['benchmark'], then['commit'], ratio)
+            for now, then, ratio in compared] == [('files', 'old', 0.2),
+                                                  ('filters', 'old', 1.5)]
+    assert [now['benchmark'] for now, _, _ in regressions] == ['filters']
+
+
+class TestMain(object):
+    """
+    Tests for :py:func:`betareduce._bench.main`
+    """
+
+    @pytest.fixture
+    def run_calls(self):
+        return []
+
+    def fake_run(self, run_calls, seconds):
+        def fake_run(shapes, benchmarks, repeat, commit):
+            run_calls.append((list(shapes), benchmarks, repeat))
+            return [result(commit, 'files', seconds)]
+        return fake_run
+
+    def test_prints(self, run_calls):
+        """
+        :py:func:`betareduce._bench.main` runs the benchmarks chosen
+        and prints their results.
+        """
+        stdout = io.StringIO()
+        B.main(_argv=['-s', 'deep', '-b', 'files', '-r', '5'],
+               _run=self.fake_run(run_calls, 1.0),
+               _current_commit=lambda: 'new', _stdout=stdout)
+        assert run_calls == [(['deep'], ['files'], 5)]
+        assert stdout.getvalue().split() == ['tiny', 'files', '1.0000s']
+
+    def test_output(self, run_calls, tmpdir):
+        """
+        :py:func:`betareduce._bench.main` appends results to the
+        output file and exits with an error when they regress.
+        """
+        output = str(tmpdir.join('benchmarks.jsonl'))
+        with open(output, 'w') as f:
+            f.write(json.dumps(result('old', 'files', 1.0)) + '\n')
+        stdout = io.StringIO()
+
+        with pytest.raises(SystemExit) as excinfo:
+            B.main(_argv=['-o', output], _run=self.fake_run(run_calls, 2.0),
+                   _current_commit=lambda: 'new', _stdout=stdout)
+
+        assert excinfo.value.code == 1
+        assert 'regression: tiny files took 2.00x as long as at old' in (
+            stdout.getvalue())
+        assert [line['commit'] for line in B.read_results(output)] == [
+            'old', 'new']
+        assert run_calls == [(list(B.SHAPES), tuple(B.BENCHMARKS), 3)]
+
+
+def test_read_results_missing(tmpdir):
+    """
+    :py:func:`betareduce._bench.read_results` returns no results for
+    a missing file.
+    """
+    assert B.read_results(str(tmpdir.join('missing.jsonl'))) == []
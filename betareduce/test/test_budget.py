@@ -0,0 +1,118 @@
+from .. import _budget as B
+from .. import _dists
+from .test_core import fake_logger  # noqa: F401
+import pytest
+import zipfile
+
+
+def member(filename, file_size, compress_size):
+    zinfo = zipfile.ZipInfo(filename)
+    zinfo.file_size = file_size
+    zinfo.compress_size = compress_size
+    return zinfo
+
+
+def overhead(filename):
+    return 76 + 2 * len(filename)
+
+
+@pytest.mark.parametrize('size,formatted', [
+    (0, '0 bytes'),
+    (1023, '1023 bytes'),
+    (1024, '1.0 KiB'),
+    (int(2.5 * 1024 ** 2), '2.5 MiB'),
+    (3 * 1024 ** 3, '3.0 GiB'),
+    (5 * 1024 ** 4, '5120.0 GiB'),
+])
+def test_format_size(size, formatted):
+    """
+    :py:func:`betareduce._budget.format_size` formats byte counts.
+    """
+    assert B.format_size(size) == formatted
+
+
+def fake_find_distributions(root):
+    return [_dists.Distribution('requests', '2.31.0',
+                                'requests-2.31.0.dist-info',
+                                ['requests/__init__.py'])]
+
+
+class TestSizeBudget(object):
+    """
+    Tests for :py:class:`betareduce._budget.SizeBudget`
+    """
+
+    def budget(self, **kwargs):
+        return B.SizeBudget('root',
+                            _find_distributions=fake_find_distributions,
+                            **kwargs)
+
+    def test_totals_and_breakdown(self, fake_logger):
+        """
+        Members are totalled and attributed to distributions, largest
+        first, and reported.
+        """
+        fake_logger, captured = fake_logger
+        budget = B.SizeBudget('root',
+                              _find_distributions=fake_find_distributions,
+                              _logger=fake_logger)
+        budget.add(member('requests/__init__.py', 100, 50))
+        budget.add(member('requests/api.py', 300, 100))
+        budget.add(member('handler.py', 1000, 10))
+
+        assert budget.members == 3
+        assert budget.size == 1400
+        assert budget.compressed_size == (
+            160 + overhead('requests/__init__.py') +
+            overhead('requests/api.py') + overhead('handler.py'))
+        assert budget.breakdown() == [
+            ('handler.py', 1000, 10 + overhead('handler.py')),
+            ('requests', 400, 150 + overhead('requests/__init__.py') +
+             overhead('requests/api.py')),
+        ]
+
+        budget.report()
+        assert len(captured['info']) == 3
+        assert captured['info'][0].args[1:] == (
+            '1.4 KiB', B.format_size(budget.compressed_size), 3)
+
+    @pytest.mark.parametrize('kwargs,kind', [
+        ({'max_size': 350}, 'uncompressed'),
+        ({'max_compressed_size': 300}, 'compressed'),
+    ])
+    def test_exceeded(self, kwargs, kind):
+        """
+        Exceeding either limit raises
+        :py:exc:`betareduce._budget.SizeBudgetExceeded` with a ranked
+        breakdown.
+        """
+        budget = self.budget(**kwargs)
+        budget.add(member('handler.py', 100, 10))
+        with pytest.raises(B.SizeBudgetExceeded) as info:
+            budget.add(member('requests/api.py', 300, 200))
+
+        exc = info.value
+        assert [name for name, _, _ in exc.breakdown] == [
+            'requests', 'handler.py']
+        lines = str(exc).splitlines()
+        assert kind in lines[0]
+        assert 'after 2 files' in lines[0]
+        assert lines[1].split()[0] == 'requests'
+        assert lines[2].split()[0] == 'handler.py'
+
+    def test_arcname(self):
+        """
+        Members are attributed by ``arcname`` when it's given.
+        """
+        budget = self.budget()
+        budget.add(member('python/requests/api.py', 100, 10),
+                   'requests/api.py')
+        assert [name for name, _, _ in budget.breakdown()] == ['requests']
+
+    def test_within_budget(self):
+        """
+        Packages within their budget don't raise.
+        """
+        budget = self.budget(max_size=100, max_compressed_size=1000)
+        budget.add(member('handler.py', 100, 10))
+        assert budget.size == 100
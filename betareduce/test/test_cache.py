@@ -0,0 +1,242 @@
+from .. import _cache as C
+import json
+import os
+import pytest
+
+
+def write(path, contents):
+    """
+    Write ``contents`` to ``path``, creating its parent directories.
+    """
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        f.write(contents)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('pip_args,normalized', [
+    (['-r', 'reqs.txt'], ['-r', 'reqs.txt']),
+    (['-rreqs.txt'], ['-r', 'reqs.txt']),
+    (['--requirement=reqs.txt'], ['-r', 'reqs.txt']),
+    (['--constraint', 'c.txt'], ['-c', 'c.txt']),
+    (['-cconstraints.txt', 'pkg'], ['-c', 'constraints.txt', 'pkg']),
+    (['-U', 'pkg'], ['-U', 'pkg']),
+])
+def test_normalize_pip_args(pip_args, normalized):
+    """
+    :py:func:`betareduce._cache.normalize_pip_args` splits options
+    from their values.
+    """
+    assert C.normalize_pip_args(pip_args) == normalized
+
+
+class TestCacheKey(object):
+    """
+    Tests for :py:func:`betareduce._cache.cache_key`
+    """
+
+    def key(self, pip_args, tag='tag'):
+        return C.cache_key(pip_args, _interpreter_tag=lambda: tag)
+
+    def test_stable(self):
+        """
+        The same arguments and interpreter produce the same key.
+        """
+        assert self.key(['pkg']) == self.key(['pkg'])
+
+    def test_arguments(self):
+        """
+        Different arguments produce different keys.
+        """
+        assert self.key(['pkg']) != self.key(['other'])
+        assert self.key(['a', 'b']) != self.key(['ab'])
+
+    def test_interpreter(self):
+        """
+        Different interpreters produce different keys.
+        """
+        assert self.key(['pkg'], 'py2') != self.key(['pkg'], 'py3')
+
+    def test_equivalent_forms(self, tmpdir):
+        """
+        Equivalent spellings of a requirement file option produce the
+        same key.
+        """
+        path = str(tmpdir.join('reqs.txt'))
+        write(path, 'pkg\n')
+        assert (self.key(['-r', path]) ==
+                self.key(['-r' + path]) ==
+                self.key(['--requirement', path]) ==
+                self.key(['--requirement=' + path]))
+
+    def test_requirement_file_contents(self, tmpdir):
+        """
+        Changing a requirement file, or a file it includes, changes
+        the key.
+        """
+        path = str(tmpdir.join('reqs.txt'))
+        included = str(tmpdir.join('base.txt'))
+        write(path, '-r base.txt\n-r base.txt\n-r missing.txt\n')
+        write(included, 'pkg==1\n')
+        before = self.key(['-r', path])
+        write(included, 'pkg==2\n')
+        assert self.key(['-r', path]) != before
+
+    def test_local_directory(self, tmpdir):
+        """
+        Changing the contents of a local project changes the key, but
+        its hidden directories and bytecode caches do not.
+        """
+        project = str(tmpdir.join('project'))
+        write(os.path.join(project, 'setup.py'), 'setup()')
+        before = self.key([project])
+        write(os.path.join(project, '.git', 'HEAD'), 'ref')
+        write(os.path.join(project, '__pycache__', 'x.pyc'), 'x')
+        assert self.key([project]) == before
+        write(os.path.join(project, 'pkg', '__init__.py'), '')
+        assert self.key([project]) != before
+
+    def test_local_file(self, tmpdir):
+        """
+        Changing a local archive changes the key.
+        """
+        path = str(tmpdir.join('pkg.tar.gz'))
+        write(path, 'one')
+        before = self.key([path])
+        write(path, 'two')
+        assert self.key([path]) != before
+
+
+def test_interpreter_tag():
+    """
+    :py:func:`betareduce._cache.interpreter_tag` returns a non-empty
+    tag.
+    """
+    assert C.interpreter_tag()
+
+
+class TestLinkTree(object):
+    """
+    Tests for :py:func:`betareduce._cache.link_tree`
+    """
+
+    def test_links(self, tmpdir):
+        """
+        Files are hardlinked into the destination, replacing existing
+        files.
+        """
+        source = str(tmpdir.join('source'))
+        destination = str(tmpdir.join('destination'))
+        write(os.path.join(source, 'a', 'b.py'), 'b')
+        write(os.path.join(source, 'c.py'), 'cc')
+        write(os.path.join(destination, 'c.py'), 'old')
+
+        assert C.link_tree(source, destination) == 3
+        assert read(os.path.join(destination, 'a', 'b.py')) == 'b'
+        assert read(os.path.join(destination, 'c.py')) == 'cc'
+        assert os.path.samefile(os.path.join(source, 'c.py'),
+                                os.path.join(destination, 'c.py'))
+
+    def test_falls_back_to_copy(self, tmpdir):
+        """
+        Files are copied when they can't be linked.
+        """
+        source = str(tmpdir.join('source'))
+        destination = str(tmpdir.join('destination'))
+        write(os.path.join(source, 'a.py'), 'a')
+
+        def fail_link(source, destination):
+            raise OSError("cross-device link")
+
+        C.link_tree(source, destination, _link=fail_link)
+        assert read(os.path.join(destination, 'a.py')) == 'a'
+        assert not os.path.samefile(os.path.join(source, 'a.py'),
+                                    os.path.join(destination, 'a.py'))
+
+
+class TestInstallCache(object):
+    """
+    Tests for :py:class:`betareduce._cache.InstallCache`
+    """
+
+    @pytest.fixture
+    def cache(self, tmpdir):
+        return C.InstallCache(str(tmpdir.join('cache')), max_size=100,
+                              _cache_key=lambda args: '-'.join(args))
+
+    @pytest.fixture
+    def root(self, tmpdir):
+        root = str(tmpdir.join('root'))
+        write(os.path.join(root, 'pkg', '__init__.py'), 'x' * 10)
+        return root
+
+    def test_key(self, cache):
+        """
+        :py:meth:`betareduce._cache.InstallCache.key` computes the
+        key for ``pip_args``.
+        """
+        assert cache.key(['a', 'b']) == 'a-b'
+
+    def test_miss(self, cache, tmpdir):
+        """
+        :py:meth:`betareduce._cache.InstallCache.restore` returns
+        :py:class:`False` for unknown keys.
+        """
+        assert not cache.restore('missing', str(tmpdir.join('empty')))
+
+    def test_store_and_restore(self, cache, root, tmpdir):
+        """
+        A stored tree can be restored into another staging directory,
+        and the cached copy is independent of the original.
+        """
+        cache.store('key', root)
+        write(os.path.join(root, 'pkg', '__init__.py'), 'changed')
+
+        restored = str(tmpdir.join('restored'))
+        assert cache.restore('key', restored)
+        assert read(os.path.join(restored, 'pkg', '__init__.py')) == 'x' * 10
+
+    def test_store_existing(self, cache, root):
+        """
+        Storing a key that's already cached keeps the existing entry.
+        """
+        cache.store('key', root)
+        cache.store('key', root)
+        assert [key for _, _, key in cache.entries()] == ['key']
+
+    def test_evicts_least_recently_used(self, cache, root, tmpdir):
+        """
+        Entries are evicted, least recently used first, when the
+        cache grows past its maximum size.
+        """
+        write(os.path.join(root, 'pkg', '__init__.py'), 'x' * 40)
+        cache.store('first', root)
+        cache.store('second', root)
+        # make "first" the oldest, then use it so "second" is.
+        for key, when in [('first', 1000), ('second', 2000)]:
+            os.utime(os.path.join(cache.directory, key, 'entry.json'),
+                     (when, when))
+        assert cache.restore('first', str(tmpdir.join('restored')))
+
+        cache.store('third', root)
+
+        assert sorted(key for _, _, key in cache.entries()) == [
+            'first', 'third']
+
+    def test_entries_ignores_incomplete(self, cache, root):
+        """
+        :py:meth:`betareduce._cache.InstallCache.entries` ignores
+        directories without valid metadata.
+        """
+        cache.store('key', root)
+        os.makedirs(os.path.join(cache.directory, '.partial'))
+        write(os.path.join(cache.directory, 'corrupt', 'entry.json'), '{')
+        assert [key for _, _, key in cache.entries()] == ['key']
+        with open(os.path.join(cache.directory, 'key', 'entry.json')) as f:
+            assert json.load(f) == {'size': 10}
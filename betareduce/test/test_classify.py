@@ -0,0 +1,147 @@
+from .. import _classify as K
+from .. import _files
+import os
+import pytest
+import struct
+
+
+def elf_header(machine, byte_order='<'):
+    """
+    Return the start of an ELF shared object built for the ELF
+    ``e_machine`` value ``machine``.
+    """
+    data = {'<': 1, '>': 2}[byte_order]
+    return (b'\x7fELF' + bytes([2, data, 1]) + b'\0' * 9 +
+            struct.pack(byte_order + 'HH', 3, machine) + b'\0' * 44)
+
+
+def write(tmpdir, relpath, contents):
+    path = tmpdir.join(*relpath.split('/'))
+    path.dirpath().ensure(dir=True)
+    path.write_binary(contents)
+    return str(path)
+
+
+@pytest.mark.parametrize('contents,machine', [
+    (elf_header(62), 'x86_64'),
+    (elf_header(183), 'aarch64'),
+    (elf_header(22, '>'), 's390x'),
+    (elf_header(9999), None),
+    (b'\xcf\xfa\xed\xfe' + b'\0' * 60, None),
+    (b'\x7fELF', None),
+    (b'', None),
+])
+def test_elf_machine(tmpdir, contents, machine):
+    """
+    :py:func:`betareduce._classify.elf_machine` reads the machine an
+    ELF binary is for from its header.
+    """
+    assert K.elf_machine(write(tmpdir, 'module.so', contents)) == machine
+
+
+def test_elf_machine_missing(tmpdir):
+    """
+    :py:func:`betareduce._classify.elf_machine` returns
+    :py:class:`None` for a file that can't be read.
+    """
+    assert K.elf_machine(str(tmpdir.join('missing.so'))) is None
+
+
+@pytest.mark.parametrize('filename,extension', [
+    ('package/module.py', False),
+    ('package/module.pyc', False),
+    ('package.libs/libz-abcdef12.so.1.2.13', False),
+    ('package/_speedups.so', True),
+    ('package/_speedups.cpython-39-darwin.so', True),
+    ('package/_speedups.cp311-win_amd64.pyd', True),
+] + [('package/_speedups' + suffix, True) for suffix in K.HOST_SUFFIXES])
+def test_is_extension(filename, extension):
+    """
+    :py:func:`betareduce._classify.is_extension` recognizes extension
+    modules for any interpreter by name.
+    """
+    assert K.is_extension(filename) is extension
+
+
+class TestClassifier(object):
+    """
+    Tests for :py:class:`betareduce._classify.Classifier`
+    """
+
+    SUFFIXES = ('.cpython-311-x86_64-linux-gnu.so', '.abi3.so', '.so')
+
+    @pytest.fixture
+    def elf_machine_calls(self):
+        return []
+
+    @pytest.fixture
+    def classifier(self, elf_machine_calls):
+        def recording_elf_machine(path):
+            elf_machine_calls.append(path)
+            return K.elf_machine(path)
+
+        return K.Classifier(self.SUFFIXES, machine='x86_64',
+                            _elf_machine=recording_elf_machine)
+
+    @pytest.mark.parametrize('relpath,contents,kind', [
+        ('package/module.py', b'', K.PURE),
+        ('package.libs/libz-abcdef12.so.1', elf_header(62), K.PURE),
+        ('package/_speedups.cpython-311-x86_64-linux-gnu.so',
+         elf_header(62), K.EXTENSION),
+        ('package/_rust.abi3.so', elf_header(62), K.EXTENSION),
+        ('package/_untagged.so', elf_header(62), K.EXTENSION),
+        ('package/_speedups.cpython-311-x86_64-linux-gnu.so',
+         elf_header(183), K.FOREIGN),
+        ('package/_untagged.so', b'\xcf\xfa\xed\xfe', K.FOREIGN),
+        ('package/_speedups.cpython-310-x86_64-linux-gnu.so',
+         elf_header(62), K.FOREIGN),
+        ('package/_speedups.cp311-win_amd64.pyd', b'MZ', K.FOREIGN),
+        ('package/_speedups.pypy39-pp73-x86_64-linux-gnu.so',
+         elf_header(62), K.FOREIGN),
+        ('numpy.libs/libopenblas64_p-r0-0cf96a72.3.23.dev.so',
+         elf_header(62), K.EXTENSION),
+        ('scipy.libs/libopenblasp-r0-41284840.3.21.dev.so',
+         elf_header(62), K.EXTENSION),
+        ('shapely.libs/libgeos-3.11.so', elf_header(62), K.EXTENSION),
+        ('shapely.libs/libgeos-3.11.so', elf_header(183), K.FOREIGN),
+    ])
+    def test_classify(self, classifier, tmpdir, relpath, contents, kind):
+        """
+        :py:meth:`betareduce._classify.Classifier.classify` classifies
+        files by their names and their ELF headers.
+        """
+        assert classifier.classify(write(tmpdir, relpath, contents)) == kind
+
+    def test_classify_missing(self, classifier, tmpdir):
+        """
+        An extension module that can't be read is foreign.
+        """
+        path = str(tmpdir.join('_speedups.abi3.so'))
+        assert classifier.classify(path) == K.FOREIGN
+
+    def test_classify_without_machine(self, tmpdir):
+        """
+        Without a machine, extension modules are classified by name
+        alone.
+        """
+        classifier = K.Classifier(self.SUFFIXES)
+        path = str(tmpdir.join('_speedups.abi3.so'))
+        assert classifier.classify(path) == K.EXTENSION
+
+    def test_classify_memoized(self, classifier, elf_machine_calls, tmpdir):
+        """
+        Each file's header is read once for as long as it's
+        unmodified, however it's named.
+        """
+        path = write(tmpdir, 'package/_speedups.abi3.so', elf_header(62))
+        [record] = _files.scan(str(tmpdir))
+
+        assert classifier.classify(path) == K.EXTENSION
+        assert classifier.classify(record) == K.EXTENSION
+        assert elf_machine_calls == [path]
+
+        with open(path, 'wb') as f:
+            f.write(elf_header(183))
+        os.utime(path, (0, 0))
+        assert classifier.classify(path) == K.FOREIGN
+        assert elf_machine_calls == [path, path]
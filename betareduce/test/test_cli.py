@@ -1,7 +1,26 @@
 from .. import _cli as C
+from .._analyze import DistributionCost
+from .._budget import SizeBudgetExceeded
+from .._importtime import ImportCost
+from .._profile import BuildProfile
+import argparse
 import contextlib
+import io
+import json
 import logging
 import pytest
+import subprocess
+
+
+class FakeZipFile(object):
+    """
+    A fake :py:class:`zipfile.ZipFile` that records whether it was
+    closed.
+    """
+    closed = False
+
+    def close(self):
+        self.closed = True
 
 
 class TestRun(object):
@@ -35,9 +54,13 @@ class TestRun(object):
         calls = []
 
         def fake_create(fileobj, requirements, fqpn, root,
-                        exclude_extension_modules):
+                        exclude_extension_modules, **kwargs):
             calls.append((fileobj, requirements, fqpn, root,
                           exclude_extension_modules))
+            fake_create.kwargs = kwargs
+            return fake_create.zip_obj
+
+        fake_create.zip_obj = FakeZipFile()
         return fake_create, calls
 
     @pytest.mark.parametrize("outfile,fqpn,requirements", [
@@ -62,6 +85,8 @@ class TestRun(object):
 
         assert open_calls == [(outfile, 'wb')]
         assert create_calls == [("file", requirements, fqpn, None, True)]
+        assert fake_create.zip_obj.closed
+        assert 'previous' not in fake_create.kwargs
 
     @pytest.mark.parametrize("staging_flag", [
         "--staging-directory", "-d",
@@ -135,3 +160,713 @@ class TestRun(object):
             assert logging.root.level == logging.ERROR
         else:
             assert logging.root.level == logging.DEBUG
+
+    def test_cache_dir(self,
+                       make_fake_open_and_calls,
+                       fake_create_and_calls):
+        """
+        :py:func:`betareduce._core.run` passes the cache directory and
+        its maximum size from the command line.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement",
+                     "--cache-dir", "cache", "--cache-size", "3M"],
+              _open=fake_open,
+              _create=fake_create)
+
+        assert fake_create.kwargs['cache_dir'] == "cache"
+        assert fake_create.kwargs['cache_max_size'] == 3 * 1024 ** 2
+
+    def test_no_cache_dir(self,
+                          make_fake_open_and_calls,
+                          fake_create_and_calls):
+        """
+        :py:func:`betareduce._core.run` does not cache installs
+        unless asked to.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement"],
+              _open=fake_open,
+              _create=fake_create)
+
+        assert fake_create.kwargs['cache_dir'] is None
+
+    @pytest.mark.parametrize("jobs_flag", ["--jobs", "-j"])
+    def test_jobs(self,
+                  make_fake_open_and_calls,
+                  fake_create_and_calls,
+                  jobs_flag):
+        """
+        :py:func:`betareduce._core.run` passes the number of
+        compression jobs from the command line.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement",
+                     jobs_flag, "4"],
+              _open=fake_open,
+              _create=fake_create)
+
+        assert fake_create.kwargs['jobs'] == 4
+
+    @pytest.mark.parametrize("incremental_flag", ["--incremental", "-i"])
+    def test_incremental(self,
+                         make_fake_open_and_calls,
+                         fake_create_and_calls,
+                         incremental_flag):
+        """
+        :py:func:`betareduce._core.run` builds incrementally from the
+        existing outfile by writing beside it and replacing it.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+        replace_calls = []
+
+        def fake_replace(source, destination):
+            assert fake_create.zip_obj.closed
+            replace_calls.append((source, destination))
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement",
+                     incremental_flag],
+              _open=fake_open,
+              _create=fake_create,
+              _replace=fake_replace)
+
+        assert open_calls == [("outfile.partial", 'wb')]
+        assert fake_create.kwargs['previous'] == "outfile"
+        assert replace_calls == [("outfile.partial", "outfile")]
+
+    def test_stdout(self,
+                    make_fake_open_and_calls,
+                    fake_create_and_calls):
+        """
+        :py:func:`betareduce._core.run` writes the package to standard
+        output when the outfile is ``-``.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        class FakeStdout(object):
+            buffer = "stdout buffer"
+
+        C.run(_argv=["-", "fqpn.callable", "requirement"],
+              _open=fake_open,
+              _create=fake_create,
+              _stdout=FakeStdout())
+
+        assert not open_calls
+        assert create_calls == [
+            ("stdout buffer", ["requirement"], "fqpn.callable", None, True)]
+        assert fake_create.zip_obj.closed
+
+    def test_stdout_incremental(self,
+                                make_fake_open_and_calls,
+                                fake_create_and_calls,
+                                capsys):
+        """
+        :py:func:`betareduce._core.run` refuses to build
+        incrementally to standard output.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        with pytest.raises(SystemExit):
+            C.run(_argv=["-", "fqpn.callable", "requirement", "-i"],
+                  _open=fake_open,
+                  _create=fake_create)
+
+        assert not create_calls
+        assert "--incremental" in capsys.readouterr().err
+
+    @pytest.mark.parametrize("argv,expected", [
+        ([], (None, None, False)),
+        (["--compile", "both"], ("both", None, False)),
+        (["-c", "sourceless", "--compile-interpreter", "python3.12",
+          "--unchecked-hash"], ("sourceless", "python3.12", True)),
+    ])
+    def test_compile(self,
+                     make_fake_open_and_calls,
+                     fake_create_and_calls,
+                     argv,
+                     expected):
+        """
+        :py:func:`betareduce._core.run` passes bytecode compilation
+        options from the command line.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement"] + argv,
+              _open=fake_open,
+              _create=fake_create)
+
+        assert (fake_create.kwargs['compile_bytecode'],
+                fake_create.kwargs['bytecode_interpreter'],
+                fake_create.kwargs['unchecked_hash']) == expected
+
+    @pytest.mark.parametrize("argv,expected", [
+        ([], (False, [])),
+        (["--tree-shake"], (True, [])),
+        (["-t", "-k", "a.*", "--keep-module", "b"], (True, ["a.*", "b"])),
+    ])
+    def test_tree_shake(self,
+                        make_fake_open_and_calls,
+                        fake_create_and_calls,
+                        argv,
+                        expected):
+        """
+        :py:func:`betareduce._core.run` passes tree shaking options
+        from the command line.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement"] + argv,
+              _open=fake_open,
+              _create=fake_create)
+
+        assert (fake_create.kwargs['tree_shake'],
+                fake_create.kwargs['keep_modules']) == expected
+
+    @pytest.mark.parametrize("argv,expected", [
+        ([], []),
+        (["--strip", "safe"], ["safe"]),
+        (["-s", "aggressive", "-s", "docs"], ["aggressive", "docs"]),
+    ])
+    def test_strip(self,
+                   make_fake_open_and_calls,
+                   fake_create_and_calls,
+                   argv,
+                   expected):
+        """
+        :py:func:`betareduce._core.run` passes strip profiles and
+        rules from the command line.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement"] + argv,
+              _open=fake_open,
+              _create=fake_create)
+
+        assert fake_create.kwargs['strip'] == expected
+
+    @pytest.mark.parametrize("argv,expected", [
+        ([], False),
+        (["--deterministic"], True),
+    ])
+    def test_deterministic(self,
+                           make_fake_open_and_calls,
+                           fake_create_and_calls,
+                           argv,
+                           expected):
+        """
+        :py:func:`betareduce._core.run` builds reproducible packages
+        when asked to.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement"] + argv,
+              _open=fake_open,
+              _create=fake_create)
+
+        assert fake_create.kwargs['deterministic'] is expected
+
+    @pytest.mark.parametrize("argv,expected", [
+        ([], None),
+        (["--wheelhouse", "wheels"], "wheels"),
+        (["-W", "wheels"], "wheels"),
+    ])
+    def test_wheelhouse(self,
+                        make_fake_open_and_calls,
+                        fake_create_and_calls,
+                        argv,
+                        expected):
+        """
+        :py:func:`betareduce._core.run` passes the wheelhouse from the
+        command line.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement"] + argv,
+              _open=fake_open,
+              _create=fake_create)
+
+        assert fake_create.kwargs['wheelhouse'] == expected
+
+    @pytest.mark.parametrize("argv,expected", [
+        ([], (False, [])),
+        (["--lazy-handler"], (True, [])),
+        (["--prewarm", "boto3", "--prewarm", "pkg.sub"],
+         (True, ["boto3", "pkg.sub"])),
+    ])
+    def test_lazy_handler(self,
+                          make_fake_open_and_calls,
+                          fake_create_and_calls,
+                          argv,
+                          expected):
+        """
+        :py:func:`betareduce._core.run` passes a lazy handler and the
+        modules to prewarm, which imply it, from the command line.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement"] + argv,
+              _open=fake_open,
+              _create=fake_create)
+
+        assert (fake_create.kwargs['lazy_handler'],
+                fake_create.kwargs['prewarm']) == expected
+
+    def test_sync(self,
+                  make_fake_open_and_calls,
+                  fake_create_and_calls):
+        """
+        :py:func:`betareduce._core.run` syncs the staging directory
+        when asked to.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement",
+                     "-d", "staging", "--sync"],
+              _open=fake_open,
+              _create=fake_create)
+
+        assert fake_create.kwargs['sync'] is True
+
+    def test_sync_without_staging_directory(self,
+                                            make_fake_open_and_calls,
+                                            fake_create_and_calls,
+                                            capsys):
+        """
+        :py:func:`betareduce._core.run` refuses to sync without a
+        staging directory.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        with pytest.raises(SystemExit):
+            C.run(_argv=["outfile", "fqpn.callable", "requirement",
+                         "--sync"],
+                  _open=fake_open,
+                  _create=fake_create)
+
+        assert not create_calls
+        assert "--sync" in capsys.readouterr().err
+
+    @pytest.mark.parametrize("argv,expected", [
+        ([], None),
+        (["--compression", "smallest"], "smallest"),
+        (["-z", "fast"], "fast"),
+    ])
+    def test_compression(self,
+                         make_fake_open_and_calls,
+                         fake_create_and_calls,
+                         argv,
+                         expected):
+        """
+        :py:func:`betareduce._core.run` passes the compression preset
+        from the command line.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement"] + argv,
+              _open=fake_open,
+              _create=fake_create)
+
+        assert fake_create.kwargs['compression'] == expected
+
+    @pytest.mark.parametrize("argv,expected", [
+        ([], None),
+        (["--layout", "zipimport"], "zipimport"),
+    ])
+    def test_layout(self,
+                    make_fake_open_and_calls,
+                    fake_create_and_calls,
+                    argv,
+                    expected):
+        """
+        :py:func:`betareduce._core.run` passes the layout from the
+        command line.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement"] + argv,
+              _open=fake_open,
+              _create=fake_create)
+
+        assert fake_create.kwargs['layout'] == expected
+
+    @pytest.mark.parametrize("argv,expected", [
+        ([], None),
+        (["--dedup", "report"], "report"),
+        (["--dedup", "link"], "link"),
+    ])
+    def test_dedup(self,
+                   make_fake_open_and_calls,
+                   fake_create_and_calls,
+                   argv,
+                   expected):
+        """
+        :py:func:`betareduce._core.run` passes the deduplication mode
+        from the command line.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement"] + argv,
+              _open=fake_open,
+              _create=fake_create)
+
+        assert fake_create.kwargs['dedup'] == expected
+
+    def test_profile(self,
+                     make_fake_open_and_calls,
+                     fake_create_and_calls):
+        """
+        :py:func:`betareduce._core.run` profiles the build and writes
+        the profile as JSON with ``--profile``.
+        """
+        output = io.StringIO()
+        fake_open, open_calls = make_fake_open_and_calls(output)
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement",
+                     "--profile", "profile.json"],
+              _open=fake_open,
+              _create=fake_create)
+
+        assert isinstance(fake_create.kwargs['profile'], BuildProfile)
+        assert open_calls == [("outfile", "wb"), ("profile.json", "w")]
+        assert json.loads(output.getvalue())['files'] == 0
+
+    def test_profile_stderr(self,
+                            make_fake_open_and_calls,
+                            fake_create_and_calls):
+        """
+        ``--profile -`` writes the profile to standard error.
+        """
+        fake_open, open_calls = make_fake_open_and_calls(io.BytesIO())
+        fake_create, create_calls = fake_create_and_calls
+        stderr = io.StringIO()
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement",
+                     "--profile", "-"],
+              _open=fake_open,
+              _create=fake_create,
+              _stderr=stderr)
+
+        assert 'phases' in json.loads(stderr.getvalue())
+
+    @pytest.mark.parametrize("argv,expected", [
+        ([], None),
+        (["--target", "python3.11"], ((3, 11), "x86_64")),
+        (["-T", "python3.12-arm64"], ((3, 12), "arm64")),
+    ])
+    def test_target(self,
+                    make_fake_open_and_calls,
+                    fake_create_and_calls,
+                    argv,
+                    expected):
+        """
+        :py:func:`betareduce._core.run` passes the target runtime from
+        the command line.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement"] + argv,
+              _open=fake_open,
+              _create=fake_create)
+
+        target = fake_create.kwargs['target']
+        if expected is None:
+            assert target is None
+        else:
+            assert (target.python_version, target.architecture) == expected
+
+    def test_invalid_target(self, capsys):
+        """
+        :py:func:`betareduce._core.run` rejects an unknown runtime.
+        """
+        with pytest.raises(SystemExit):
+            C.run(_argv=["outfile", "fqpn.callable", "requirement",
+                         "--target", "python3.11-sparc"])
+        assert "architecture must be one of" in capsys.readouterr().err
+
+    @pytest.mark.parametrize("argv,expected", [
+        ([], None),
+        (["--layer", "layer.zip"], "layer.zip"),
+        (["-l", "layer.zip"], "layer.zip"),
+    ])
+    def test_layer(self,
+                   make_fake_open_and_calls,
+                   fake_create_and_calls,
+                   argv,
+                   expected):
+        """
+        :py:func:`betareduce._core.run` passes the layer's path from
+        the command line.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement"] + argv,
+              _open=fake_open,
+              _create=fake_create)
+
+        assert fake_create.kwargs['layer'] == expected
+
+    def test_max_size(self,
+                      make_fake_open_and_calls,
+                      fake_create_and_calls):
+        """
+        :py:func:`betareduce._core.run` passes size budgets from the
+        command line.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        fake_create, create_calls = fake_create_and_calls
+
+        C.run(_argv=["outfile", "fqpn.callable", "requirement",
+                     "--max-size", "250M", "--max-zipped-size", "50M"],
+              _open=fake_open,
+              _create=fake_create)
+
+        assert fake_create.kwargs['max_size'] == 250 * 1024 ** 2
+        assert fake_create.kwargs['max_compressed_size'] == 50 * 1024 ** 2
+
+    @pytest.mark.parametrize("outfile,removed", [
+        ("outfile", ["outfile"]),
+        ("-", []),
+    ])
+    def test_budget_exceeded(self,
+                             make_fake_open_and_calls,
+                             capsys,
+                             outfile,
+                             removed):
+        """
+        :py:func:`betareduce._core.run` removes the incomplete package
+        and exits with the breakdown when it exceeds its budget.
+        """
+        fake_open, open_calls = make_fake_open_and_calls("file")
+        remove_calls = []
+
+        class FakeStdout(object):
+            buffer = "stdout buffer"
+
+        def exceeding_create(*args, **kwargs):
+            raise SizeBudgetExceeded("too big:", [("numpy", 10, 5)])
+
+        with pytest.raises(SystemExit) as info:
+            C.run(_argv=[outfile, "fqpn.callable", "requirement",
+                         "--max-size", "1"],
+                  _open=fake_open,
+                  _create=exceeding_create,
+                  _remove=remove_calls.append,
+                  _stdout=FakeStdout())
+
+        assert info.value.code == 1
+        assert remove_calls == removed
+        err = capsys.readouterr().err
+        assert "too big:" in err
+        assert "numpy" in err
+
+
+class TestRunBatch(object):
+    """
+    Tests for :py:func:`betareduce._cli.run_batch`
+    """
+
+    @pytest.fixture
+    def fake_build_all_and_calls(self):
+        """
+        Returns a fake for :py:func:`betareduce._batch.build_all` and a
+        calls list for it.
+        """
+        calls = []
+
+        def fake_build_all(entries, **kwargs):
+            calls.append((entries, kwargs))
+            return []
+
+        return fake_build_all, calls
+
+    def fake_read_manifest(self, path):
+        return ['entries from ' + path]
+
+    def test_options(self, fake_build_all_and_calls):
+        """
+        :py:func:`betareduce._cli.run_batch` builds the packages in the
+        manifest with the options from the command line.
+        """
+        fake_build_all, calls = fake_build_all_and_calls
+
+        C.run_batch(_argv=["manifest.json", "-w", "4", "-j", "2",
+                           "--cache-dir", "cache", "-s", "safe",
+                           "--deterministic", "-a"],
+                    _build_all=fake_build_all,
+                    _read_manifest=self.fake_read_manifest)
+
+        [(entries, kwargs)] = calls
+        assert entries == ['entries from manifest.json']
+        assert kwargs['workers'] == 4
+        assert kwargs['jobs'] == 2
+        assert kwargs['cache_dir'] == 'cache'
+        assert kwargs['strip'] == ['safe']
+        assert kwargs['deterministic'] is True
+        assert kwargs['exclude_extension_modules'] is False
+
+    def test_invalid_manifest(self, fake_build_all_and_calls, capsys):
+        """
+        :py:func:`betareduce._cli.run_batch` reports manifests it
+        can't read.
+        """
+        fake_build_all, calls = fake_build_all_and_calls
+
+        def invalid_manifest(path):
+            raise ValueError("manifest must be a list of packages")
+
+        with pytest.raises(SystemExit) as info:
+            C.run_batch(_argv=["manifest.json"],
+                        _build_all=fake_build_all,
+                        _read_manifest=invalid_manifest)
+
+        assert info.value.code == 2
+        assert not calls
+        assert "must be a list" in capsys.readouterr().err
+
+    def test_budget_exceeded(self, capsys):
+        """
+        :py:func:`betareduce._cli.run_batch` exits with the breakdown
+        when a package exceeds its budget.
+        """
+        def exceeding_build_all(entries, **kwargs):
+            raise SizeBudgetExceeded("too big:", [("numpy", 10, 5)])
+
+        with pytest.raises(SystemExit) as info:
+            C.run_batch(_argv=["manifest.json", "--max-size", "1"],
+                        _build_all=exceeding_build_all,
+                        _read_manifest=self.fake_read_manifest)
+
+        assert info.value.code == 1
+        assert "numpy" in capsys.readouterr().err
+
+
+class TestRunAnalyze(object):
+    """
+    Tests for :py:func:`betareduce._cli.run_analyze`
+    """
+    costs = [ImportCost('six', 100, 100, 2),
+             ImportCost('handler', 50, 150, 1)]
+    rows = [DistributionCost('six', 100, 100, 1, 2048),
+            DistributionCost('handler', 150, 50, 1, 10)]
+
+    def fake_analyze(self, root, fqpn, interpreter):
+        self.calls.append((root, fqpn, interpreter))
+        return self.costs, self.rows
+
+    def setup_method(self):
+        self.calls = []
+
+    def test_report(self):
+        """
+        :py:func:`betareduce._cli.run_analyze` analyzes the handler's
+        module and writes a ranked report.
+        """
+        stdout = io.StringIO()
+        C.run_analyze(_argv=["staging", "handler.handler",
+                             "--interpreter", "python3.11", "-n", "1"],
+                      _analyze=self.fake_analyze,
+                      _stdout=stdout)
+        assert self.calls == [("staging", "handler.handler", "python3.11")]
+        lines = stdout.getvalue().splitlines()
+        assert lines[0] == 'importing handler took 0.1 ms'
+        assert lines[2].split()[0] == 'six'
+        assert len(lines) == 3
+
+    def test_json(self):
+        """
+        :py:func:`betareduce._cli.run_analyze` writes the report as
+        JSON with ``--json``.
+        """
+        stdout = io.StringIO()
+        C.run_analyze(_argv=["staging", "handler.handler", "--json"],
+                      _analyze=self.fake_analyze,
+                      _stdout=stdout)
+        report = json.loads(stdout.getvalue())
+        assert [row['name'] for row in report['distributions']] == [
+            'six', 'handler']
+
+    def test_import_fails(self, capsys):
+        """
+        :py:func:`betareduce._cli.run_analyze` exits with the
+        interpreter's output when the module can't be imported.
+        """
+        def failing_analyze(root, fqpn, interpreter):
+            raise subprocess.CalledProcessError(
+                1, ['python'], output=b'ModuleNotFoundError: handler')
+
+        with pytest.raises(SystemExit) as info:
+            C.run_analyze(_argv=["staging", "handler.handler"],
+                          _analyze=failing_analyze)
+        assert info.value.code == 1
+        assert 'ModuleNotFoundError' in capsys.readouterr().err
+
+    def test_invalid_fqpn(self, capsys):
+        """
+        :py:func:`betareduce._cli.run_analyze` rejects invalid FQPNs.
+        """
+        def invalid_analyze(root, fqpn, interpreter):
+            raise ValueError("Invalid FQPN")
+
+        with pytest.raises(SystemExit) as info:
+            C.run_analyze(_argv=["staging", "handler"],
+                          _analyze=invalid_analyze)
+        assert info.value.code == 2
+        assert 'Invalid FQPN' in capsys.readouterr().err
+
+    def test_subcommand(self):
+        """
+        :py:func:`betareduce._cli.run` hands ``betareduce analyze`` to
+        :py:func:`betareduce._cli.run_analyze`.
+        """
+        calls = []
+        C.run(_argv=["analyze", "staging", "handler.handler"],
+              _stdout="stdout",
+              _run_analyze=lambda argv, _stdout: calls.append(
+                  (argv, _stdout)))
+        assert calls == [(["staging", "handler.handler"], "stdout")]
+
+
+@pytest.mark.parametrize('value,size', [
+    ('100', 100),
+    ('2k', 2048),
+    ('3M', 3 * 1024 ** 2),
+    ('1G', 1024 ** 3),
+])
+def test_parse_size(value, size):
+    """
+    :py:func:`betareduce._cli.parse_size` parses byte counts with
+    optional suffixes.
+    """
+    assert C.parse_size(value) == size
+
+
+@pytest.mark.parametrize('value', ['', 'M', 'lots', '1T'])
+def test_parse_size_invalid(value):
+    """
+    :py:func:`betareduce._cli.parse_size` rejects malformed sizes.
+    """
+    with pytest.raises(argparse.ArgumentTypeError):
+        C.parse_size(value)
@@ -1,11 +1,20 @@
 from collections import namedtuple
 import contextlib
+import importlib.util
+import io
+import json
 from .. import _core as C
+from .. import _files, _filters
+from .._profile import BuildProfile
+from .._target import Target
 import os
+import py_compile
 import pytest
 import subprocess
+import sys
 import tokenize
 import re
+import zipfile
 
 _IS_IDENTIFIER = re.compile(tokenize.Name + '$')
 
@@ -24,6 +33,9 @@ class FakeLogger(object):
     def info(self, *args, **kwargs):
         self._recorded.setdefault('info', []).append(Call(args, kwargs))
 
+    def error(self, *args, **kwargs):
+        self._recorded.setdefault('error', []).append(Call(args, kwargs))
+
 
 @pytest.fixture
 def fake_logger():
@@ -55,8 +67,9 @@ class FakeZipFile(object):
     def __init__(self, recorder):
         self._recorder = recorder
 
-    def recording__init__(self, path, mode):
-        self._recorder.init_calls.append(Call(args=(path, mode), kwargs={}))
+    def recording__init__(self, path, mode, **kwargs):
+        self._recorder.init_calls.append(Call(args=(path, mode),
+                                              kwargs=kwargs))
         return self
 
     def write(self, filename, arcname):
@@ -68,6 +81,14 @@ class FakeZipFile(object):
                                                   kwargs={}))
 
 
+def fake_stream(zip_obj, filename, arcname):
+    """
+    A fake :py:func:`betareduce._zip.stream` that writes with
+    :py:meth:`FakeZipFile.write`.
+    """
+    zip_obj.write(filename, arcname)
+
+
 @pytest.fixture
 def fqpn():
     """
@@ -85,55 +106,21 @@ class TestLambdaPackage(object):
     def package(self, tmpdir, fqpn):
         return C.LambdaPackage(str(tmpdir), fqpn)
 
-    @pytest.fixture(params=C.LambdaPackage.BINARY_SUFFIXES)
-    def fake_os_walk(self, request):
+    @pytest.mark.parametrize('sort', [False, True])
+    def test_files(self, package, sort):
         """
-        Returns a 2-tuple, the first item of which is a
-        :py:func:`os.walk`, and the second of which is the paths of
-        the files as yielded by the fake walk.
-
-        The fake walks over the following directory structure.
-
-        ::
-
-            -- top
-            |-- extension1.[so, etc.]
-            |-- middle
-            |   |-- bottom
-            |   |   |-- extension3.[so, etc.]
-            |   |   `-- not_extension.py
-            |   |-- extension2.[so, etc.]
-            |   `-- not_extension.py
-            `-- not_extension.py
+        :py:meth:`betareduce._core.LambdaPackage.files` scans
+        ``self.root`` for records of its files.
         """
-        suffix = request.param
+        scan_calls = []
 
-        def fake_walk(path):
-            return [
-                ('top', ['middle'], ['extension1' + suffix,
-                                     'not_extension.py']),
-                ('top/middle', ['bottom'], ['extension2' + suffix,
-                                            'not_extension.py']),
-                ('top/middle/bottom', [], ['extension3' + suffix,
-                                           'not_extension.py']),
-            ]
+        def fake_scan(root, sort):
+            scan_calls.append(Call(args=(root,), kwargs={'sort': sort}))
+            return 'records'
 
-        paths = ['top/extension1' + suffix,
-                 'top/not_extension.py',
-                 'top/middle/not_extension.py',
-                 'top/middle/extension2' + suffix,
-                 'top/middle/bottom/not_extension.py',
-                 'top/middle/bottom/extension3' + suffix]
-
-        return fake_walk, paths
-
-    def test_files(self, package, fake_os_walk):
-        """
-        :py:meth:`betareduce._core.LambdaPackage.files` returns the
-        paths of all the files under ``self.root``.
-        """
-        fake_walk, files = fake_os_walk
-        assert sorted(package.files(_walk=fake_walk)) == sorted(files)
+        assert package.files(sort=sort, _scan=fake_scan) == 'records'
+        assert scan_calls == [Call(args=(package.root,),
+                                   kwargs={'sort': sort})]
 
     @pytest.mark.parametrize('path', [
         "foo",
@@ -217,6 +204,93 @@ class TestLambdaPackage(object):
                                       fake_check_output_calls,
                                       fake_logger_calls)
 
+    @pytest.mark.parametrize('kwargs,options', [
+        ({}, ['--invalidation-mode', 'checked-hash']),
+        ({'sourceless': True},
+         ['-b', '--invalidation-mode', 'checked-hash']),
+        ({'unchecked_hash': True},
+         ['--invalidation-mode', 'unchecked-hash']),
+        ({'sourceless': True, 'unchecked_hash': True},
+         ['-b', '--invalidation-mode', 'unchecked-hash']),
+    ])
+    @pytest.mark.parametrize('interpreter', [None, '/usr/bin/python3.12'])
+    def test_compile_bytecode(self,
+                              package,
+                              fake_check_output,
+                              fake_logger,
+                              kwargs,
+                              options,
+                              interpreter):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.compile_bytecode`
+        runs ``compileall`` over ``self.root`` with the requested
+        interpreter and options and logs the command and output.
+        """
+        (fake_check_output,
+         fake_check_output_calls,
+         output) = fake_check_output
+        fake_logger, fake_logger_calls = fake_logger
+
+        package.compile_bytecode(interpreter=interpreter,
+                                 _check_output=fake_check_output,
+                                 _logger=fake_logger,
+                                 **kwargs)
+
+        cmd = ([interpreter or sys.executable,
+                '-m', 'compileall', '-q', '-j', '0'] +
+               options + [package.root])
+        self.assert_check_output_call(cmd,
+                                      fake_check_output_calls,
+                                      fake_logger_calls)
+
+    def test_compile_bytecode_sourceless(self, package):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.compile_bytecode`
+        with ``sourceless`` writes importable bytecode beside each
+        module, which :py:meth:`not_compiled_source` then selects
+        instead of the source.
+        """
+        module = os.path.join(package.root, 'module.py')
+        cached = os.path.join(package.root, '__pycache__', 'module.pyc')
+        data = os.path.join(package.root, 'data.txt')
+        for path in module, data:
+            with open(path, 'w') as f:
+                f.write('x = 1\n')
+        os.mkdir(os.path.dirname(cached))
+        open(cached, 'w').close()
+
+        package.compile_bytecode(sourceless=True, unchecked_hash=True)
+
+        assert os.path.exists(module + 'c')
+        assert not package.not_compiled_source(module)
+        assert not package.not_compiled_source(cached)
+        assert package.not_compiled_source(module + 'c')
+        assert package.not_compiled_source(data)
+
+    def test_compile_bytecode_checked_hash(self, package):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.compile_bytecode`
+        writes bytecode validated against a hash of its source rather
+        than its modification time by default.
+        """
+        module = os.path.join(package.root, 'module.py')
+        with open(module, 'w') as f:
+            f.write('x = 1\n')
+
+        package.compile_bytecode()
+
+        with open(importlib.util.cache_from_source(module), 'rb') as f:
+            flags = int.from_bytes(f.read(8)[4:], 'little')
+        assert flags == 0b11
+
+    def test_not_compiled_source_uncompiled(self, package):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.not_compiled_source`
+        keeps sources without bytecode beside them.
+        """
+        assert package.not_compiled_source(
+            os.path.join(package.root, 'module.py'))
+
     FAKE_ROOT = "fakeroot"
 
     @pytest.mark.parametrize('input_path,output_path', [
@@ -272,6 +346,88 @@ class TestLambdaPackage(object):
         exec(source, exec_variables, exec_variables)
         assert exec_variables.get('isfile') is isfile
 
+    def test_generate_lazy_lambda_handler_module(self, package, tmpdir,
+                                                 monkeypatch, capsys):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.generate_lazy_lambda_handler_module`
+        generates Python source that imports the modules to prewarm
+        straight away, but the handler's module only when the handler
+        is first called, and reports how long each import took.
+        """
+        tmpdir.join('lazy_handler_module.py').write(
+            'def handle(event, context):\n'
+            '    return event, context\n')
+        monkeypatch.syspath_prepend(str(tmpdir))
+        monkeypatch.delitem(sys.modules, 'lazy_handler_module',
+                            raising=False)
+        source = package.generate_lazy_lambda_handler_module(
+            'lazy_handler_module', 'handle', prewarm=['json'])
+
+        exec_variables = {}
+        exec(source, exec_variables, exec_variables)
+        assert 'lazy_handler_module' not in sys.modules
+        [init] = capsys.readouterr().out.splitlines()
+        assert json.loads(init)['betareduce_imports'] == 'init'
+        assert [module['module']
+                for module in json.loads(init)['modules']] == ['json']
+
+        handle = exec_variables['handle']
+        assert handle('event', 'context') == ('event', 'context')
+        assert handle('again', 'context') == ('again', 'context')
+        [invoke] = capsys.readouterr().out.splitlines()
+        assert json.loads(invoke)['betareduce_imports'] == 'invoke'
+        assert [name for name, seconds, loaded
+                in exec_variables['BETAREDUCE_IMPORT_TIMES']] == [
+                    'json', 'lazy_handler_module']
+
+    @pytest.mark.parametrize('callable_name', [
+        '_handler', 'time', 'json', 'sys', 'importlib', '_import',
+        '_report', 'IMPORT_TIMES', '_name'])
+    def test_generate_lazy_lambda_handler_module_names(
+            self, package, tmpdir, monkeypatch, capsys, callable_name):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.generate_lazy_lambda_handler_module`
+        generates a module whose own names don't collide with the
+        handler's.
+        """
+        tmpdir.join('colliding_handler_module.py').write(
+            'def %s(event, context):\n'
+            '    return event, context\n' % (callable_name,))
+        monkeypatch.syspath_prepend(str(tmpdir))
+        monkeypatch.delitem(sys.modules, 'colliding_handler_module',
+                            raising=False)
+        source = package.generate_lazy_lambda_handler_module(
+            'colliding_handler_module', callable_name, prewarm=['json'])
+
+        exec_variables = {}
+        exec(source, exec_variables, exec_variables)
+        handler = exec_variables[callable_name]
+        assert handler('event', 'context') == ('event', 'context')
+        assert handler('again', 'context') == ('again', 'context')
+
+    def test_generate_lazy_lambda_handler_module_reserved(self, package):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.generate_lazy_lambda_handler_module`
+        rejects handlers named for the module's own names.
+        """
+        with pytest.raises(ValueError):
+            package.generate_lazy_lambda_handler_module(
+                'module', '_betareduce_handlers')
+
+    def test_to_zipfile_lazy_handler(self, package):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.to_zipfile` writes a
+        lazy handler module when asked to.
+        """
+        fileobj = io.BytesIO()
+        package.to_zipfile(fileobj, lazy_handler=True,
+                           prewarm=('boto3',)).close()
+
+        with zipfile.ZipFile(fileobj) as zip_obj:
+            source = zip_obj.read('lambda_entry.py').decode('utf-8')
+        assert source == package.generate_lazy_lambda_handler_module(
+            *package.split_fqpn(package.fqpn), prewarm=('boto3',))
+
     @pytest.fixture
     def fake_zipfile_and_recorder(self):
         """
@@ -281,14 +437,18 @@ class TestLambdaPackage(object):
         return FakeZipFile(recorder), recorder
 
     @pytest.fixture
-    def make_fake_files(self):
+    def make_fake_files(self, package):
         """
         Create a fake implementation of
-        :py:class:`betareduce._core.LambdaPackage.files`
+        :py:class:`betareduce._core.LambdaPackage.files` that returns
+        records of the given paths.
         """
         def make_fake_files(returns):
-            def files():
-                return returns
+            def files(sort=False):
+                return [_files.FileRecord(path,
+                                          os.path.relpath(path, package.root),
+                                          None)
+                        for path in returns]
             return files
         return make_fake_files
 
@@ -319,7 +479,8 @@ class TestLambdaPackage(object):
 
         fileobj = 'a file obj'
         returned_zf = package.to_zipfile(
-            fileobj, _ZipFile=fake_zip_file.recording__init__)
+            fileobj, _ZipFile=fake_zip_file.recording__init__,
+            _stream=fake_stream)
 
         assert returned_zf is fake_zip_file, (
             "to_zipfile does not return the ZipFile instance")
@@ -367,7 +528,8 @@ class TestLambdaPackage(object):
 
         package.to_zipfile('a file obj',
                            filter=non_baz,
-                           _ZipFile=fake_zip_file.recording__init__)
+                           _ZipFile=fake_zip_file.recording__init__,
+                           _stream=fake_stream)
 
         assert recorder.write_calls == expected
 
@@ -381,6 +543,333 @@ class TestLambdaPackage(object):
         assert source == 'from package.module import callable\n'
 
 
+    def test_to_zipfile_previous(self,
+                                 package,
+                                 make_fake_files,
+                                 fake_zipfile_and_recorder):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.to_zipfile` compresses
+        files through an incremental build when given one.
+        """
+        fake_zip_file, recorder = fake_zipfile_and_recorder
+
+        package.files = make_fake_files([
+            os.path.join(package.root, 'foo.txt'),
+        ])
+        write_members_calls = []
+
+        class FakeIncrementalBuild(object):
+            def compress(self):
+                pass
+
+            def stream(self):
+                pass
+
+        def fake_write_members(zip_obj, members, jobs, **kwargs):
+            write_members_calls.append(Call(args=(zip_obj, list(members),
+                                                  jobs),
+                                            kwargs=kwargs))
+
+        build = FakeIncrementalBuild()
+        package.to_zipfile('a file obj',
+                           previous=build,
+                           _ZipFile=fake_zip_file.recording__init__,
+                           _write_members=fake_write_members)
+
+        assert write_members_calls == [
+            Call(args=(fake_zip_file,
+                       [(os.path.join(package.root, 'foo.txt'), 'foo.txt')],
+                       1),
+                 kwargs={'_compress': build.compress,
+                         '_stream': build.stream}),
+        ]
+
+    def test_to_zipfile_compressor(self, package):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.to_zipfile` compresses
+        files through ``compressor``, and an incremental build falls
+        back to it for files that changed.
+        """
+        class FakeCompressor(object):
+            def compress(self):
+                pass
+
+            def stream(self):
+                pass
+
+        write_members_calls = []
+
+        def fake_write_members(zip_obj, members, jobs, **kwargs):
+            write_members_calls.append(kwargs)
+
+        compressor, build = FakeCompressor(), FakeCompressor()
+        package.to_zipfile(io.BytesIO(), compressor=compressor,
+                           _write_members=fake_write_members).close()
+        package.to_zipfile(io.BytesIO(), previous=build,
+                           compressor=compressor,
+                           _write_members=fake_write_members).close()
+
+        alone, both = write_members_calls
+        assert alone == {'_compress': compressor.compress,
+                         '_stream': compressor.stream}
+        assert both['_compress'].func == build.compress
+        assert both['_compress'].keywords == {
+            '_compress': compressor.compress}
+        assert both['_stream'].func == build.stream
+        assert both['_stream'].keywords == {'_stream': compressor.stream}
+
+    def test_to_zipfile_budget(self, package):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.to_zipfile` charges
+        every member, including the handler module, to ``budget``.
+        """
+        with open(os.path.join(package.root, 'foo.txt'), 'w') as f:
+            f.write('foo')
+        added = []
+
+        class FakeBudget(object):
+            def add(self, zinfo):
+                added.append(zinfo.filename)
+
+        zip_obj = package.to_zipfile(io.BytesIO(), budget=FakeBudget())
+        zip_obj.close()
+
+        assert added == ['foo.txt', 'lambda_entry.py']
+
+    def test_to_zipfile_date_time(self, package):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.to_zipfile` writes
+        members in sorted order with the timestamp ``date_time`` and
+        normalized permissions, so that the archive doesn't depend on
+        when or how the files were installed.
+        """
+        for name in ['b.txt', 'a.txt', 'run.sh']:
+            with open(os.path.join(package.root, name), 'w') as f:
+                f.write(name)
+        os.chmod(os.path.join(package.root, 'run.sh'), 0o755)
+        date_time = (2020, 2, 2, 12, 0, 0)
+
+        def build():
+            fileobj = io.BytesIO()
+            package.to_zipfile(fileobj, date_time=date_time).close()
+            return fileobj.getvalue()
+
+        first = build()
+        os.chmod(os.path.join(package.root, 'a.txt'), 0o600)
+        os.chmod(os.path.join(package.root, 'run.sh'), 0o700)
+        for name in ['a.txt', 'b.txt', 'run.sh']:
+            os.utime(os.path.join(package.root, name), (0, 1000000000))
+
+        assert build() == first
+        with zipfile.ZipFile(io.BytesIO(first)) as zip_obj:
+            infos = zip_obj.infolist()
+        assert [info.filename for info in infos] == [
+            'a.txt', 'b.txt', 'run.sh', 'lambda_entry.py']
+        assert set(info.date_time for info in infos) == {date_time}
+        assert [info.external_attr >> 16 for info in infos] == [
+            0o100444, 0o100444, 0o100555, 0o444]
+
+    def test_to_zipfile_prefix(self, package):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.to_zipfile` prefixes
+        member names, and can leave out the handler module, charging
+        the budget by the members' paths in the staging directory.
+        """
+        with open(os.path.join(package.root, 'foo.txt'), 'w') as f:
+            f.write('foo')
+        added = []
+
+        class FakeBudget(object):
+            def add(self, zinfo, arcname):
+                added.append((zinfo.filename, arcname))
+
+        fileobj = io.BytesIO()
+        package.to_zipfile(fileobj, budget=FakeBudget(), prefix='python/',
+                           entry=False).close()
+
+        with zipfile.ZipFile(fileobj) as zip_obj:
+            assert zip_obj.namelist() == ['python/foo.txt']
+        assert added == [('python/foo.txt', 'foo.txt')]
+
+    @pytest.mark.parametrize('jobs', [1, 2])
+    def test_to_zipfile_profile(self, package, jobs):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.to_zipfile` records
+        its phases and members in a profile without changing the
+        archive.
+        """
+        for name in ['a.txt', 'b.py']:
+            with open(os.path.join(package.root, name), 'w') as f:
+                f.write(name * 100)
+        profile = BuildProfile()
+
+        def build(**kwargs):
+            fileobj = io.BytesIO()
+            package.to_zipfile(fileobj, filter=lambda path: True,
+                               jobs=jobs, date_time=(2020, 1, 1, 0, 0, 0),
+                               **kwargs).close()
+            return fileobj.getvalue()
+
+        assert build(profile=profile) == build()
+        assert sorted(member.arcname for member in profile.members) == [
+            'a.txt', 'b.py']
+        assert set(profile.phases) == {'enumerate', 'filter', 'compress',
+                                       'handler'}
+
+    def test_to_zipfile_compression(self, package):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.to_zipfile` compresses
+        members as asked, except those already compressed.
+        """
+        for name in ['module.py', 'logo.png']:
+            with open(os.path.join(package.root, name), 'wb') as f:
+                f.write(b'compressible ' * 1000)
+
+        fileobj = io.BytesIO()
+        package.to_zipfile(fileobj, compression=zipfile.ZIP_DEFLATED,
+                           compresslevel=9, entry=False).close()
+
+        with zipfile.ZipFile(fileobj) as zip_obj:
+            assert zip_obj.testzip() is None
+            methods = {zinfo.filename: zinfo.compress_type
+                       for zinfo in zip_obj.infolist()}
+        assert methods == {'module.py': zipfile.ZIP_DEFLATED,
+                           'logo.png': zipfile.ZIP_STORED}
+
+    def test_to_zipfile_zipimport_layout(self, package, tmpdir_factory,
+                                         monkeypatch):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.to_zipfile` writes
+        the ``zipimport`` layout package by package, with bytecode
+        stored, and the result can be imported from directly.
+        """
+        sources = {'zpkg/__init__.py': 'from . import mod\n',
+                   'zpkg/mod.py': 'VALUE = 42\n',
+                   'zpkg/data.txt': 'compressible ' * 100,
+                   'alone.py': ''}
+        for arcname, source in sources.items():
+            path = os.path.join(package.root, *arcname.split('/'))
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(source)
+        py_compile.compile(os.path.join(package.root, 'zpkg', 'mod.py'),
+                           os.path.join(package.root, 'zpkg', 'mod.pyc'),
+                           doraise=True)
+
+        path = str(tmpdir_factory.mktemp('zips').join('package.zip'))
+        with open(path, 'wb') as fileobj:
+            package.to_zipfile(fileobj, compression=zipfile.ZIP_DEFLATED,
+                               layout='zipimport').close()
+
+        with zipfile.ZipFile(path) as zip_obj:
+            assert [(zinfo.filename, zinfo.compress_type)
+                    for zinfo in zip_obj.infolist()] == [
+                ('alone.py', zipfile.ZIP_DEFLATED),
+                ('lambda_entry.py', zipfile.ZIP_STORED),
+                ('zpkg/__init__.py', zipfile.ZIP_DEFLATED),
+                ('zpkg/data.txt', zipfile.ZIP_DEFLATED),
+                ('zpkg/mod.pyc', zipfile.ZIP_STORED),
+                ('zpkg/mod.py', zipfile.ZIP_DEFLATED)]
+            # the handler module is written last, but listed in order.
+            offsets = [zinfo.header_offset for zinfo in zip_obj.infolist()
+                       if zinfo.filename != 'lambda_entry.py']
+            assert offsets == sorted(offsets)
+
+        monkeypatch.syspath_prepend(path)
+        monkeypatch.delitem(sys.modules, 'zpkg', raising=False)
+        monkeypatch.delitem(sys.modules, 'zpkg.mod', raising=False)
+        zpkg = importlib.import_module('zpkg')
+        assert zpkg.mod.VALUE == 42
+        assert zpkg.mod.__file__.endswith('mod.pyc')
+
+    def test_to_zipfile_failure_closes(self, package):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.to_zipfile` closes
+        the zip file if writing fails.
+        """
+        with open(os.path.join(package.root, 'foo.txt'), 'w') as f:
+            f.write('foo')
+        zip_objs = []
+
+        def recording_zipfile(*args, **kwargs):
+            zip_objs.append(zipfile.ZipFile(*args, **kwargs))
+            return zip_objs[-1]
+
+        class ExhaustedBudget(object):
+            def add(self, zinfo):
+                raise SomeException()
+
+        with pytest.raises(SomeException):
+            package.to_zipfile(io.BytesIO(), budget=ExhaustedBudget(),
+                               _ZipFile=recording_zipfile)
+
+        [zip_obj] = zip_objs
+        assert zip_obj.fp is None
+
+    def test_to_zipfile_jobs(self,
+                             package,
+                             make_fake_files,
+                             fake_zipfile_and_recorder):
+        """
+        :py:meth:`betareduce._core.LambdaPackage.to_zipfile` hands the
+        filtered files to a concurrent writer when ``jobs`` is greater
+        than one.
+        """
+        fake_zip_file, recorder = fake_zipfile_and_recorder
+
+        package.files = make_fake_files([
+            os.path.join(package.root, 'foo.txt'),
+            os.path.join(package.root, 'bar', 'baz.txt'),
+        ])
+        write_members_calls = []
+
+        def fake_write_members(zip_obj, members, jobs):
+            write_members_calls.append(Call(args=(zip_obj, list(members),
+                                                  jobs),
+                                            kwargs={}))
+
+        package.to_zipfile('a file obj',
+                           filter=lambda path: not path.endswith('baz.txt'),
+                           jobs=4,
+                           _ZipFile=fake_zip_file.recording__init__,
+                           _write_members=fake_write_members)
+
+        assert write_members_calls == [
+            Call(args=(fake_zip_file,
+                       [(os.path.join(package.root, 'foo.txt'), 'foo.txt')],
+                       4),
+                 kwargs={}),
+        ]
+        assert not recorder.write_calls
+        assert len(recorder.writestr_calls) == 1
+
+
+@pytest.mark.parametrize('paths,included', [
+    (['a'], True),
+    (['b'], False),
+    (['a', 'b'], False),
+    (['a', 'a'], True),
+])
+def test_all_of(paths, included):
+    """
+    :py:func:`betareduce._core.all_of` includes a path only if all of
+    its filters do.
+    """
+    filters = [lambda path, expected=expected: path == expected
+               for expected in paths]
+    assert C.all_of(*filters)('a') is included
+
+
+def test_all_of_single():
+    """
+    :py:func:`betareduce._core.all_of` returns a sole filter as-is.
+    """
+    def only(path):
+        return True
+    assert C.all_of(only) is only
+
+
 class SomeException(Exception):
     """
     An exception to be raised within a context manager.  It's only
@@ -490,6 +979,7 @@ class RecordsFakeLambdaPackage(object):
     def __init__(self, to_zipfile_returns):
         self.init_calls = []
         self.install_calls = []
+        self.compile_bytecode_calls = []
         self.to_zipfile_calls = []
         self.to_zipfile_returns = to_zipfile_returns
 
@@ -501,17 +991,30 @@ class FakeLambdaPackage(object):
 
     not_extension_module = 'not_extension_module'
 
+    @staticmethod
+    def not_compiled_source(path):
+        return not path.endswith('.py')
+
     def __init__(self, recorder):
         self._recorder = recorder
 
     def recording__init__(self, root, fqpn):
         self._recorder.init_calls.append(Call(args=(root, fqpn), kwargs={}))
+        self.root = root
+        self.fqpn = fqpn
         return self
 
     def install(self, pip_args):
         self._recorder.install_calls.append(Call(args=(pip_args,),
                                                  kwargs={}))
 
+    def split_fqpn(self, fqpn):
+        return C.LambdaPackage.split_fqpn(self, fqpn)
+
+    def compile_bytecode(self, **kwargs):
+        self._recorder.compile_bytecode_calls.append(Call(args=(),
+                                                          kwargs=kwargs))
+
     def to_zipfile(self, fileobj, **kwargs):
         self._recorder.to_zipfile_calls.append(Call(args=(fileobj,),
                                                     kwargs=kwargs))
@@ -676,3 +1179,756 @@ class TestCreate(object):
 
         assert package_recorder.to_zipfile_calls == [
             Call(args=("fileobj",), kwargs={})]
+
+    @pytest.fixture
+    def make_fake_install_cache_and_calls(self):
+        """
+        Return a maker for a fake
+        :py:class:`betareduce._cache.InstallCache` and a calls list
+        for it.
+        """
+        def make_fake_install_cache(hit):
+            calls = []
+
+            class FakeInstallCache(object):
+
+                def __init__(self, directory, max_size):
+                    calls.append(Call(args=(directory,),
+                                      kwargs={'max_size': max_size}))
+
+                def key(self, pip_args):
+                    calls.append(Call(args=('key', pip_args), kwargs={}))
+                    return 'key'
+
+                def restore(self, key, root):
+                    calls.append(Call(args=('restore', key, root),
+                                      kwargs={}))
+                    return hit
+
+                def store(self, key, root):
+                    calls.append(Call(args=('store', key, root), kwargs={}))
+
+            return FakeInstallCache, calls
+        return make_fake_install_cache
+
+    @pytest.mark.parametrize('hit', [True, False])
+    def test_cache_dir(self,
+                       make_fake_automatic_tempdir_and_calls,
+                       fake_passthrough_and_calls,
+                       make_fake_lambda_package_and_recorder,
+                       make_fake_install_cache_and_calls,
+                       fqpn,
+                       hit):
+        """
+        :py:func:`betareduce._core.create` restores the staging tree
+        from the install cache when it can, and otherwise installs
+        and stores the result.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+        fake_cache, cache_calls = make_fake_install_cache_and_calls(hit)
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            cache_dir="cache", cache_max_size=10,
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__,
+            _InstallCache=fake_cache)
+
+        expected = [
+            Call(args=("cache",), kwargs={'max_size': 10}),
+            Call(args=('key', ["pip", "args"]), kwargs={}),
+            Call(args=('restore', 'key', 'temp'), kwargs={}),
+        ]
+        if hit:
+            assert not package_recorder.install_calls
+        else:
+            expected.append(Call(args=('store', 'key', 'temp'), kwargs={}))
+            assert package_recorder.install_calls == [
+                Call(args=(["pip", "args"],), kwargs={})]
+        assert cache_calls == expected
+
+    def test_jobs(self,
+                  make_fake_automatic_tempdir_and_calls,
+                  fake_passthrough_and_calls,
+                  make_fake_lambda_package_and_recorder,
+                  fqpn):
+        """
+        :py:func:`betareduce._core.create` passes ``jobs`` through to
+        :py:meth:`betareduce._core.LambdaPackage.to_zipfile`.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            exclude_extension_modules=False,
+            jobs=3,
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__)
+
+        assert package_recorder.to_zipfile_calls == [
+            Call(args=("fileobj",), kwargs={"jobs": 3})]
+
+    def test_previous(self,
+                      make_fake_automatic_tempdir_and_calls,
+                      fake_passthrough_and_calls,
+                      make_fake_lambda_package_and_recorder,
+                      fqpn):
+        """
+        :py:func:`betareduce._core.create` builds incrementally from a
+        previous package and saves the new manifest.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+        builds = []
+
+        class FakeIncrementalBuild(object):
+
+            def __init__(self, previous):
+                self.previous = previous
+                self.saved = False
+                builds.append(self)
+
+            def save(self):
+                self.saved = True
+
+        returned = C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            exclude_extension_modules=False,
+            previous="old.zip",
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__,
+            _IncrementalBuild=FakeIncrementalBuild)
+
+        assert returned == "zipfileobj"
+        [build] = builds
+        assert build.previous == "old.zip"
+        assert build.saved
+        assert package_recorder.to_zipfile_calls == [
+            Call(args=("fileobj",), kwargs={"previous": build})]
+
+    @pytest.mark.parametrize('mode', ['both', 'sourceless'])
+    def test_compile_bytecode(self,
+                              make_fake_automatic_tempdir_and_calls,
+                              fake_passthrough_and_calls,
+                              make_fake_lambda_package_and_recorder,
+                              fqpn,
+                              mode):
+        """
+        :py:func:`betareduce._core.create` compiles bytecode after
+        installing and, in sourceless mode, filters out compiled
+        sources as well as extension modules.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+        package.not_extension_module = lambda path: not path.endswith('.so')
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            compile_bytecode=mode,
+            bytecode_interpreter="python3.12",
+            unchecked_hash=True,
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__)
+
+        assert package_recorder.compile_bytecode_calls == [
+            Call(args=(),
+                 kwargs={'interpreter': 'python3.12',
+                         'sourceless': mode == 'sourceless',
+                         'unchecked_hash': True})]
+        [(_, kwargs)] = package_recorder.to_zipfile_calls
+        include = kwargs['filter']
+        assert not include('x.so')
+        assert include('x.pyc')
+        assert include('x.py') is (mode == 'both')
+
+    def test_no_compile_bytecode(self,
+                                 make_fake_automatic_tempdir_and_calls,
+                                 fake_passthrough_and_calls,
+                                 make_fake_lambda_package_and_recorder,
+                                 fqpn):
+        """
+        :py:func:`betareduce._core.create` doesn't compile bytecode by
+        default.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__)
+
+        assert not package_recorder.compile_bytecode_calls
+
+    def test_invalid_compile_bytecode(self, fqpn):
+        """
+        :py:func:`betareduce._core.create` rejects unknown bytecode
+        modes.
+        """
+        with pytest.raises(ValueError):
+            C.create("fileobj", ["pip", "args"], fqpn,
+                     compile_bytecode="sometimes")
+
+    def test_compile_bytecode_for_target(self, fqpn):
+        """
+        :py:func:`betareduce._core.create` rejects compiling bytecode
+        for a target runtime of another Python version with this
+        interpreter.
+        """
+        other = (3, 11) if sys.version_info[:2] != (3, 11) else (3, 12)
+        with pytest.raises(ValueError):
+            C.create("fileobj", ["pip", "args"], fqpn,
+                     compile_bytecode="sourceless", target=Target(other))
+
+    @pytest.mark.parametrize('compile_bytecode,target,interpreter', [
+        (None, Target((3, 12)), None),
+        ('both', None, None),
+        ('both', Target((3, 11)), None),
+        ('both', Target((3, 12)), 'python3.12'),
+    ])
+    def test_check_compile_bytecode(self, compile_bytecode, target,
+                                    interpreter):
+        """
+        :py:func:`betareduce._core.check_compile_bytecode` accepts
+        bytecode compiled by an interpreter for the target's Python.
+        """
+        C.check_compile_bytecode(compile_bytecode, target=target,
+                                 bytecode_interpreter=interpreter,
+                                 _version_info=(3, 11, 4))
+
+    def test_tree_shake(self,
+                        make_fake_automatic_tempdir_and_calls,
+                        fake_passthrough_and_calls,
+                        make_fake_lambda_package_and_recorder,
+                        fqpn):
+        """
+        :py:func:`betareduce._core.create` filters through a tree
+        shaker rooted at the handler's module, and reports what it
+        dropped.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+        shakers = []
+
+        class FakeTreeShaker(object):
+
+            def __init__(self, root, entry, keep):
+                self.args = (root, entry, keep)
+                self.reported = False
+                shakers.append(self)
+
+            def __call__(self, path):
+                return path != 'unreachable.py'
+
+            def report(self):
+                self.reported = True
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            exclude_extension_modules=False,
+            tree_shake=True,
+            keep_modules=['plugins.*'],
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__,
+            _TreeShaker=FakeTreeShaker)
+
+        [shaker] = shakers
+        assert shaker.args == ("temp", "package.module", ['plugins.*'])
+        assert shaker.reported
+        assert package_recorder.to_zipfile_calls == [
+            Call(args=("fileobj",), kwargs={"filter": shaker})]
+
+    def test_strip(self,
+                   make_fake_automatic_tempdir_and_calls,
+                   fake_passthrough_and_calls,
+                   make_fake_lambda_package_and_recorder,
+                   fqpn):
+        """
+        :py:func:`betareduce._core.create` filters through a strip
+        filter with the rules named by ``strip``, and reports what it
+        saved.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+        strippers = []
+
+        class FakeStripFilter(object):
+
+            def __init__(self, root, rules):
+                self.args = (root, rules)
+                self.reported = False
+                strippers.append(self)
+
+            def report(self):
+                self.reported = True
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            exclude_extension_modules=False,
+            strip=['tests', 'stubs'],
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__,
+            _StripFilter=FakeStripFilter)
+
+        [stripper] = strippers
+        assert stripper.args == (
+            "temp", [_filters.RULES['tests'], _filters.RULES['stubs']])
+        assert stripper.reported
+        assert package_recorder.to_zipfile_calls == [
+            Call(args=("fileobj",), kwargs={"filter": stripper})]
+
+    def test_strip_keeps_compiled_bytecode(
+            self,
+            make_fake_automatic_tempdir_and_calls,
+            fake_passthrough_and_calls,
+            make_fake_lambda_package_and_recorder,
+            fqpn):
+        """
+        :py:func:`betareduce._core.create` doesn't strip the
+        ``__pycache__`` directories it compiled bytecode into.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+        strippers = []
+
+        class FakeStripFilter(object):
+
+            def __init__(self, root, rules):
+                self.rules = rules
+                strippers.append(self)
+
+            def report(self):
+                pass
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            exclude_extension_modules=False,
+            compile_bytecode='both',
+            strip=['safe'],
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__,
+            _StripFilter=FakeStripFilter)
+
+        [stripper] = strippers
+        assert _filters.RULES['docs'] in stripper.rules
+        assert _filters.RULES['pycache'] not in stripper.rules
+
+    def test_strip_unknown(self, fqpn):
+        """
+        :py:func:`betareduce._core.create` rejects unknown strip
+        profiles and rules before installing anything.
+        """
+        with pytest.raises(ValueError):
+            C.create("fileobj", ["pip", "args"], fqpn,
+                     strip=['everything'])
+
+    @pytest.mark.parametrize('kwargs', [
+        {'max_size': 10},
+        {'max_compressed_size': 20},
+        {'max_size': 10, 'max_compressed_size': 20},
+    ])
+    def test_budget(self,
+                    make_fake_automatic_tempdir_and_calls,
+                    fake_passthrough_and_calls,
+                    make_fake_lambda_package_and_recorder,
+                    fqpn,
+                    kwargs):
+        """
+        :py:func:`betareduce._core.create` charges the package to a
+        size budget when given a limit, and reports it.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+        budgets = []
+
+        class FakeSizeBudget(object):
+
+            def __init__(self, root, max_size, max_compressed_size):
+                self.args = (root, max_size, max_compressed_size)
+                self.reported = False
+                budgets.append(self)
+
+            def report(self):
+                self.reported = True
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            exclude_extension_modules=False,
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__,
+            _SizeBudget=FakeSizeBudget,
+            **kwargs)
+
+        [budget] = budgets
+        assert budget.args == ("temp", kwargs.get('max_size'),
+                               kwargs.get('max_compressed_size'))
+        assert budget.reported
+        assert package_recorder.to_zipfile_calls == [
+            Call(args=("fileobj",), kwargs={"budget": budget})]
+
+    def test_deterministic(self,
+                           make_fake_automatic_tempdir_and_calls,
+                           fake_passthrough_and_calls,
+                           make_fake_lambda_package_and_recorder,
+                           fqpn):
+        """
+        :py:func:`betareduce._core.create` passes the
+        ``SOURCE_DATE_EPOCH`` timestamp to
+        :py:meth:`betareduce._core.LambdaPackage.to_zipfile` when
+        building deterministically.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            exclude_extension_modules=False,
+            deterministic=True,
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__,
+            _source_date_time=lambda: (2020, 1, 1, 0, 0, 0))
+
+        assert package_recorder.to_zipfile_calls == [
+            Call(args=("fileobj",),
+                 kwargs={"date_time": (2020, 1, 1, 0, 0, 0)})]
+
+    def test_wheelhouse(self,
+                        make_fake_automatic_tempdir_and_calls,
+                        fake_passthrough_and_calls,
+                        make_fake_lambda_package_and_recorder,
+                        fqpn):
+        """
+        :py:func:`betareduce._core.create` installs from a wheelhouse
+        instead of with ``pip install`` when given one.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+        wheelhouse_calls = []
+
+        class FakeWheelhouse(object):
+
+            def __init__(self, directory, download):
+                wheelhouse_calls.append(Call(args=(directory,),
+                                             kwargs={'download': download}))
+
+            def install(self, pip_args, root):
+                wheelhouse_calls.append(Call(args=('install', pip_args),
+                                             kwargs={'root': root}))
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            exclude_extension_modules=False,
+            wheelhouse="wheels",
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__,
+            _Wheelhouse=FakeWheelhouse)
+
+        assert wheelhouse_calls == [
+            Call(args=("wheels",), kwargs={"download": False}),
+            Call(args=("install", ["pip", "args"]), kwargs={"root": "temp"}),
+        ]
+        assert package_recorder.install_calls == []
+
+    def test_sync(self,
+                  fake_passthrough_and_calls,
+                  make_fake_lambda_package_and_recorder,
+                  fqpn):
+        """
+        :py:func:`betareduce._core.create` syncs an existing staging
+        directory instead of installing into it when asked to.
+        """
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+        sync_calls = []
+        target = Target((3, 11))
+
+        class FakeStagingSync(object):
+
+            def __init__(self, root, target):
+                sync_calls.append(Call(args=(root,),
+                                       kwargs={'target': target}))
+
+            def sync(self, pip_args):
+                sync_calls.append(Call(args=('sync', pip_args), kwargs={}))
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn, root="staging",
+            exclude_extension_modules=False,
+            sync=True, target=target,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__,
+            _StagingSync=FakeStagingSync)
+
+        assert sync_calls == [
+            Call(args=("staging",), kwargs={"target": target}),
+            Call(args=("sync", target.pip_args() + ["pip", "args"]),
+                 kwargs={}),
+        ]
+        assert package_recorder.install_calls == []
+
+    @pytest.mark.parametrize("kwargs", [
+        {},
+        {"root": "staging", "cache_dir": "cache"},
+        {"root": "staging", "wheelhouse": "wheels"},
+    ])
+    def test_sync_invalid(self, fqpn, kwargs):
+        """
+        :py:func:`betareduce._core.create` refuses to sync without a
+        staging directory, or along with a cache or wheelhouse.
+        """
+        with pytest.raises(ValueError):
+            C.create("fileobj", ["pip", "args"], fqpn, sync=True,
+                     _automatic_tempdir=None, _passthrough=None, **kwargs)
+
+    @pytest.mark.parametrize("kwargs", [
+        {"prewarm": ["boto3"]},
+        {"lazy_handler": True, "prewarm": ["not a module"]},
+    ])
+    def test_invalid_prewarm(self, fqpn, kwargs):
+        """
+        :py:func:`betareduce._core.create` refuses to prewarm without
+        a lazy handler, or anything but modules.
+        """
+        with pytest.raises(ValueError):
+            C.create("fileobj", ["pip", "args"], fqpn,
+                     _automatic_tempdir=None, **kwargs)
+
+    def test_lazy_handler(self,
+                          make_fake_automatic_tempdir_and_calls,
+                          fake_passthrough_and_calls,
+                          make_fake_lambda_package_and_recorder,
+                          fqpn):
+        """
+        :py:func:`betareduce._core.create` passes a lazy handler and
+        the modules to prewarm to
+        :py:meth:`betareduce._core.LambdaPackage.to_zipfile`.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            exclude_extension_modules=False,
+            lazy_handler=True, prewarm=["boto3", "pkg.sub"],
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__)
+
+        assert package_recorder.to_zipfile_calls == [
+            Call(args=("fileobj",),
+                 kwargs={"lazy_handler": True,
+                         "prewarm": ("boto3", "pkg.sub")})]
+
+    def test_profile(self,
+                     make_fake_automatic_tempdir_and_calls,
+                     fake_passthrough_and_calls,
+                     make_fake_lambda_package_and_recorder,
+                     fqpn):
+        """
+        :py:func:`betareduce._core.create` times the phases of the
+        build in a profile and passes it on to
+        :py:meth:`betareduce._core.LambdaPackage.to_zipfile`.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+        profile = BuildProfile()
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            exclude_extension_modules=False,
+            compile_bytecode="both",
+            profile=profile,
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__)
+
+        assert list(profile.phases) == ["tempdir", "install", "compile",
+                                        "cleanup"]
+        assert package_recorder.to_zipfile_calls == [
+            Call(args=("fileobj",), kwargs={"profile": profile})]
+
+    def test_compression(self,
+                         make_fake_automatic_tempdir_and_calls,
+                         fake_passthrough_and_calls,
+                         make_fake_lambda_package_and_recorder,
+                         fqpn):
+        """
+        :py:func:`betareduce._core.create` compresses the package with
+        the preset named.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            exclude_extension_modules=False,
+            compression="fast",
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__)
+
+        assert package_recorder.to_zipfile_calls == [
+            Call(args=("fileobj",),
+                 kwargs={"compression": zipfile.ZIP_DEFLATED,
+                         "compresslevel": 1})]
+
+    def test_unknown_compression(self, fqpn):
+        """
+        :py:func:`betareduce._core.create` rejects an unknown
+        compression preset before installing anything.
+        """
+        with pytest.raises(ValueError):
+            C.create("fileobj", ["pip", "args"], fqpn, compression="tiny",
+                     _automatic_tempdir=None)
+
+    def test_layout(self,
+                    make_fake_automatic_tempdir_and_calls,
+                    fake_passthrough_and_calls,
+                    make_fake_lambda_package_and_recorder,
+                    fqpn):
+        """
+        :py:func:`betareduce._core.create` writes the package in the
+        layout named.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            exclude_extension_modules=False,
+            layout="zipimport",
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__)
+
+        assert package_recorder.to_zipfile_calls == [
+            Call(args=("fileobj",), kwargs={"layout": "zipimport"})]
+
+    def test_unknown_layout(self, fqpn):
+        """
+        :py:func:`betareduce._core.create` rejects an unknown layout
+        before installing anything.
+        """
+        with pytest.raises(ValueError):
+            C.create("fileobj", ["pip", "args"], fqpn, layout="scattered",
+                     _automatic_tempdir=None)
+
+    @pytest.mark.parametrize("kwargs", [
+        {"dedup": "delete"},
+        {"dedup": "link", "layer": "layer.zip"},
+        {"dedup": "link", "layout": "zipimport"},
+    ])
+    def test_invalid_dedup(self, fqpn, kwargs):
+        """
+        :py:func:`betareduce._core.create` rejects unknown
+        deduplication modes, and links where they can't be written,
+        before installing anything.
+        """
+        with pytest.raises(ValueError):
+            C.create("fileobj", ["pip", "args"], fqpn,
+                     _automatic_tempdir=None, **kwargs)
+
+    def test_target(self,
+                    make_fake_automatic_tempdir_and_calls,
+                    fake_passthrough_and_calls,
+                    make_fake_lambda_package_and_recorder,
+                    fqpn):
+        """
+        :py:func:`betareduce._core.create` installs wheels for the
+        target runtime and excludes only extension modules it can't
+        load.
+        """
+        (fake_automatic_tempdir,
+         automatic_tempdir_calls) = make_fake_automatic_tempdir_and_calls(
+             "temp")
+        fake_passthrough, passthrough_calls = fake_passthrough_and_calls
+        package, package_recorder = make_fake_lambda_package_and_recorder(
+            "zipfileobj")
+        target = Target((3, 11))
+
+        C.create(
+            "fileobj", ["pip", "args"], fqpn,
+            target=target,
+            _automatic_tempdir=fake_automatic_tempdir,
+            _passthrough=fake_passthrough,
+            _LambdaPackage=package.recording__init__)
+
+        assert package_recorder.install_calls == [
+            Call(args=(target.pip_args() + ["pip", "args"],), kwargs={})]
+        assert package_recorder.to_zipfile_calls == [
+            Call(args=("fileobj",),
+                 kwargs={"filter": target.not_foreign_extension_module})]
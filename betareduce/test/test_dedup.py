@@ -0,0 +1,177 @@
+from .. import _dedup as D
+from .._core import LambdaPackage, write_package
+from .._incremental import file_digest
+from .test_core import fake_logger  # noqa: F401
+from .test_sync import write
+import io
+import os
+import pytest
+import stat
+import zipfile
+
+LICENSE = 'Permission is hereby granted ' * 40
+
+
+@pytest.fixture
+def root(tmpdir):
+    """
+    A staging directory with a license file in three distributions,
+    a vendored module in two, and a file of the same size as the
+    vendored module but different contents.
+    """
+    root = str(tmpdir.mkdir('staging'))
+    write(root, 'a-1.0.dist-info/LICENSE', LICENSE)
+    write(root, 'b-1.0.dist-info/LICENSE', LICENSE)
+    write(root, 'c-1.0.dist-info/LICENSE', LICENSE)
+    write(root, 'a/_vendor/six.py', 'six = 1\n')
+    write(root, 'b/_vendor/six.py', 'six = 1\n')
+    write(root, 'b/other.py', 'six = 2\n')
+    write(root, 'handler.py', 'def handler(event, context): pass\n')
+    return root
+
+
+def counting_digest(digested):
+    def digest(path):
+        digested.append(path.arcname)
+        return file_digest(path)
+    return digest
+
+
+def filtered(deduplicator, root):
+    return sorted(record.arcname for record in LambdaPackage(
+        root, 'handler.handler').files(sort=True) if deduplicator(record))
+
+
+def test_check_dedup():
+    """
+    :py:func:`betareduce._dedup.check_dedup` rejects unknown modes and
+    links in packages that can't hold them.
+    """
+    D.check_dedup(None)
+    D.check_dedup('report', layer='layer.zip', layout='zipimport')
+    D.check_dedup('link')
+    with pytest.raises(ValueError):
+        D.check_dedup('delete')
+    with pytest.raises(ValueError):
+        D.check_dedup('link', layer='layer.zip')
+    with pytest.raises(ValueError):
+        D.check_dedup('link', layout='zipimport')
+
+
+class TestDeduplicator(object):
+    """
+    Tests for :py:class:`betareduce._dedup.Deduplicator`
+    """
+
+    def test_report(self, root, fake_logger):
+        """
+        :py:class:`betareduce._dedup.Deduplicator` hashes only files
+        that share a size with another, includes every file, and
+        reports the duplicates, those wasting the most bytes first.
+        """
+        logger, logged = fake_logger
+        digested = []
+        deduplicator = D.Deduplicator(root, _digest=counting_digest(digested),
+                                      _logger=logger)
+
+        assert len(filtered(deduplicator, root)) == 7
+        assert sorted(digested) == sorted([
+            os.path.join('a-1.0.dist-info', 'LICENSE'),
+            os.path.join('b-1.0.dist-info', 'LICENSE'),
+            os.path.join('c-1.0.dist-info', 'LICENSE'),
+            os.path.join('a', '_vendor', 'six.py'),
+            os.path.join('b', '_vendor', 'six.py'),
+            os.path.join('b', 'other.py'),
+        ])
+
+        groups = deduplicator.report()
+        assert [(group.size, len(group.arcnames)) for group in groups] == [
+            (len(LICENSE), 3), (8, 2)]
+        assert [D.wasted(group) for group in groups] == [
+            2 * len(LICENSE), 8]
+        assert logged['info'][-1].args == (
+            "%d duplicate files %s %d bytes", 3, 'wasted',
+            2 * len(LICENSE) + 8)
+
+    def test_link(self, root):
+        """
+        :py:class:`betareduce._dedup.Deduplicator` with ``link``
+        excludes all but the first copy and writes relative symlinks
+        to it in their place.
+        """
+        deduplicator = D.Deduplicator(root, link=True)
+
+        assert filtered(deduplicator, root) == sorted([
+            os.path.join('a-1.0.dist-info', 'LICENSE'),
+            os.path.join('a', '_vendor', 'six.py'),
+            os.path.join('b', 'other.py'),
+            'handler.py',
+        ])
+        fileobj = io.BytesIO()
+        with zipfile.ZipFile(fileobj, 'w') as zip_obj:
+            written = deduplicator.write_links(
+                zip_obj, date_time=(2020, 1, 1, 0, 0, 0))
+
+        with zipfile.ZipFile(fileobj) as zip_obj:
+            links = {zinfo.filename: zip_obj.read(zinfo).decode('utf-8')
+                     for zinfo in zip_obj.infolist()}
+            for zinfo in zip_obj.infolist():
+                assert stat.S_ISLNK(zinfo.external_attr >> 16)
+                assert zinfo.date_time == (2020, 1, 1, 0, 0, 0)
+        assert links == {
+            'b-1.0.dist-info/LICENSE': '../a-1.0.dist-info/LICENSE',
+            'c-1.0.dist-info/LICENSE': '../a-1.0.dist-info/LICENSE',
+            'b/_vendor/six.py': '../../a/_vendor/six.py',
+        }
+        assert len(written) == 3
+        assert [len(group.arcnames) for group in
+                deduplicator.duplicates()] == [3, 2]
+
+    def test_compress(self, root):
+        """
+        :py:meth:`betareduce._dedup.Deduplicator.compress` compresses
+        identical contents once.
+        """
+        deduplicator = D.Deduplicator(root)
+        compressed = []
+
+        def fake_compress(filename, *args):
+            compressed.append(filename)
+            return D._zip.compress(filename, *args)
+
+        results = [
+            deduplicator.compress(os.path.join(root, *arcname.split('/')),
+                                  arcname, zipfile.ZIP_DEFLATED, 6,
+                                  _compress=fake_compress)
+            for arcname in ['a/_vendor/six.py', 'b/_vendor/six.py',
+                            'handler.py']]
+
+        assert deduplicator.hits == 1
+        assert len(compressed) == 2
+        (first, first_data), (second, second_data) = results[:2]
+        assert second.filename == 'b/_vendor/six.py'
+        assert (second.CRC, second_data) == (first.CRC, first_data)
+
+
+@pytest.mark.parametrize('dedup,links', [('report', 0), ('link', 1)])
+def test_write_package(root, dedup, links):
+    """
+    :py:func:`betareduce._core.write_package` deduplicates the
+    package as asked.
+    """
+    for name in ['a', 'b', 'c']:
+        os.remove(os.path.join(root, '%s-1.0.dist-info' % (name,),
+                               'LICENSE'))
+    fileobj = io.BytesIO()
+    write_package(LambdaPackage(root, 'handler.handler'), fileobj,
+                  compression='fast', dedup=dedup).close()
+
+    with zipfile.ZipFile(fileobj) as zip_obj:
+        assert zip_obj.testzip() is None
+        assert sorted(zip_obj.namelist()) == [
+            'a/_vendor/six.py', 'b/_vendor/six.py', 'b/other.py',
+            'handler.py', 'lambda_entry.py']
+        # which copy is kept depends on the order the files are
+        # listed in.
+        assert len([zinfo for zinfo in zip_obj.infolist()
+                    if stat.S_ISLNK(zinfo.external_attr >> 16)]) == links
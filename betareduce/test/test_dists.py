@@ -0,0 +1,75 @@
+from .. import _dists as D
+import os
+import pytest
+
+
+def install(root, metadata_dir, paths):
+    """
+    Fake the installation of a distribution with a ``RECORD`` listing
+    ``paths``.
+    """
+    os.makedirs(os.path.join(root, metadata_dir))
+    with open(os.path.join(root, metadata_dir, 'RECORD'), 'w') as f:
+        for path in paths:
+            f.write('%s,sha256=abc,10\n' % (path,))
+        f.write('\n')
+
+
+@pytest.fixture
+def root(tmpdir):
+    root = str(tmpdir)
+    install(root, 'requests-2.31.0.dist-info',
+            ['requests/__init__.py', 'requests/api.py',
+             'requests-2.31.0.dist-info/RECORD'])
+    install(root, 'six-1.16.0.dist-info',
+            ['six.py', '../../bin/six-script'])
+    os.makedirs(os.path.join(root, 'Broken-1.0.dist-info'))
+    os.makedirs(os.path.join(root, 'requests'))
+    return root
+
+
+def test_find_distributions(root):
+    """
+    :py:func:`betareduce._dists.find_distributions` finds
+    distributions by their metadata directories, sorted by name.
+    """
+    assert D.find_distributions(root) == [
+        D.Distribution('Broken', '1.0', 'Broken-1.0.dist-info', []),
+        D.Distribution('requests', '2.31.0', 'requests-2.31.0.dist-info',
+                       [os.path.join('requests', '__init__.py'),
+                        os.path.join('requests', 'api.py'),
+                        os.path.join('requests-2.31.0.dist-info',
+                                     'RECORD')]),
+        D.Distribution('six', '1.16.0', 'six-1.16.0.dist-info',
+                       ['six.py']),
+    ]
+
+
+def test_top_level_owners(root):
+    """
+    :py:func:`betareduce._dists.top_level_owners` maps top-level
+    names to the distributions that installed them.
+    """
+    assert D.top_level_owners(D.find_distributions(root)) == {
+        'Broken-1.0.dist-info': 'Broken',
+        'requests': 'requests',
+        'requests-2.31.0.dist-info': 'requests',
+        'six.py': 'six',
+        'six-1.16.0.dist-info': 'six',
+    }
+
+
+@pytest.mark.parametrize('arcname,expected', [
+    ('requests/api.py', 'requests'),
+    (os.path.join('requests', 'api.py'), 'requests'),
+    ('six.py', 'six'),
+    ('handler/main.py', 'handler'),
+    ('lambda_entry.py', 'lambda_entry.py'),
+])
+def test_owner(arcname, expected):
+    """
+    :py:func:`betareduce._dists.owner` attributes files to the
+    distribution that installed them or to their top-level name.
+    """
+    owners = {'requests': 'requests', 'six.py': 'six'}
+    assert D.owner(owners, arcname) == expected
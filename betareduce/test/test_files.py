@@ -0,0 +1,106 @@
+from .. import _files as F
+import os
+import pytest
+
+
+@pytest.fixture
+def root(tmpdir):
+    """
+    Create a staging directory with nested files, a symlink to a
+    file, a symlink to a directory and a dangling symlink, and return
+    its path.
+    """
+    root = str(tmpdir.mkdir('root'))
+    for path in ['b.py', 'a.py', 'pkg/z.py', 'pkg/sub/y.txt', 'other/x.py']:
+        path = os.path.join(root, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(path)
+    os.symlink(os.path.join(root, 'a.py'), os.path.join(root, 'link.py'))
+    os.symlink(os.path.join(root, 'pkg'), os.path.join(root, 'linked'))
+    os.symlink(os.path.join(root, 'missing'),
+               os.path.join(root, 'dangling'))
+    return root
+
+
+def walked(root):
+    return [os.path.join(dirpath, filename)
+            for dirpath, _, filenames in os.walk(root)
+            for filename in filenames]
+
+
+def test_scan_matches_walk(root):
+    """
+    :py:func:`betareduce._files.scan` yields the same files in the
+    same order as :py:func:`os.walk`, with their paths relative to
+    ``root`` and their metadata.
+    """
+    records = list(F.scan(root))
+    assert records == walked(root)
+    for record in records:
+        assert isinstance(record, F.FileRecord)
+        assert record.arcname == os.path.relpath(record, root)
+        if record.endswith('dangling'):
+            assert record.mode == os.lstat(record).st_mode
+            continue
+        stat_result = os.stat(record)
+        assert record.size == stat_result.st_size
+        assert record.mode == stat_result.st_mode
+        assert record.mtime == stat_result.st_mtime
+
+
+def test_scan_sorted(root):
+    """
+    :py:func:`betareduce._files.scan` yields each directory's files
+    and then its subdirectories' in sorted order when asked to.
+    """
+    assert [record.arcname for record in F.scan(root, sort=True)] == [
+        'a.py', 'b.py', 'dangling', 'link.py',
+        os.path.join('other', 'x.py'),
+        os.path.join('pkg', 'z.py'),
+        os.path.join('pkg', 'sub', 'y.txt'),
+    ]
+
+
+def test_scan_missing(tmpdir):
+    """
+    :py:func:`betareduce._files.scan` ignores directories it can't
+    read, as :py:func:`os.walk` does.
+    """
+    assert list(F.scan(str(tmpdir.join('missing')))) == []
+
+
+def test_stat_record():
+    """
+    :py:func:`betareduce._files.stat` returns a
+    :py:class:`betareduce._files.FileRecord`'s metadata without a
+    system call.
+    """
+    record = F.FileRecord('/nonexistent', 'nonexistent',
+                          os.stat_result((0o100644, 0, 0, 1, 0, 0,
+                                          123, 0, 456, 0)))
+    assert F.stat(record) is record.stat_result
+    assert F.getsize(record) == 123
+    assert record.mtime == 456
+
+
+def test_stat_path(tmpdir):
+    """
+    :py:func:`betareduce._files.stat` stats plain paths.
+    """
+    path = tmpdir.join('file')
+    path.write('abc')
+    assert F.stat(str(path)) == os.stat(str(path))
+    assert F.getsize(str(path)) == 3
+
+
+def test_arcname():
+    """
+    :py:func:`betareduce._files.arcname` returns a path relative to
+    the staging directory.
+    """
+    record = F.FileRecord('/root/pkg/a.py', 'recorded', None)
+    assert F.arcname(record, '/root') == 'recorded'
+    assert F.arcname('/root/pkg/a.py', '/root') == os.path.join('pkg',
+                                                                'a.py')
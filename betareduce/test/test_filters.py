@@ -0,0 +1,157 @@
+from .. import _filters as F
+from .test_core import fake_logger  # noqa: F401
+import os
+import pytest
+
+
+@pytest.mark.parametrize('rule,path,excluded', [
+    ('pycache', 'pkg/__pycache__/mod.cpython-311.pyc', True),
+    ('pycache', 'pkg/mod.pyc', False),
+    ('tests', 'pkg/tests/test_mod.py', True),
+    ('tests', 'pkg/test/__init__.py', True),
+    ('tests', 'pkg/testing/__init__.py', False),
+    ('tests', 'pkg/tests.py', False),
+    ('dist-info', 'pkg-1.0.dist-info/RECORD', True),
+    ('dist-info', 'pkg-1.0.dist-info/LICENSE', True),
+    ('dist-info', 'pkg-1.0.egg-info/SOURCES.txt', True),
+    ('dist-info', 'pkg-1.0.dist-info/METADATA', False),
+    ('dist-info', 'pkg-1.0.dist-info/entry_points.txt', False),
+    ('dist-info', 'pkg/RECORD', False),
+    ('stubs', 'pkg/mod.pyi', True),
+    ('stubs', 'pkg/py.typed', True),
+    ('stubs', 'pkg/mod.py', False),
+    ('docs', 'pkg/docs/index.html', True),
+    ('docs', 'botocore/docs/docstring.py', False),
+    ('docs', 'botocore/docs/__init__.py', False),
+    ('docs', 'pkg/doc/conf.py', True),
+    ('docs', 'pkg/examples/demo.py', True),
+    ('docs', 'pkg/README.rst', True),
+    ('docs', 'CHANGES.md', True),
+    ('docs', 'pkg/data.txt', False),
+    ('c-sources', 'pkg/_speedups.c', True),
+    ('c-sources', 'pkg/include/pkg.h', True),
+    ('c-sources', 'pkg/_fast.pyx', True),
+    ('c-sources', 'pkg/_fast.so', False),
+])
+def test_rules(rule, path, excluded):
+    """
+    Each rule in :py:data:`betareduce._filters.RULES` excludes what
+    its name says.
+    """
+    packages = {('botocore', 'docs')}
+    assert F.RULES[rule].excludes(tuple(path.split('/')),
+                                  packages.__contains__) is excluded
+
+
+def test_rule_repr():
+    """
+    :py:class:`betareduce._filters.Rule` has a readable repr.
+    """
+    assert repr(F.RULES['docs']) == "Rule('docs')"
+
+
+def test_profiles_name_rules():
+    """
+    Every profile in :py:data:`betareduce._filters.PROFILES` names
+    only known rules.
+    """
+    for rules in F.PROFILES.values():
+        assert set(rules) <= set(F.RULES)
+
+
+def test_resolve_rules():
+    """
+    :py:func:`betareduce._filters.resolve_rules` expands profiles and
+    rules, in order, without duplicates.
+    """
+    assert F.resolve_rules(['tests', 'safe', 'docs']) == [
+        F.RULES[name] for name in ['tests', 'pycache', 'stubs', 'docs',
+                                   'c-sources']]
+    assert F.resolve_rules([]) == []
+
+
+def test_resolve_rules_keep_bytecode(fake_logger):
+    """
+    :py:func:`betareduce._filters.resolve_rules` leaves out the
+    ``pycache`` rule when keeping bytecode.
+    """
+    logger, logged = fake_logger
+    assert F.resolve_rules(['safe'], keep_bytecode=True,
+                           _logger=logger) == [
+        F.RULES[name] for name in ['stubs', 'docs', 'c-sources']]
+    assert len(logged['info']) == 1
+    assert F.resolve_rules(['tests'], keep_bytecode=True) == [
+        F.RULES['tests']]
+
+
+def test_resolve_rules_unknown():
+    """
+    :py:func:`betareduce._filters.resolve_rules` rejects unknown
+    names.
+    """
+    with pytest.raises(ValueError):
+        F.resolve_rules(['everything'])
+
+
+def test_choices():
+    """
+    :py:func:`betareduce._filters.choices` lists profiles and rules.
+    """
+    assert F.choices()[:2] == ['safe', 'aggressive']
+    assert set(F.choices()) == set(F.PROFILES) | set(F.RULES)
+
+
+class TestStripFilter(object):
+    """
+    Tests for :py:class:`betareduce._filters.StripFilter`
+    """
+
+    def test_filters_and_reports(self, fake_logger):
+        """
+        Files matched by any rule are excluded, and the bytes saved
+        are attributed to the first rule that matched.
+        """
+        fake_logger, captured = fake_logger
+        root = os.path.join('staging', 'root')
+        sizes = {
+            os.path.join(root, 'pkg', 'tests', 'test_a.py'): 10,
+            os.path.join(root, 'pkg', 'tests', 'conftest.pyi'): 20,
+            os.path.join(root, 'pkg', 'a.pyi'): 5,
+            os.path.join(root, 'pkg', 'a.py'): 1000,
+        }
+        strip = F.StripFilter(root, F.resolve_rules(['tests', 'stubs']),
+                              _getsize=sizes.get, _logger=fake_logger)
+
+        included = sorted(path for path in sizes if strip(path))
+
+        assert included == [os.path.join(root, 'pkg', 'a.py')]
+        assert strip.report() == {'tests': 30, 'stubs': 5}
+        assert [call.args for call in captured['info']] == [
+            ("stripping %s saved %d bytes", 'tests', 30),
+            ("stripping %s saved %d bytes", 'stubs', 5),
+        ]
+
+    def test_real_files(self, tmpdir):
+        """
+        Sizes are read from the filesystem by default.
+        """
+        tmpdir.mkdir('docs').join('index.rst').write('x' * 7)
+        strip = F.StripFilter(str(tmpdir), F.resolve_rules(['docs']))
+        assert not strip(str(tmpdir.join('docs', 'index.rst')))
+        assert strip.saved == {'docs': 7}
+
+    def test_keeps_packages(self, tmpdir):
+        """
+        Documentation directories that are packages are kept, because
+        they're imported.
+        """
+        docs = tmpdir.mkdir('pkg').mkdir('docs')
+        docs.join('__init__.py').write('')
+        docs.join('docstring.py').write('')
+        docs.join('index.rst').write('')
+        tmpdir.join('pkg').mkdir('examples').join('demo.py').write('')
+        strip = F.StripFilter(str(tmpdir), F.resolve_rules(['safe']))
+        assert strip(str(docs.join('__init__.py')))
+        assert strip(str(docs.join('docstring.py')))
+        assert not strip(str(docs.join('index.rst')))
+        assert not strip(str(tmpdir.join('pkg', 'examples', 'demo.py')))
@@ -0,0 +1,242 @@
+from .. import _imports as I
+from .test_core import fake_logger  # noqa: F401
+import ast
+import os
+import pytest
+
+
+TREE = {
+    'handler.py': 'import app\nfrom app.views import index\n',
+    'app/__init__.py': 'from . import models\n',
+    'app/models.py': 'from .util import helper\nimport six.moves.urllib\n',
+    'app/util.py': 'def helper():\n    import json\n',
+    'app/views.py': (
+        'import importlib\n'
+        'backend = importlib.import_module("app.backends.fast")\n'
+        'plugin = __import__("plugins")\n'
+    ),
+    'app/backends/__init__.py': '',
+    'app/backends/fast.py': 'from .. import util\n',
+    'app/backends/slow.py': 'import heavy\n',
+    'app/templates/index.html': '<html/>',
+    'app/__pycache__/views.cpython-311.pyc': '',
+    'app/tests/__init__.py': '',
+    'app/tests/test_views.py': 'import pytest\n',
+    'app/tests/fixture.json': '{}',
+    'six.py': '',
+    'heavy/__init__.py': 'import broken\n',
+    'heavy/_speedups.cpython-311-x86_64-linux-gnu.so': '',
+    'heavy/data/table.csv': 'a,b',
+    'broken.py': 'print "python 2"\n',
+    'plugins.py': '',
+    'namespace/module.py': '',
+    'app-1.0.dist-info/METADATA': 'Name: app',
+    'README': 'hi',
+}
+
+
+@pytest.fixture
+def root(tmpdir):
+    root = str(tmpdir)
+    for path, contents in TREE.items():
+        path = os.path.join(root, *path.split('/'))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(contents)
+    return root
+
+
+def path_in(root, relative):
+    return os.path.join(root, *relative.split('/'))
+
+
+@pytest.mark.parametrize('filename,stem', [
+    ('module.py', 'module'),
+    ('module.pyc', 'module'),
+    ('module.cpython-311.pyc', 'module'),
+    ('_speedups.abi3.so', '_speedups'),
+    ('module.pyd', 'module'),
+    ('data.json', None),
+    ('not-identifier.py', None),
+])
+def test_module_stem(filename, stem):
+    """
+    :py:func:`betareduce._imports._module_stem` extracts module names
+    from module filenames.
+    """
+    assert I._module_stem(filename) == stem
+
+
+class TestModuleIndex(object):
+    """
+    Tests for :py:class:`betareduce._imports.ModuleIndex`
+    """
+
+    def test_modules(self, root):
+        """
+        Modules are indexed by name with all their files.
+        """
+        index = I.ModuleIndex(root)
+        assert sorted(index.modules['app.views']) == [
+            path_in(root, 'app/__pycache__/views.cpython-311.pyc'),
+            path_in(root, 'app/views.py'),
+        ]
+        assert index.modules['app'] == [path_in(root, 'app/__init__.py')]
+        assert index.modules['heavy._speedups']
+        assert index.modules['namespace.module']
+        assert 'app.templates.index' not in index.modules
+        assert index.packages == {'app', 'app.backends', 'app.tests',
+                                  'heavy'}
+
+    @pytest.mark.parametrize('path,owner', [
+        ('app/templates/index.html', 'app'),
+        ('app/tests/fixture.json', 'app.tests'),
+        ('heavy/data/table.csv', 'heavy'),
+        ('app-1.0.dist-info/METADATA', None),
+        ('README', None),
+    ])
+    def test_owners(self, root, path, owner):
+        """
+        Data files belong to their nearest enclosing regular package.
+        """
+        assert I.ModuleIndex(root).owners[path_in(root, path)] == owner
+
+    def test_source(self, root):
+        """
+        :py:meth:`betareduce._imports.ModuleIndex.source` finds a
+        module's source but not its cached bytecode.
+        """
+        index = I.ModuleIndex(root)
+        assert index.source('app.views') == path_in(root, 'app/views.py')
+        assert index.source('heavy._speedups') is None
+        assert index.source('missing') is None
+
+
+@pytest.mark.parametrize('source,name,is_package,expected', [
+    ('import a.b, c', 'm', False, ['a.b', 'c']),
+    ('from a import b', 'm', False, ['a', 'a.b']),
+    ('from a import *', 'm', False, ['a']),
+    ('from . import b', 'p.m', False, ['p', 'p.b']),
+    ('from . import b', 'p', True, ['p', 'p.b']),
+    ('from .c import d', 'p.q.m', False, ['p.q.c', 'p.q.c.d']),
+    ('from ..c import d', 'p.q.m', False, ['p.c', 'p.c.d']),
+    ('from .. import d', 'p.m', False, ['d']),
+    ('importlib.import_module("x")', 'm', False, ['x']),
+    ('__import__("y")', 'm', False, ['y']),
+    ('import_module(name)', 'm', False, []),
+    ('print("z")', 'm', False, []),
+])
+def test_imported_names(source, name, is_package, expected):
+    """
+    :py:func:`betareduce._imports._imported_names` resolves absolute,
+    relative and literal dynamic imports.
+    """
+    tree = ast.parse(source)
+    assert sorted(I._imported_names(tree, name, is_package)) == expected
+
+
+class TestImportGraph(object):
+    """
+    Tests for :py:class:`betareduce._imports.ImportGraph`
+    """
+
+    def test_imports(self, root):
+        """
+        :py:meth:`betareduce._imports.ImportGraph.imports` returns the
+        modules under the staging directory that a module imports.
+        """
+        graph = I.ImportGraph(I.ModuleIndex(root))
+        assert graph.imports('app.models') == {'app.util', 'six'}
+        assert graph.imports('heavy._speedups') == set()
+
+    def test_unparseable(self, root, fake_logger):
+        """
+        Modules that can't be parsed import nothing.
+        """
+        fake_logger, captured = fake_logger
+        graph = I.ImportGraph(I.ModuleIndex(root), _logger=fake_logger)
+        assert graph.imports('broken') == set()
+        assert captured['info'][0].args[1] == path_in(root, 'broken.py')
+
+    def test_reachable(self, root):
+        """
+        :py:meth:`betareduce._imports.ImportGraph.reachable` follows
+        imports transitively and includes enclosing packages.
+        """
+        graph = I.ImportGraph(I.ModuleIndex(root))
+        assert graph.reachable(['handler']) == {
+            'handler', 'app', 'app.models', 'app.util', 'app.views',
+            'app.backends', 'app.backends.fast', 'six', 'plugins',
+        }
+
+
+class TestTreeShaker(object):
+    """
+    Tests for :py:class:`betareduce._imports.TreeShaker`
+    """
+
+    def included(self, shaker, root):
+        return sorted(path for path in TREE
+                      if shaker(path_in(root, path)))
+
+    def test_shakes(self, root, fake_logger):
+        """
+        Unreachable modules and the data of unreachable packages are
+        excluded, and reported.
+        """
+        fake_logger, captured = fake_logger
+        shaker = I.TreeShaker(root, 'handler', _logger=fake_logger)
+        assert self.included(shaker, root) == sorted([
+            'handler.py',
+            'app/__init__.py',
+            'app/models.py',
+            'app/util.py',
+            'app/views.py',
+            'app/__pycache__/views.cpython-311.pyc',
+            'app/backends/__init__.py',
+            'app/backends/fast.py',
+            'app/templates/index.html',
+            'six.py',
+            'plugins.py',
+            'app-1.0.dist-info/METADATA',
+            'README',
+        ])
+        assert shaker.report() == [
+            'app.backends.slow', 'app.tests', 'app.tests.test_views',
+            'broken', 'heavy', 'heavy._speedups', 'namespace.module',
+        ]
+        [summary] = captured['info'][-1:]
+        assert summary.args[1:] == (9, 7, len('import heavy\n') +
+                                    len('import pytest\n') +
+                                    len('{}') + len('import broken\n') +
+                                    len('a,b') + len('print "python 2"\n'))
+
+    def test_keep(self, root):
+        """
+        Modules matching the ``keep`` patterns, and what they import,
+        are included.
+        """
+        shaker = I.TreeShaker(root, 'handler', keep=['app.backends.*'])
+        included = self.included(shaker, root)
+        assert 'app/backends/slow.py' in included
+        assert 'heavy/__init__.py' in included
+        assert 'heavy/data/table.csv' in included
+        assert 'app/tests/test_views.py' not in included
+
+    def test_missing_entry(self, root):
+        """
+        A handler module that isn't in the staging directory raises
+        :py:exc:`ValueError` before any file is excluded.
+        """
+        shaker = I.TreeShaker(root, 'missing')
+        with pytest.raises(ValueError) as info:
+            self.included(shaker, root)
+        assert 'missing' in str(info.value)
+        assert shaker.dropped == []
+
+    def test_report_unused(self, root):
+        """
+        A shaker that never filtered anything reports nothing.
+        """
+        assert I.TreeShaker(root, 'handler').report() == []
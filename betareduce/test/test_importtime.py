@@ -0,0 +1,79 @@
+from .. import _importtime as I
+import subprocess
+import sys
+
+OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 | encodings
+betareduce: importing
+import time:        40 |         40 |     re._parser
+import time:        60 |        100 |   re
+import time:       500 |        500 |   decimal
+import time:        30 |        630 | handler
+"""
+
+
+def test_parse():
+    """
+    :py:func:`betareduce._importtime.parse` reads the imports ``-X
+    importtime`` reports after the marker.
+    """
+    assert I.parse(OUTPUT) == [
+        I.ImportCost('re._parser', 40, 40, 3),
+        I.ImportCost('re', 60, 100, 2),
+        I.ImportCost('decimal', 500, 500, 2),
+        I.ImportCost('handler', 30, 630, 1),
+    ]
+
+
+def test_parse_without_marker():
+    """
+    :py:func:`betareduce._importtime.parse` reads every import when
+    there's no marker.
+    """
+    output = OUTPUT.replace('betareduce: importing\n', '')
+    assert [cost.module for cost in I.parse(output)] == [
+        'encodings', 're._parser', 're', 'decimal', 'handler']
+
+
+def test_measure():
+    """
+    :py:func:`betareduce._importtime.measure` imports the module in an
+    isolated interpreter with ``-X importtime``.
+    """
+    calls = []
+
+    def fake_check_output(cmd, stderr):
+        calls.append((cmd, stderr))
+        return OUTPUT.encode('utf-8')
+
+    costs = I.measure('/staging', 'handler',
+                      _check_output=fake_check_output)
+
+    [(cmd, stderr)] = calls
+    assert cmd[:6] == [sys.executable, '-I', '-S', '-X', 'importtime', '-c']
+    assert "sys.path.insert(0, '/staging')" in cmd[6]
+    assert cmd[6].endswith('import handler')
+    assert stderr == subprocess.STDOUT
+    assert costs == I.parse(OUTPUT)
+
+
+def test_measure_imports(tmpdir):
+    """
+    :py:func:`betareduce._importtime.measure` reports the imports of
+    a module in the staging directory.
+    """
+    tmpdir.join('handler_module.py').write('import fractions\n')
+    costs = I.measure(str(tmpdir), 'handler_module')
+    assert costs[-1].module == 'handler_module'
+    assert costs[-1].depth == 1
+    assert 'fractions' in [cost.module for cost in costs]
+
+
+def test_heaviest():
+    """
+    :py:func:`betareduce._importtime.heaviest` sorts imports by
+    cumulative cost.
+    """
+    assert [cost.module for cost in I.heaviest(I.parse(OUTPUT), top=3)] == [
+        'handler', 'decimal', 're']
@@ -0,0 +1,227 @@
+from .. import _incremental as I
+from .. import _zip
+from .test_core import fake_logger  # noqa: F401
+import io
+import json
+import os
+import pytest
+import zipfile
+import zlib
+
+
+def write(path, contents):
+    with open(path, 'wb') as f:
+        f.write(contents)
+
+
+class Builder(object):
+    """
+    Builds archives of the files in a directory the way
+    :py:meth:`betareduce._core.LambdaPackage.to_zipfile` does.
+    """
+
+    def __init__(self, directory, archive,
+                 compression=zipfile.ZIP_DEFLATED, compresslevel=None,
+                 date_time=None):
+        self.directory = directory
+        self.archive = archive
+        self.compression = compression
+        self.compresslevel = compresslevel
+        self.date_time = date_time
+
+    def members(self):
+        return [(os.path.join(self.directory, name), name)
+                for name in sorted(os.listdir(self.directory))]
+
+    def full(self):
+        fileobj = io.BytesIO()
+        with zipfile.ZipFile(fileobj, 'w', self.compression,
+                             compresslevel=self.compresslevel) as zip_obj:
+            _zip.write_members(zip_obj, self.members(), 1,
+                               date_time=self.date_time)
+        return fileobj.getvalue()
+
+    def incremental(self, threshold=_zip.STREAM_THRESHOLD, **kwargs):
+        build = I.IncrementalBuild(self.archive, **kwargs)
+        fileobj = io.BytesIO()
+        with zipfile.ZipFile(fileobj, 'w', self.compression,
+                             compresslevel=self.compresslevel) as zip_obj:
+            _zip.write_members(zip_obj, self.members(), 2,
+                               threshold=threshold,
+                               date_time=self.date_time,
+                               _compress=build.compress,
+                               _stream=build.stream)
+        build.save()
+        write(self.archive, fileobj.getvalue())
+        return build
+
+
+@pytest.fixture
+def builder(tmpdir):
+    directory = tmpdir.mkdir('staging')
+    write(str(directory.join('a.py')), b'a = 1\n' * 1000)
+    write(str(directory.join('b.py')), b'b = 2\n' * 1000)
+    write(str(directory.join('c.txt')), b'c')
+    return Builder(str(directory), str(tmpdir.join('package.zip')))
+
+
+def test_manifest_path():
+    """
+    :py:func:`betareduce._incremental.manifest_path` names the
+    manifest beside the archive.
+    """
+    assert I.manifest_path('out.zip') == 'out.zip.manifest.json'
+
+
+def test_first_build(builder):
+    """
+    Without a previous archive, every member is compressed and the
+    result matches a full build.
+    """
+    build = builder.incremental()
+    assert build.reused == 0
+    with open(builder.archive, 'rb') as f:
+        assert f.read() == builder.full()
+    with open(I.manifest_path(builder.archive)) as f:
+        manifest = json.load(f)
+    assert sorted(manifest) == ['a.py', 'b.py', 'c.txt']
+    assert manifest['c.txt']['sha256'] == I.file_digest(
+        os.path.join(builder.directory, 'c.txt'))
+
+
+def test_reuses_unchanged(builder):
+    """
+    Unchanged members are copied from the previous archive, changed
+    ones are recompressed, and the result matches a full build.
+    """
+    builder.incremental()
+    write(os.path.join(builder.directory, 'b.py'), b'b = 3\n' * 1000)
+    write(os.path.join(builder.directory, 'd.py'), b'd = 4\n')
+
+    compressed = []
+
+    def recording_compress(filename, arcname, *args):
+        compressed.append(arcname)
+        return _zip.compress(filename, arcname, *args)
+
+    build = I.IncrementalBuild(builder.archive)
+    fileobj = io.BytesIO()
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as zip_obj:
+        for filename, arcname in builder.members():
+            _zip.write_compressed(zip_obj, *build.compress(
+                filename, arcname, zipfile.ZIP_DEFLATED, None,
+                _compress=recording_compress))
+
+    assert sorted(compressed) == ['b.py', 'd.py']
+    assert build.reused == 2
+    assert fileobj.getvalue() == builder.full()
+
+
+def test_reuses_unchanged_streamed(builder):
+    """
+    Large members are copied from the previous archive a chunk at a
+    time, and the result matches a full build.
+    """
+    builder.incremental(threshold=0)
+    write(os.path.join(builder.directory, 'b.py'), b'b = 3\n' * 1000)
+    build = builder.incremental(threshold=0)
+    assert build.reused == 2
+    with open(builder.archive, 'rb') as f:
+        assert f.read() == builder.full()
+    with open(I.manifest_path(builder.archive)) as f:
+        manifest = json.load(f)
+    assert manifest['b.py']['crc'] == zlib.crc32(b'b = 3\n' * 1000)
+
+
+@pytest.mark.parametrize('threshold', [0, _zip.STREAM_THRESHOLD])
+def test_reuses_unchanged_deterministic(builder, threshold):
+    """
+    Reused members of a reproducible archive get the same timestamp
+    and permissions as freshly compressed ones.
+    """
+    builder.date_time = (2020, 2, 2, 12, 0, 0)
+    builder.incremental(threshold=threshold)
+    write(os.path.join(builder.directory, 'b.py'), b'b = 3\n' * 1000)
+    os.utime(os.path.join(builder.directory, 'a.py'), (0, 1000000000))
+    build = builder.incremental(threshold=threshold)
+    assert build.reused == 2
+    with open(builder.archive, 'rb') as f:
+        assert f.read() == builder.full()
+
+
+def test_touched_file_is_reused(builder):
+    """
+    A member whose modification time changed but whose contents
+    didn't is reused, with the new modification time.
+    """
+    builder.incremental()
+    os.utime(os.path.join(builder.directory, 'a.py'), (0, 1000000000))
+    build = builder.incremental()
+    assert build.reused == 3
+    with open(builder.archive, 'rb') as f:
+        assert f.read() == builder.full()
+
+
+def test_compression_change_is_not_reused(builder):
+    """
+    Members compressed with different settings are recompressed.
+    """
+    builder.incremental()
+    builder.compresslevel = 1
+    build = builder.incremental()
+    assert build.reused == 0
+    with open(builder.archive, 'rb') as f:
+        assert f.read() == builder.full()
+
+
+def test_mismatched_manifest_is_not_reused(builder):
+    """
+    A manifest that doesn't describe the previous archive is
+    ignored for the members that don't match.
+    """
+    builder.incremental()
+    with open(I.manifest_path(builder.archive)) as f:
+        manifest = json.load(f)
+    manifest['a.py']['crc'] += 1
+    with open(I.manifest_path(builder.archive), 'w') as f:
+        json.dump(manifest, f)
+
+    build = builder.incremental()
+    assert build.reused == 2
+
+
+@pytest.mark.parametrize('corrupt', [
+    lambda archive: os.remove(I.manifest_path(archive)),
+    lambda archive: write(I.manifest_path(archive), b'{'),
+    lambda archive: write(archive, b'not a zip'),
+])
+def test_unusable_previous_build(builder, fake_logger, corrupt):
+    """
+    A missing or corrupt previous build results in a full rebuild.
+    """
+    fake_logger, captured = fake_logger
+    builder.incremental()
+    corrupt(builder.archive)
+    build = builder.incremental(_logger=fake_logger)
+    assert build.reused == 0
+    assert captured['info'][0].args[0].startswith('no usable previous')
+
+
+def test_read_raw(builder):
+    """
+    :py:func:`betareduce._incremental.read_raw` reads a member's
+    compressed data and rejects damaged archives.
+    """
+    builder.incremental()
+    with zipfile.ZipFile(builder.archive) as zip_obj:
+        zinfo = zip_obj.getinfo('c.txt')
+    assert zlib.decompress(I.read_raw(builder.archive, zinfo), -15) == b'c'
+
+    zinfo.header_offset += 1
+    with pytest.raises(zipfile.BadZipFile):
+        I.read_raw(builder.archive, zinfo)
+
+    zinfo.header_offset -= 1
+    zinfo.compress_size = 10 ** 9
+    with pytest.raises(zipfile.BadZipFile):
+        I.read_raw(builder.archive, zinfo)
@@ -0,0 +1,219 @@
+from .. import _core, _files
+from .. import _layer as L
+from .test_core import fake_logger  # noqa: F401
+from .test_dists import install
+import io
+import os
+import pytest
+import zipfile
+
+
+def write(root, path, contents):
+    path = os.path.join(root, path)
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(contents)
+
+
+@pytest.fixture
+def root(tmpdir):
+    """
+    A staging directory containing the function's own distribution,
+    ``myapp``, and a dependency, ``requests``.
+    """
+    root = str(tmpdir.mkdir('staging'))
+    myapp = ['myapp/__init__.py', 'myapp/handlers.py', 'myapp_extra.py',
+             '__pycache__/myapp_extra.cpython-311.pyc']
+    requests = ['requests/__init__.py', 'requests/api.py']
+    install(root, 'myapp-1.0.dist-info', myapp)
+    install(root, 'requests-2.31.0.dist-info', requests)
+    for path in myapp + requests:
+        write(root, path, path)
+    return root
+
+
+def test_digest_path():
+    """
+    :py:func:`betareduce._layer.digest_path` names the digest beside
+    the layer.
+    """
+    assert L.digest_path('layer.zip') == 'layer.zip.sha256'
+
+
+def function_arcnames(root, function_files):
+    return sorted(record.arcname for record in _files.scan(root)
+                  if function_files(record))
+
+
+def test_function_files_distribution(root):
+    """
+    :py:class:`betareduce._layer.FunctionFiles` includes the files of
+    the distribution that provides the handler's module.
+    """
+    function_files = L.FunctionFiles(root, 'myapp.handlers')
+    assert function_arcnames(root, function_files) == [
+        os.path.join('myapp-1.0.dist-info', 'RECORD'),
+        os.path.join('myapp', '__init__.py'),
+        os.path.join('myapp', 'handlers.py'),
+        'myapp_extra.py',
+    ]
+    assert function_files(os.path.join(root, 'myapp', 'handlers.py'))
+
+
+def test_function_files_no_distribution(root):
+    """
+    :py:class:`betareduce._layer.FunctionFiles` includes the handler's
+    top-level package or module when no distribution provides it.
+    """
+    write(root, 'local/handler.py', '')
+    write(root, 'single.py', '')
+    assert function_arcnames(root, L.FunctionFiles(root, 'local.handler')) \
+        == [os.path.join('local', 'handler.py')]
+    assert function_arcnames(root, L.FunctionFiles(root, 'single')) == [
+        'single.py']
+
+
+def test_layer_digest(root):
+    """
+    :py:func:`betareduce._layer.layer_digest` identifies the members'
+    names, contents and settings, regardless of their order.
+    """
+    records = list(_files.scan(root))
+    digest = L.layer_digest(records)
+    assert L.layer_digest(records[::-1]) == digest
+    assert L.layer_digest(records[1:]) != digest
+    assert L.layer_digest(records, settings=('x',)) != digest
+    write(root, 'requests/api.py', 'changed')
+    assert L.layer_digest(list(_files.scan(root))) != digest
+
+
+class TestWriteLayer(object):
+    """
+    Tests for :py:func:`betareduce._layer.write_layer`
+    """
+
+    @pytest.fixture
+    def package(self, root):
+        return _core.LambdaPackage(root, 'myapp.handlers.handle')
+
+    @pytest.fixture
+    def layer(self, tmpdir):
+        return str(tmpdir.join('layer.zip'))
+
+    def dependencies(self, package):
+        function_files = L.FunctionFiles(package.root, 'myapp.handlers')
+        return lambda path: not function_files(path)
+
+    def test_writes_layer(self, package, layer, fake_logger):
+        """
+        The filtered files are written beneath ``python/``, without
+        the handler module, and the layer's digest is stored beside
+        it.
+        """
+        fake_logger, captured = fake_logger
+        assert L.write_layer(package, layer, filter=self.dependencies(package),
+                             _logger=fake_logger)
+        with zipfile.ZipFile(layer) as zip_obj:
+            assert sorted(zip_obj.namelist()) == [
+                'python/__pycache__/myapp_extra.cpython-311.pyc',
+                'python/requests-2.31.0.dist-info/RECORD',
+                'python/requests/__init__.py',
+                'python/requests/api.py',
+            ]
+        with open(L.digest_path(layer)) as f:
+            assert len(f.read().strip()) == 64
+        assert not os.path.exists(layer + '.partial')
+
+    def test_unchanged(self, package, layer, fake_logger):
+        """
+        A layer whose contents haven't changed isn't rewritten, but is
+        still charged to the budget.
+        """
+        fake_logger, captured = fake_logger
+        L.write_layer(package, layer, filter=self.dependencies(package))
+        added = []
+
+        class FakeBudget(object):
+            def add(self, zinfo, arcname):
+                added.append(arcname)
+
+        def refuse_open(path, mode):
+            raise AssertionError("rewrote an unchanged layer")
+
+        assert not L.write_layer(package, layer,
+                                 filter=self.dependencies(package),
+                                 budget=FakeBudget(), _open=refuse_open,
+                                 _logger=fake_logger)
+        assert sorted(added) == [
+            '__pycache__/myapp_extra.cpython-311.pyc',
+            'requests-2.31.0.dist-info/RECORD',
+            'requests/__init__.py',
+            'requests/api.py',
+        ]
+        assert 'unchanged' in captured['info'][0].args[0]
+
+    @pytest.mark.parametrize('change', ['contents', 'settings', 'missing'])
+    def test_changed(self, package, layer, change):
+        """
+        A layer is rewritten when its contents or settings change, or
+        it's missing.
+        """
+        L.write_layer(package, layer, filter=self.dependencies(package))
+        kwargs = {}
+        if change == 'contents':
+            write(package.root, 'requests/api.py', 'changed')
+        elif change == 'settings':
+            kwargs['date_time'] = (2020, 2, 2, 12, 0, 0)
+        else:
+            os.remove(layer)
+        assert L.write_layer(package, layer,
+                             filter=self.dependencies(package), **kwargs)
+        with zipfile.ZipFile(layer) as zip_obj:
+            assert zip_obj.read('python/requests/api.py') == (
+                b'changed' if change == 'contents' else b'requests/api.py')
+
+    def test_failure(self, package, layer):
+        """
+        A layer that fails to be written is removed.
+        """
+        removed = []
+
+        class ExhaustedBudget(object):
+            def add(self, zinfo, arcname):
+                raise ValueError("too big")
+
+        with pytest.raises(ValueError):
+            L.write_layer(package, layer, filter=self.dependencies(package),
+                          budget=ExhaustedBudget(), _remove=removed.append)
+        assert removed == [layer + '.partial']
+        assert not os.path.exists(L.digest_path(layer))
+
+
+def test_write_package_layer(root, tmpdir):
+    """
+    :py:func:`betareduce._core.write_package` splits dependencies into
+    a layer, leaving the function's own code and the handler module
+    in the package.
+    """
+    package = _core.LambdaPackage(root, 'myapp.handlers.handle')
+    layer = str(tmpdir.join('layer.zip'))
+    fileobj = io.BytesIO()
+    _core.write_package(package, fileobj, strip_rules=[], layer=layer,
+                        max_size=10 ** 6).close()
+
+    with zipfile.ZipFile(fileobj) as zip_obj:
+        assert sorted(zip_obj.namelist()) == [
+            'lambda_entry.py',
+            'myapp-1.0.dist-info/RECORD',
+            'myapp/__init__.py',
+            'myapp/handlers.py',
+            'myapp_extra.py',
+        ]
+    with zipfile.ZipFile(layer) as zip_obj:
+        assert sorted(zip_obj.namelist()) == [
+            'python/__pycache__/myapp_extra.cpython-311.pyc',
+            'python/requests-2.31.0.dist-info/RECORD',
+            'python/requests/__init__.py',
+            'python/requests/api.py',
+        ]
@@ -0,0 +1,178 @@
+from .. import _profile as P
+import contextlib
+import io
+import json
+import pytest
+import zipfile
+
+
+class FakeClock(object):
+    """
+    A fake :py:func:`time.perf_counter` that advances a second each
+    time it's read.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+
+def member(filename, file_size, compress_size):
+    zinfo = zipfile.ZipInfo(filename)
+    zinfo.file_size = file_size
+    zinfo.compress_size = compress_size
+    return zinfo
+
+
+class TestBuildProfile(object):
+    """
+    Tests for :py:class:`betareduce._profile.BuildProfile`
+    """
+
+    @pytest.fixture
+    def profile(self):
+        return P.BuildProfile(top=2, _clock=FakeClock())
+
+    def test_phase(self, profile):
+        """
+        :py:meth:`betareduce._profile.BuildProfile.phase` accumulates
+        the time spent in each phase, even when it fails.
+        """
+        with profile.phase('install'):
+            pass
+        with pytest.raises(ValueError):
+            with profile.phase('install'):
+                raise ValueError
+        with profile.phase('compile'):
+            pass
+        assert list(profile.phases.items()) == [('install', 2.0),
+                                                ('compile', 1.0)]
+
+    def test_around(self, profile):
+        """
+        :py:meth:`betareduce._profile.BuildProfile.around` times
+        entering and exiting a context manager separately.
+        """
+        events = []
+
+        @contextlib.contextmanager
+        def manager():
+            events.append('enter')
+            yield 'value'
+            events.append('exit')
+
+        with profile.around(manager(), 'setup', 'teardown') as value:
+            assert value == 'value'
+        assert events == ['enter', 'exit']
+        assert profile.phases == {'setup': 1.0, 'teardown': 1.0}
+
+    def test_around_failure(self, profile):
+        """
+        :py:meth:`betareduce._profile.BuildProfile.around` exits the
+        context manager with the exception raised inside it.
+        """
+        exited = []
+
+        @contextlib.contextmanager
+        def manager():
+            try:
+                yield
+            except ValueError as e:
+                exited.append(e)
+                raise
+
+        with pytest.raises(ValueError):
+            with profile.around(manager(), 'setup', 'teardown'):
+                raise ValueError('failed')
+        assert [str(e) for e in exited] == ['failed']
+        assert 'teardown' in profile.phases
+
+    def test_timed(self, profile):
+        """
+        :py:meth:`betareduce._profile.BuildProfile.timed` and
+        :py:meth:`betareduce._profile.BuildProfile.timed_iter` add
+        the time calls and items take to a phase.
+        """
+        include = profile.timed('filter', lambda path: path != 'b')
+        assert [path for path in profile.timed_iter('enumerate', 'abc')
+                if include(path)] == ['a', 'c']
+        assert profile.phases == {'enumerate': 4.0, 'filter': 3.0}
+
+    def test_compress_and_stream(self, profile):
+        """
+        :py:meth:`betareduce._profile.BuildProfile.compress` and
+        :py:meth:`betareduce._profile.BuildProfile.stream` record
+        each member written.
+        """
+        compressed = member('a', 100, 10)
+
+        def fake_compress(filename, arcname, compress_type, compresslevel,
+                          date_time=None):
+            return compressed, b'data'
+
+        class FakeZipFile(object):
+            filelist = []
+
+        def fake_stream(zip_obj, filename, arcname, date_time=None):
+            zip_obj.filelist.append(member(arcname, 1000, 1000))
+
+        compress = profile.compress(fake_compress)
+        assert compress('a', 'a', zipfile.ZIP_DEFLATED, None) == (
+            compressed, b'data')
+        profile.stream(fake_stream)(FakeZipFile(), 'b', 'b', date_time=None)
+        assert profile.members == [P.Member('a', 1.0, 100, 10),
+                                   P.Member('b', 1.0, 1000, 1000)]
+        assert profile.phases == {'compress': 2.0}
+
+    def test_to_dict(self, profile):
+        """
+        :py:meth:`betareduce._profile.BuildProfile.to_dict` summarizes
+        the phases, the bytes in and out, and the slowest and largest
+        members.
+        """
+        profile.member(member('small', 10, 5), 3.0)
+        profile.member(member('large', 1000, 100), 1.0)
+        profile.member(member('medium', 100, 50), 2.0)
+        with profile.phase('install'):
+            pass
+
+        summary = profile.to_dict()
+        assert summary['phases'] == {'compress': 6.0, 'install': 1.0}
+        assert summary['files'] == 3
+        assert summary['bytes_in'] == 1110
+        assert summary['bytes_out'] == 155
+        assert [m['arcname'] for m in summary['slowest']] == ['small',
+                                                              'medium']
+        assert [m['arcname'] for m in summary['largest']] == ['large',
+                                                              'medium']
+        assert summary['seconds'] > 0
+
+    def test_dump(self, profile):
+        """
+        :py:meth:`betareduce._profile.BuildProfile.dump` writes JSON.
+        """
+        profile.member(member('a', 10, 5), 1.0)
+        output = io.StringIO()
+        profile.dump(output)
+        assert json.loads(output.getvalue())['files'] == 1
+
+
+def test_null_profile():
+    """
+    :py:data:`betareduce._profile.NO_PROFILE` leaves everything
+    unwrapped.
+    """
+    def function():
+        pass
+
+    manager = contextlib.nullcontext('value')
+    assert P.NO_PROFILE.timed('filter', function) is function
+    assert P.NO_PROFILE.timed_iter('enumerate', 'abc') == 'abc'
+    assert P.NO_PROFILE.compress(function) is function
+    assert P.NO_PROFILE.stream(function) is function
+    assert P.NO_PROFILE.around(manager, 'setup', 'teardown') is manager
+    with P.NO_PROFILE.phase('install'):
+        pass
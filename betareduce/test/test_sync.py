@@ -0,0 +1,278 @@
+from .. import _sync as S
+from .._dists import Distribution
+from .._target import Target
+from .test_core import fake_logger  # noqa: F401
+from .test_wheels import make_wheel, tree
+import json
+import os
+import pytest
+
+
+def write(root, relpath, contents=''):
+    path = os.path.join(root, *relpath.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(contents)
+
+
+def install(root, name, version, paths):
+    """
+    Fake the installation of a distribution with the files
+    ``paths``, all listed in its ``RECORD``.
+    """
+    metadata_dir = '%s-%s.dist-info' % (name, version)
+    paths = list(paths) + [metadata_dir + '/RECORD']
+    for path in paths[:-1]:
+        write(root, path)
+    write(root, paths[-1], ''.join('%s,,\n' % (path,) for path in paths))
+
+
+def item(name, version, url=None, **info):
+    """
+    Returns an ``install`` entry of ``pip``'s report for ``name`` at
+    ``version``, from an index unless ``url`` is given.
+    """
+    download_info = dict(info, url=url or 'https://files/%s.whl' % (name,))
+    return {'metadata': {'name': name, 'version': version},
+            'download_info': download_info,
+            'is_direct': url is not None}
+
+
+def test_canonical_name():
+    """
+    :py:func:`betareduce._sync.canonical_name` normalizes names as
+    PEP 503 does.
+    """
+    assert S.canonical_name('Typing.Extensions') == 'typing-extensions'
+    assert S.canonical_name('typing_extensions') == 'typing-extensions'
+
+
+def test_index_options():
+    """
+    :py:func:`betareduce._sync.index_options` picks out the options
+    that say where to find distributions, with their values.
+    """
+    assert S.index_options([
+        '-r', 'requirements.txt', '-i', 'https://index', '--pre',
+        '--find-links=wheels', 'requests', '--extra-index-url',
+        'https://extra', '--upgrade',
+    ]) == ['-i', 'https://index', '--pre', '--find-links=wheels',
+           '--extra-index-url', 'https://extra']
+
+
+@pytest.mark.parametrize('info,expected', [
+    (item('six', '1.16.0')['download_info'],
+     'six @ https://files/six.whl'),
+    ({'url': 'https://github.com/a/six', 'subdirectory': 'src',
+      'vcs_info': {'vcs': 'git', 'commit_id': 'abc123'}},
+     'six @ git+https://github.com/a/six@abc123#subdirectory=src'),
+])
+def test_requirement(info, expected):
+    """
+    :py:func:`betareduce._sync.requirement` pins the distribution a
+    report entry describes to where it was found.
+    """
+    assert S.requirement({'metadata': {'name': 'six'},
+                          'download_info': info}) == expected
+
+
+class TestStagingSync(object):
+    """
+    Tests for :py:class:`betareduce._sync.StagingSync`
+    """
+
+    @pytest.fixture
+    def root(self, tmpdir):
+        root = str(tmpdir.mkdir('staging'))
+        install(root, 'six', '1.16.0', ['six.py'])
+        install(root, 'requests', '2.30.0',
+                ['requests/__init__.py', 'requests/api.py'])
+        install(root, 'google_api_core', '2.0.0',
+                ['google/api_core/__init__.py'])
+        install(root, 'protobuf', '4.0.0', ['google/protobuf/__init__.py'])
+        write(root, 'requests/__pycache__/api.cpython-311.pyc')
+        write(root, 'requests/__pycache__/api_other.cpython-311.pyc')
+        write(root, 'requests/api.pyc')
+        return root
+
+    @pytest.fixture
+    def staging_sync(self, root):
+        return S.StagingSync(root)
+
+    def test_resolve(self, root):
+        """
+        :py:meth:`betareduce._sync.StagingSync.resolve` resolves the
+        requirements with ``pip install --dry-run`` and returns its
+        report by canonical name.
+        """
+        calls = []
+
+        def fake_check_output(cmd):
+            calls.append(cmd)
+            return json.dumps({'install': [item('Typing_Extensions', '4.7.1'),
+                                           item('six', '1.16.0')]})
+
+        staging_sync = S.StagingSync(root, _check_output=fake_check_output)
+        resolved = staging_sync.resolve(['-r', 'requirements.txt'])
+
+        assert calls == [['pip', 'install', '--dry-run',
+                          '--ignore-installed', '--quiet', '--report', '-',
+                          '-r', 'requirements.txt']]
+        assert sorted(resolved) == ['six', 'typing-extensions']
+        assert resolved['six'] == item('six', '1.16.0')
+
+    def test_plan(self, root, staging_sync):
+        """
+        :py:meth:`betareduce._sync.StagingSync.plan` keeps unchanged
+        distributions, replaces those whose version or source
+        changed, installs new ones and removes dropped ones.
+        """
+        install(root, 'pinned', '1.0', ['pinned.py'])
+        write(root, 'pinned-1.0.dist-info/direct_url.json', json.dumps(
+            item('pinned', '1.0', url='https://pinned/1.whl')[
+                'download_info']))
+        install(root, 'moved', '1.0', ['moved.py'])
+        install(root, 'local', '1.0', ['local.py'])
+        resolved = {
+            'six': item('six', '1.16.0'),
+            'requests': item('requests', '2.31.0'),
+            'google-api-core': item('google-api-core', '2.0.0'),
+            'idna': item('idna', '3.4'),
+            'pinned': item('pinned', '1.0', url='https://pinned/1.whl'),
+            'moved': item('moved', '1.0', url='https://moved/2.whl'),
+            'local': item('local', '1.0', url='file:///src/local',
+                          dir_info={}),
+        }
+        installed = staging_sync.installed()
+
+        install_items, remove = staging_sync.plan(resolved, installed)
+
+        assert [entry['metadata']['name'] for entry in install_items] == [
+            'idna', 'local', 'moved', 'requests']
+        assert [dist.name for dist in remove] == [
+            'local', 'moved', 'protobuf', 'requests']
+
+    def test_remove(self, root, staging_sync):
+        """
+        :py:meth:`betareduce._sync.StagingSync.remove` removes a
+        distribution's files, metadata and bytecode, and the
+        directories that leaves empty, but nothing else.
+        """
+        installed = staging_sync.installed()
+        staging_sync.remove(installed['requests'])
+        staging_sync.remove(installed['protobuf'])
+        assert tree(root) == [
+            os.path.join('google', 'api_core', '__init__.py'),
+            os.path.join('google_api_core-2.0.0.dist-info', 'RECORD'),
+            os.path.join('requests', '__pycache__',
+                         'api_other.cpython-311.pyc'),
+            os.path.join('six-1.16.0.dist-info', 'RECORD'),
+            'six.py',
+        ]
+        assert not os.path.exists(os.path.join(root, 'google', 'protobuf'))
+
+    def fake_pip(self, tmpdir, reports, calls):
+        """
+        Returns a fake :py:func:`subprocess.check_output` that
+        returns each of ``reports`` from ``pip install --dry-run`` in
+        turn, and builds a wheel of each requirement it's asked to.
+        """
+        reports = iter(reports)
+
+        def fake_check_output(cmd, **kwargs):
+            calls.append(cmd)
+            if '--dry-run' in cmd:
+                return json.dumps({'install': next(reports)})
+            directory = cmd[4]
+            for requirement in cmd:
+                name, _, url = requirement.partition(' @ ')
+                if url:
+                    version = url.rsplit('/', 1)[-1][:-len('.whl')]
+                    make_wheel(directory,
+                               '%s-%s-py3-none-any.whl' % (name, version), [
+                                   ('%s.py' % (name,), url, 0o644),
+                                   ('%s-%s.dist-info/RECORD'
+                                    % (name, version),
+                                    '%s.py,,\n' % (name,), 0o644),
+                               ])
+            return b'built'
+        return fake_check_output
+
+    def test_sync(self, tmpdir, fake_logger):
+        """
+        :py:meth:`betareduce._sync.StagingSync.sync` installs only
+        what changed, and records where direct references came from
+        so that they aren't reinstalled next time.
+        """
+        logger, logged = fake_logger
+        root = str(tmpdir.mkdir('staging'))
+        install(root, 'six', '1.16.0', ['six.py'])
+        install(root, 'idna', '3.3', ['idna.py'])
+        calls = []
+        pinned = item('pinned', '1.0', url='https://pinned/1.0.whl',
+                      archive_info={})
+        reports = [
+            [item('six', '1.16.0'), item('idna', '3.4', 'https://x/3.4.whl'),
+             pinned],
+            [item('six', '1.16.0'), item('idna', '3.4', 'https://x/3.4.whl'),
+             pinned],
+        ]
+        staging_sync = S.StagingSync(
+            root, _check_output=self.fake_pip(tmpdir, reports, calls))
+
+        staging_sync.sync(['-i', 'https://index', 'six', 'idna', 'pinned'],
+                          _logger=logger)
+
+        assert calls[1] == [
+            'pip', 'wheel', '--no-deps', '--wheel-dir', calls[1][4],
+            '-i', 'https://index',
+            'idna @ https://x/3.4.whl', 'pinned @ https://pinned/1.0.whl']
+        assert not os.path.exists(calls[1][4])
+        assert tree(root) == [
+            os.path.join('idna-3.4.dist-info', 'RECORD'),
+            os.path.join('idna-3.4.dist-info', 'direct_url.json'),
+            'idna.py',
+            os.path.join('pinned-1.0.dist-info', 'RECORD'),
+            os.path.join('pinned-1.0.dist-info', 'direct_url.json'),
+            'pinned.py',
+            os.path.join('six-1.16.0.dist-info', 'RECORD'),
+            'six.py',
+        ]
+        with open(os.path.join(root, 'idna.py')) as f:
+            assert f.read() == 'https://x/3.4.whl'
+        assert logged['info'][0].args[2:] == (['idna', 'pinned'], ['idna'])
+
+        del calls[:]
+        staging_sync.sync(['six', 'idna', 'pinned'], _logger=logger)
+        assert len(calls) == 1
+        assert logged['info'][-1].args[2:] == ([], [])
+
+    def test_fetch_target(self, tmpdir, fake_logger):
+        """
+        :py:meth:`betareduce._sync.StagingSync.fetch` downloads wheels
+        built for the target runtime.
+        """
+        calls = []
+        target = Target((3, 11))
+        staging_sync = S.StagingSync(
+            str(tmpdir), target=target,
+            _check_output=self.fake_pip(tmpdir, [], calls))
+        directory = str(tmpdir.mkdir('built'))
+
+        wheels = staging_sync.fetch([item('six', '1.16.0')], ['six'],
+                                    directory, _logger=fake_logger[0])
+
+        assert calls == [['pip', 'download', '--no-deps', '--dest',
+                          directory] + target.pip_args() +
+                         ['six @ https://files/six.whl']]
+        assert wheels == {'six': os.path.join(directory,
+                                              'six-six-py3-none-any.whl')}
+
+
+def test_read_direct_url_missing(tmpdir):
+    """
+    :py:func:`betareduce._sync.read_direct_url` returns
+    :py:class:`None` for distributions without a ``direct_url.json``.
+    """
+    dist = Distribution('six', '1.16.0', 'six-1.16.0.dist-info', [])
+    assert S.read_direct_url(str(tmpdir), dist) is None
@@ -0,0 +1,90 @@
+from .. import _target as T
+from .test_classify import elf_header, write
+from .test_core import fake_logger  # noqa: F401
+import pytest
+
+
+@pytest.mark.parametrize('spec,python_version,architecture,glibc', [
+    ('python3.9', (3, 9), 'x86_64', 26),
+    ('python3.11-x86_64', (3, 11), 'x86_64', 26),
+    ('python3.12-arm64', (3, 12), 'arm64', 34),
+])
+def test_parse(spec, python_version, architecture, glibc):
+    """
+    :py:meth:`betareduce._target.Target.parse` parses Lambda runtime
+    identifiers and knows which glibc each provides.
+    """
+    target = T.Target.parse(spec)
+    assert target.python_version == python_version
+    assert target.architecture == architecture
+    assert target.glibc == glibc
+
+
+@pytest.mark.parametrize('spec', [
+    'python3',
+    'nodejs18.x',
+    'python3.11-sparc',
+    'python3.11-',
+])
+def test_parse_invalid(spec):
+    """
+    :py:meth:`betareduce._target.Target.parse` raises
+    :py:exc:`ValueError` for anything but a Python runtime on a
+    Lambda architecture.
+    """
+    with pytest.raises(ValueError):
+        T.Target.parse(spec)
+
+
+def test_pip_args():
+    """
+    :py:meth:`betareduce._target.Target.pip_args` asks ``pip`` for
+    wheels of the runtime's Python and every manylinux platform its
+    glibc supports.
+    """
+    args = T.Target((3, 12), 'arm64').pip_args()
+    platforms = [value for option, value in zip(args, args[1:])
+                 if option == '--platform']
+    assert platforms[0] == 'manylinux_2_34_aarch64'
+    assert platforms[-2:] == ['manylinux_2_17_aarch64',
+                              'manylinux2014_aarch64']
+    assert len(platforms) == 19
+    assert args[-8:] == ['--python-version', '3.12',
+                         '--implementation', 'cp',
+                         '--abi', 'cp312',
+                         '--only-binary', ':all:']
+
+
+@pytest.mark.parametrize('relpath,contents,kept', [
+    ('simplejson/_speedups.cpython-311-x86_64-linux-gnu.so',
+     elf_header(62), True),
+    ('cryptography/hazmat/bindings/_rust.abi3.so', elf_header(62), True),
+    ('package/_untagged.so', elf_header(62), True),
+    ('package/module.py', b'', True),
+    ('package.libs/libz-abcdef12.so.1.2.13', elf_header(183), True),
+    ('numpy.libs/libopenblas64_p-r0-0cf96a72.3.23.dev.so',
+     elf_header(62), True),
+    ('shapely.libs/libgeos-3.11.so', elf_header(62), True),
+    ('shapely.libs/libgeos-3.11.so', elf_header(183), False),
+    ('simplejson/_speedups.cpython-311-x86_64-linux-gnu.so',
+     elf_header(183), False),
+    ('simplejson/_speedups.cpython-310-x86_64-linux-gnu.so',
+     elf_header(62), False),
+    ('simplejson/_speedups.cpython-311-aarch64-linux-gnu.so',
+     elf_header(183), False),
+    ('simplejson/_speedups.cpython-311-darwin.so', b'', False),
+    ('simplejson/_speedups.cp311-win_amd64.pyd', b'MZ', False),
+])
+def test_not_foreign_extension_module(tmpdir, relpath, contents, kept,
+                                      fake_logger):
+    """
+    :py:meth:`betareduce._target.Target.not_foreign_extension_module`
+    excludes only extension modules built for another Python or
+    machine.
+    """
+    fake_logger, captured = fake_logger
+    target = T.Target((3, 11))
+    filename = write(tmpdir, relpath, contents)
+    assert target.not_foreign_extension_module(
+        filename, _logger=fake_logger) is kept
+    assert bool(captured) is not kept
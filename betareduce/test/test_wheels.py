@@ -0,0 +1,194 @@
+from .. import _wheels as W
+from .test_core import Call, fake_logger  # noqa: F401
+import os
+import pytest
+import stat
+import zipfile
+
+
+def make_wheel(directory, filename, members):
+    """
+    Write a wheel called ``filename`` into ``directory`` containing
+    ``members``, a :py:class:`list` of ``(arcname, contents, mode)``
+    triples, and return its path.
+    """
+    path = os.path.join(directory, filename)
+    with zipfile.ZipFile(path, 'w') as zip_obj:
+        for arcname, contents, mode in members:
+            zinfo = zipfile.ZipInfo(arcname)
+            zinfo.external_attr = (stat.S_IFREG | mode) << 16
+            zip_obj.writestr(zinfo, contents)
+    return path
+
+
+@pytest.fixture
+def wheel(tmpdir):
+    return make_wheel(str(tmpdir), 'demo_pkg-1.0-py3-none-any.whl', [
+        ('demo_pkg/__init__.py', 'init', 0o644),
+        ('demo_pkg/tool.sh', 'tool', 0o755),
+        ('demo_pkg-1.0.dist-info/RECORD', 'record', 0o644),
+        ('demo_pkg-1.0.data/purelib/extra.py', 'extra', 0o644),
+        ('demo_pkg-1.0.data/platlib/native.py', 'native', 0o644),
+        ('demo_pkg-1.0.data/scripts/demo', 'script', 0o755),
+        ('demo_pkg-1.0.data/headers/demo.h', 'header', 0o644),
+    ])
+
+
+def tree(root):
+    return sorted(os.path.relpath(os.path.join(dirpath, filename), root)
+                  for dirpath, _, filenames in os.walk(root)
+                  for filename in filenames)
+
+
+def test_unpack_wheel(wheel, tmpdir):
+    """
+    :py:func:`betareduce._wheels.unpack_wheel` extracts a wheel's
+    libraries into ``root``, keeping execute permissions and leaving
+    out scripts, headers and data.
+    """
+    root = str(tmpdir.mkdir('root'))
+    assert W.unpack_wheel(wheel, root) == 5
+    assert tree(root) == [
+        os.path.join('demo_pkg-1.0.dist-info', 'RECORD'),
+        os.path.join('demo_pkg', '__init__.py'),
+        os.path.join('demo_pkg', 'tool.sh'),
+        'extra.py',
+        'native.py',
+    ]
+    with open(os.path.join(root, 'extra.py')) as f:
+        assert f.read() == 'extra'
+    assert os.stat(os.path.join(root, 'demo_pkg', 'tool.sh')).st_mode & 0o111
+
+
+@pytest.mark.parametrize('arcname', ['../escape.py',
+                                     'demo-1.0.data/purelib/../../x.py'])
+def test_unpack_wheel_escape(tmpdir, arcname):
+    """
+    :py:func:`betareduce._wheels.unpack_wheel` refuses to write
+    outside ``root``.
+    """
+    wheel = make_wheel(str(tmpdir), 'demo-1.0-py3-none-any.whl',
+                       [(arcname, 'x', 0o644)])
+    root = str(tmpdir.mkdir('root'))
+    with pytest.raises(zipfile.BadZipFile):
+        W.unpack_wheel(wheel, root)
+
+
+class TestWheelhouse(object):
+    """
+    Tests for :py:class:`betareduce._wheels.Wheelhouse`
+    """
+
+    @pytest.fixture
+    def wheelhouse(self, tmpdir):
+        return W.Wheelhouse(str(tmpdir.join('wheelhouse')),
+                            _cache_key=lambda pip_args: '-'.join(pip_args))
+
+    @pytest.fixture
+    def fake_pip_wheel_and_calls(self):
+        """
+        A fake :py:func:`subprocess.check_output` that builds a wheel
+        into ``pip wheel``'s ``--wheel-dir``, and its calls.
+        """
+        calls = []
+
+        def fake_check_output(cmd, stderr):
+            calls.append(cmd)
+            wheel_dir = cmd[cmd.index(cmd[2]) + 1]
+            make_wheel(wheel_dir, 'demo_pkg-1.0-py3-none-any.whl',
+                       [('demo_pkg/__init__.py', 'init', 0o644)])
+            return b'Saved demo_pkg-1.0-py3-none-any.whl'
+
+        return fake_check_output, calls
+
+    def test_resolve(self, wheelhouse, fake_pip_wheel_and_calls,
+                     fake_logger):
+        """
+        :py:meth:`betareduce._wheels.Wheelhouse.resolve` builds wheels
+        with ``pip wheel``, preferring the wheelhouse's, and locks
+        them.
+        """
+        fake_check_output, calls = fake_pip_wheel_and_calls
+        fake_logger, captured = fake_logger
+        wheel = os.path.join(wheelhouse.directory,
+                             'demo_pkg-1.0-py3-none-any.whl')
+
+        assert wheelhouse.locked('key') is None
+        assert wheelhouse.resolve(['demo_pkg'], 'key',
+                                  _check_output=fake_check_output,
+                                  _logger=fake_logger) == [wheel]
+        [cmd] = calls
+        assert cmd[:2] == ['pip', 'wheel']
+        assert cmd[-3:] == ['--find-links', wheelhouse.directory,
+                            'demo_pkg']
+        assert wheelhouse.locked('key') == [wheel]
+        assert sorted(os.listdir(wheelhouse.directory)) == [
+            'demo_pkg-1.0-py3-none-any.whl', 'locks']
+
+    def test_resolve_download(self, wheelhouse, fake_pip_wheel_and_calls):
+        """
+        A wheelhouse that downloads resolves with ``pip download``.
+        """
+        fake_check_output, calls = fake_pip_wheel_and_calls
+        wheelhouse.download = True
+        wheelhouse.resolve(['demo_pkg'], 'key',
+                           _check_output=fake_check_output)
+        [cmd] = calls
+        assert cmd[:3] == ['pip', 'download', '--dest']
+        assert wheelhouse.locked('key') == [
+            os.path.join(wheelhouse.directory,
+                         'demo_pkg-1.0-py3-none-any.whl')]
+
+    def test_locked_missing_wheel(self, wheelhouse,
+                                  fake_pip_wheel_and_calls):
+        """
+        A lock is ignored if a wheel it names has gone.
+        """
+        fake_check_output, calls = fake_pip_wheel_and_calls
+        [wheel] = wheelhouse.resolve(['demo_pkg'], 'key',
+                                     _check_output=fake_check_output)
+        os.remove(wheel)
+        assert wheelhouse.locked('key') is None
+
+    def test_install(self, wheelhouse, wheel, tmpdir, fake_logger):
+        """
+        :py:meth:`betareduce._wheels.Wheelhouse.install` resolves
+        requirements that aren't locked, and unpacks the locked
+        wheels into ``root``.
+        """
+        fake_logger, captured = fake_logger
+        resolved = []
+        unpacked = []
+
+        def fake_resolve(pip_args, key):
+            resolved.append((pip_args, key))
+            return [wheel]
+
+        def fake_unpack_wheel(wheel, root):
+            unpacked.append(Call(args=(wheel, root), kwargs={}))
+            return 5
+
+        wheelhouse.resolve = fake_resolve
+        wheelhouse.install(['-r', 'reqs.txt'], 'root', jobs=2,
+                           _unpack_wheel=fake_unpack_wheel,
+                           _logger=fake_logger)
+        assert resolved == [(['-r', 'reqs.txt'], '-r-reqs.txt')]
+        assert unpacked == [Call(args=(wheel, 'root'), kwargs={})]
+        assert captured['info'][-1].args[1:] == (5, 1, 'root')
+
+    def test_install_locked(self, wheelhouse, fake_pip_wheel_and_calls,
+                            tmpdir):
+        """
+        Locked requirements are installed without running ``pip``.
+        """
+        fake_check_output, calls = fake_pip_wheel_and_calls
+        wheelhouse.resolve(['demo_pkg'], 'demo_pkg',
+                           _check_output=fake_check_output)
+
+        def refuse_resolve(pip_args, key):
+            raise AssertionError("resolved locked requirements")
+
+        wheelhouse.resolve = refuse_resolve
+        root = str(tmpdir.mkdir('root'))
+        wheelhouse.install(['demo_pkg'], root)
+        assert tree(root) == [os.path.join('demo_pkg', '__init__.py')]
@@ -0,0 +1,617 @@
+from .. import _files
+from .. import _zip as Z
+import errno
+import io
+import mmap
+import os
+import pytest
+import random
+import zipfile
+
+
+@pytest.fixture
+def member_files(tmpdir):
+    """
+    Create files of assorted sizes and contents and return a
+    :py:class:`list` of ``(filename, arcname)`` pairs for them.
+    """
+    rng = random.Random(0)
+    contents = [
+        ('empty.txt', b''),
+        ('small.py', b'print("hello")\n'),
+        (u'caf\xe9.txt', b'unicode name'),
+        ('pkg/text.txt', b'lorem ipsum ' * 20000),
+        ('pkg/random.bin', bytes(rng.getrandbits(8)
+                                 for _ in range(Z.CHUNK_SIZE * 3 + 7))),
+    ]
+    members = []
+    for arcname, data in contents:
+        filename = os.path.join(str(tmpdir), arcname)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'wb') as f:
+            f.write(data)
+        members.append((filename, arcname))
+    return members
+
+
+def serial_archive(members, compression, compresslevel=None):
+    """
+    Returns the bytes of an archive written with
+    :py:meth:`zipfile.ZipFile.write`.
+    """
+    fileobj = io.BytesIO()
+    with zipfile.ZipFile(fileobj, 'w', compression,
+                         compresslevel=compresslevel) as zip_obj:
+        for filename, arcname in members:
+            zip_obj.write(filename, arcname)
+    return fileobj.getvalue()
+
+
+@pytest.mark.parametrize('compression,compresslevel', [
+    (zipfile.ZIP_STORED, None),
+    (zipfile.ZIP_DEFLATED, None),
+    (zipfile.ZIP_DEFLATED, 1),
+    (zipfile.ZIP_DEFLATED, 9),
+    (zipfile.ZIP_BZIP2, None),
+])
+@pytest.mark.parametrize('jobs', [1, 2, 8])
+def test_write_members_identical_to_serial(member_files,
+                                           compression, compresslevel,
+                                           jobs):
+    """
+    :py:func:`betareduce._zip.write_members` produces the same bytes
+    as :py:meth:`zipfile.ZipFile.write` regardless of ``jobs``.
+    """
+    fileobj = io.BytesIO()
+    with zipfile.ZipFile(fileobj, 'w', compression,
+                         compresslevel=compresslevel) as zip_obj:
+        Z.write_members(zip_obj, member_files, jobs)
+
+    assert fileobj.getvalue() == serial_archive(member_files,
+                                                compression, compresslevel)
+    with zipfile.ZipFile(fileobj) as zip_obj:
+        assert zip_obj.testzip() is None
+
+
+def test_write_compressed_rejects_open_handle(member_files):
+    """
+    :py:func:`betareduce._zip.write_compressed` refuses to write
+    while another member is being written.
+    """
+    [(filename, arcname)] = member_files[1:2]
+    zinfo, data = Z.compress(filename, arcname, zipfile.ZIP_STORED, None)
+    with zipfile.ZipFile(io.BytesIO(), 'w') as zip_obj:
+        with zip_obj.open('other', 'w'):
+            with pytest.raises(ValueError):
+                Z.write_compressed(zip_obj, zinfo, data)
+
+
+class Unseekable(object):
+    """
+    A file-like object that, like a pipe or socket, can only be
+    written to.
+    """
+
+    def __init__(self):
+        self.written = io.BytesIO()
+
+    def write(self, data):
+        return self.written.write(data)
+
+    def flush(self):
+        pass
+
+
+@pytest.mark.parametrize('threshold', [0, Z.STREAM_THRESHOLD])
+@pytest.mark.parametrize('compression', [zipfile.ZIP_STORED,
+                                         zipfile.ZIP_DEFLATED])
+def test_write_members_unseekable(member_files, threshold, compression):
+    """
+    :py:func:`betareduce._zip.write_members` writes valid archives to
+    unseekable files, whether members are compressed in memory or
+    streamed.
+    """
+    fileobj = Unseekable()
+    with zipfile.ZipFile(fileobj, 'w', compression) as zip_obj:
+        Z.write_members(zip_obj, member_files, 2, threshold=threshold)
+
+    with zipfile.ZipFile(io.BytesIO(fileobj.written.getvalue())) as zip_obj:
+        assert zip_obj.testzip() is None
+        assert zip_obj.namelist() == [arcname for _, arcname in member_files]
+        for filename, arcname in member_files:
+            with open(filename, 'rb') as f:
+                assert zip_obj.read(arcname) == f.read()
+
+
+def test_write_members_streams_large_files(member_files):
+    """
+    :py:func:`betareduce._zip.write_members` streams files larger
+    than ``threshold`` in order rather than compressing them in
+    memory.
+    """
+    streamed = []
+
+    def fake_stream(zip_obj, filename, arcname, date_time):
+        streamed.append(arcname)
+        Z.stream(zip_obj, filename, arcname, date_time)
+
+    fileobj = io.BytesIO()
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as zip_obj:
+        Z.write_members(zip_obj, member_files, 2, threshold=1024,
+                        _stream=fake_stream)
+
+    assert streamed == ['pkg/text.txt', 'pkg/random.bin']
+    assert fileobj.getvalue() == serial_archive(member_files,
+                                                zipfile.ZIP_DEFLATED)
+
+
+@pytest.mark.parametrize('compression', [zipfile.ZIP_BZIP2,
+                                         zipfile.ZIP_LZMA])
+def test_write_members_serial_streams(member_files, compression):
+    """
+    :py:func:`betareduce._zip.write_members` streams every member
+    with ``_stream`` when ``zip_obj``'s compression can't run
+    concurrently.
+    """
+    streamed = []
+
+    def fake_stream(zip_obj, filename, arcname, date_time):
+        streamed.append(arcname)
+        Z.stream(zip_obj, filename, arcname, date_time)
+
+    fileobj = io.BytesIO()
+    with zipfile.ZipFile(fileobj, 'w', compression) as zip_obj:
+        Z.write_members(zip_obj, member_files, 2, _stream=fake_stream)
+
+    assert streamed == [arcname for _, arcname in member_files]
+
+
+def test_compression_cache(member_files):
+    """
+    :py:class:`betareduce._zip.CompressionCache` compresses contents
+    with the same :py:meth:`~betareduce._zip.CompressionCache.key`
+    once, and never shares those without one.
+    """
+    class FirstByteCache(Z.CompressionCache):
+        def key(self, filename):
+            with open(filename, 'rb') as f:
+                return f.read(1) or None
+
+    cache = FirstByteCache(max_size=Z.STREAM_THRESHOLD)
+    compressed = []
+
+    def recording_compress(filename, *args):
+        compressed.append(filename)
+        return Z.compress(filename, *args)
+
+    for filename, arcname in member_files * 2:
+        zinfo, data = cache.compress(filename, arcname,
+                                     zipfile.ZIP_DEFLATED, None,
+                                     _compress=recording_compress)
+        assert zinfo.filename == arcname
+    assert cache.hits == len(member_files) - 1
+    assert compressed == [filename for filename, _ in member_files] + [
+        member_files[0][0]]
+
+
+@pytest.mark.parametrize('compression', [zipfile.ZIP_STORED,
+                                         zipfile.ZIP_DEFLATED])
+def test_write_members_streams_large_stored(member_files, tmpdir,
+                                            compression):
+    """
+    :py:func:`betareduce._zip.write_members` streams members stored
+    uncompressed of at least :py:data:`betareduce._zip.MAP_THRESHOLD`
+    bytes, however small ``threshold`` leaves them.
+    """
+    archive = str(tmpdir.join('data.zip'))
+    with open(archive, 'wb') as f:
+        f.write(os.urandom(Z.MAP_THRESHOLD))
+    members = member_files + [(archive, 'data.zip')]
+    streamed = []
+
+    def fake_stream(zip_obj, filename, arcname, date_time):
+        streamed.append(arcname)
+        Z.stream(zip_obj, filename, arcname, date_time)
+
+    fileobj = io.BytesIO()
+    with zipfile.ZipFile(fileobj, 'w', compression) as zip_obj:
+        Z.write_members(zip_obj, members, 2, _stream=fake_stream)
+
+    assert streamed == ['data.zip']
+    with zipfile.ZipFile(fileobj) as zip_obj:
+        assert zip_obj.testzip() is None
+
+
+def test_write_compressed_chunks(member_files):
+    """
+    :py:func:`betareduce._zip.write_compressed` accepts the
+    compressed data as an iterable of chunks.
+    """
+    filename, arcname = member_files[3]
+    zinfo, data = Z.compress(filename, arcname, zipfile.ZIP_DEFLATED, None)
+    fileobj = io.BytesIO()
+    with zipfile.ZipFile(fileobj, 'w') as zip_obj:
+        Z.write_compressed(zip_obj, zinfo,
+                           (data[i:i + 100] for i in range(0, len(data), 100)))
+    with zipfile.ZipFile(fileobj) as zip_obj:
+        assert zip_obj.testzip() is None
+
+
+@pytest.mark.parametrize('compression,threshold', [
+    (zipfile.ZIP_DEFLATED, Z.STREAM_THRESHOLD),
+    (zipfile.ZIP_DEFLATED, 0),
+    (zipfile.ZIP_BZIP2, Z.STREAM_THRESHOLD),
+])
+def test_write_members_written(member_files, compression, threshold):
+    """
+    :py:func:`betareduce._zip.write_members` reports each member once
+    it's written.
+    """
+    written = []
+    with zipfile.ZipFile(io.BytesIO(), 'w', compression) as zip_obj:
+        Z.write_members(zip_obj, member_files, 2, threshold=threshold,
+                        written=written.append)
+        assert written == zip_obj.infolist()
+
+
+@pytest.mark.parametrize('environ,date_time', [
+    ({}, Z.EARLIEST_DATE_TIME),
+    ({'SOURCE_DATE_EPOCH': '1580644800'}, (2020, 2, 2, 12, 0, 0)),
+    ({'SOURCE_DATE_EPOCH': '0'}, Z.EARLIEST_DATE_TIME),
+])
+def test_source_date_time(environ, date_time):
+    """
+    :py:func:`betareduce._zip.source_date_time` honors
+    ``SOURCE_DATE_EPOCH`` and never precedes what a Zip file can
+    record.
+    """
+    assert Z.source_date_time(_environ=environ) == date_time
+
+
+def test_source_date_time_invalid():
+    """
+    :py:func:`betareduce._zip.source_date_time` rejects a
+    ``SOURCE_DATE_EPOCH`` that isn't an integer.
+    """
+    with pytest.raises(ValueError):
+        Z.source_date_time(_environ={'SOURCE_DATE_EPOCH': 'yesterday'})
+
+
+@pytest.mark.parametrize('compression', [
+    zipfile.ZIP_STORED,
+    zipfile.ZIP_DEFLATED,
+    zipfile.ZIP_BZIP2,
+])
+@pytest.mark.parametrize('threshold', [0, Z.STREAM_THRESHOLD])
+def test_write_members_date_time(member_files, compression, threshold):
+    """
+    :py:func:`betareduce._zip.write_members` gives every member
+    ``date_time`` and normalized permissions, whether it's
+    compressed in memory or streamed.
+    """
+    date_time = (2020, 2, 2, 12, 0, 0)
+    for filename, _ in member_files:
+        os.chmod(filename, 0o600)
+    os.chmod(member_files[1][0], 0o750)
+    fileobj = io.BytesIO()
+    with zipfile.ZipFile(fileobj, 'w', compression) as zip_obj:
+        Z.write_members(zip_obj, member_files, 2, threshold=threshold,
+                        date_time=date_time)
+
+    with zipfile.ZipFile(fileobj) as zip_obj:
+        assert zip_obj.testzip() is None
+        infos = zip_obj.infolist()
+    assert set(info.date_time for info in infos) == {date_time}
+    assert [info.external_attr >> 16 for info in infos] == [
+        0o100444, 0o100555, 0o100444, 0o100444, 0o100444]
+
+
+def test_member_info(member_files):
+    """
+    :py:func:`betareduce._zip.member_info` describes a file as
+    :py:meth:`zipfile.ZipInfo.from_file` does, using a
+    :py:class:`betareduce._files.FileRecord`'s metadata rather than
+    statting it again.
+    """
+    for filename, arcname in member_files:
+        expected = zipfile.ZipInfo.from_file(filename, arcname)
+        record = _files.FileRecord(filename, arcname, os.stat(filename))
+        os.utime(filename, (0, 1000000000))
+        zinfo = Z.member_info(record, arcname)
+        assert ((zinfo.filename, zinfo.date_time, zinfo.file_size,
+                 zinfo.external_attr) ==
+                (expected.filename, expected.date_time, expected.file_size,
+                 expected.external_attr))
+
+
+@pytest.mark.parametrize('arcname,compression,expected', [
+    ('module.py', (zipfile.ZIP_DEFLATED, 9), (zipfile.ZIP_DEFLATED, 9)),
+    ('logo.PNG', (zipfile.ZIP_DEFLATED, 9), (zipfile.ZIP_STORED, None)),
+    ('pkg/vendored.whl', (zipfile.ZIP_DEFLATED, 1),
+     (zipfile.ZIP_STORED, None)),
+    ('data.tar.gz', (zipfile.ZIP_BZIP2, None), (zipfile.ZIP_STORED, None)),
+    ('logo.png', (zipfile.ZIP_STORED, None), (zipfile.ZIP_STORED, None)),
+])
+def test_member_compression(arcname, compression, expected):
+    """
+    :py:func:`betareduce._zip.member_compression` stores files whose
+    contents are already compressed.
+    """
+    assert Z.member_compression(arcname, *compression) == expected
+
+
+def test_compression_preset():
+    """
+    :py:func:`betareduce._zip.compression_preset` looks presets up by
+    name and rejects unknown ones.
+    """
+    assert Z.compression_preset('smallest') == (zipfile.ZIP_DEFLATED, 9)
+    with pytest.raises(ValueError):
+        Z.compression_preset('tiny')
+
+
+def test_member_compression_stored_suffixes():
+    """
+    :py:func:`betareduce._zip.member_compression` stores members with
+    the suffixes given.
+    """
+    assert Z.member_compression('mod.pyc', zipfile.ZIP_DEFLATED, 6) == (
+        zipfile.ZIP_DEFLATED, 6)
+    assert Z.member_compression('mod.pyc', zipfile.ZIP_DEFLATED, 6,
+                                Z.ZIPIMPORT_STORED_SUFFIXES) == (
+        zipfile.ZIP_STORED, None)
+
+
+def test_zipimport_key():
+    """
+    :py:func:`betareduce._zip.zipimport_key` clusters each package's
+    members, ``__init__`` first and bytecode before source.
+    """
+    arcnames = ['pkg/sub/a.py', 'pkg0.py', 'pkg/b.py', 'pkg/__init__.py',
+                'pkg/b.pyc', 'six.py', 'pkg/__init__.pyc', 'pkg/a.txt',
+                'pkg0/x.py']
+    assert sorted(arcnames, key=Z.zipimport_key) == [
+        'pkg0.py', 'six.py', 'pkg/__init__.pyc', 'pkg/__init__.py',
+        'pkg/a.txt', 'pkg/b.pyc', 'pkg/b.py', 'pkg/sub/a.py', 'pkg0/x.py']
+
+
+def test_layout_class():
+    """
+    :py:func:`betareduce._zip.layout_class` looks layouts up by name
+    and rejects unknown ones.
+    """
+    assert Z.layout_class('zipimport') is Z.ZipimportZipFile
+    with pytest.raises(ValueError):
+        Z.layout_class('scattered')
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_zipimport_zip_file(tmpdir, jobs):
+    """
+    :py:class:`betareduce._zip.ZipimportZipFile` stores bytecode and
+    sorts its central directory.
+    """
+    members = []
+    for arcname in ['pkg/mod.py', 'pkg/mod.pyc', 'pkg/__init__.py']:
+        filename = str(tmpdir.join(arcname.replace('/', '_')))
+        with open(filename, 'wb') as f:
+            f.write(b'compressible ' * 1000)
+        members.append((filename, arcname))
+
+    fileobj = io.BytesIO()
+    with Z.ZipimportZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as zip_obj:
+        Z.write_members(zip_obj, members[:2], jobs)
+        Z.stream(zip_obj, *members[2])
+
+    with zipfile.ZipFile(fileobj) as zip_obj:
+        assert zip_obj.testzip() is None
+        assert [(zinfo.filename, zinfo.compress_type)
+                for zinfo in zip_obj.infolist()] == [
+            ('pkg/__init__.py', zipfile.ZIP_DEFLATED),
+            ('pkg/mod.pyc', zipfile.ZIP_STORED),
+            ('pkg/mod.py', zipfile.ZIP_DEFLATED)]
+
+
+@pytest.mark.parametrize('threshold', [0, Z.STREAM_THRESHOLD])
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_write_members_stores_compressed(tmpdir, threshold, jobs):
+    """
+    :py:func:`betareduce._zip.write_members` stores members that are
+    already compressed, whether they're compressed in memory or
+    streamed, and deflates the rest.
+    """
+    members = []
+    for arcname in ['module.py', 'archive.zip']:
+        filename = str(tmpdir.join(arcname))
+        with open(filename, 'wb') as f:
+            f.write(b'compressible ' * 1000)
+        members.append((filename, arcname))
+
+    fileobj = io.BytesIO()
+    with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED,
+                         compresslevel=6) as zip_obj:
+        Z.write_members(zip_obj, members, jobs, threshold=threshold)
+
+    with zipfile.ZipFile(fileobj) as zip_obj:
+        assert zip_obj.testzip() is None
+        assert [zinfo.compress_type for zinfo in zip_obj.infolist()] == [
+            zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED]
+
+
+@pytest.fixture
+def large_files(tmpdir):
+    """
+    Create files larger than :py:data:`betareduce._zip.MAP_THRESHOLD`
+    and return a :py:class:`list` of ``(filename, arcname)`` pairs for
+    them.
+    """
+    rng = random.Random(0)
+    members = []
+    for arcname, data in [
+            ('model.bin', rng.randbytes(Z.MAP_THRESHOLD + 7)),
+            ('botocore.json', b'{"shape": "string"}\n' * 60000),
+    ]:
+        filename = str(tmpdir.join(arcname))
+        with open(filename, 'wb') as f:
+            f.write(data)
+        members.append((filename, arcname))
+    return members
+
+
+@pytest.mark.parametrize('compression', [zipfile.ZIP_STORED,
+                                         zipfile.ZIP_DEFLATED])
+@pytest.mark.parametrize('to_file', [True, False])
+def test_stream_large_identical_to_serial(tmpdir, large_files,
+                                          compression, to_file):
+    """
+    :py:func:`betareduce._zip.stream` writes memory-mapped and
+    kernel-copied members exactly as :py:meth:`zipfile.ZipFile.write`
+    does, whether the archive is a file or in memory.
+    """
+    fileobj = io.BytesIO()
+    if to_file:
+        fileobj = open(str(tmpdir.join('archive.zip')), 'w+b')
+    with fileobj, zipfile.ZipFile(fileobj, 'w', compression) as zip_obj:
+        for filename, arcname in large_files:
+            Z.stream(zip_obj, filename, arcname)
+        zip_obj.close()
+        fileobj.seek(0)
+        assert fileobj.read() == serial_archive(large_files, compression)
+
+
+def test_copy_stored_falls_back(large_files):
+    """
+    :py:func:`betareduce._zip.copy_stored` writes whatever
+    :py:func:`betareduce._zip.copy_range` couldn't copy.
+    """
+    filename, arcname = large_files[0]
+    copied = []
+
+    def fake_copy_range(src, dest, count):
+        dest.write(src.read(100))
+        copied.append(count)
+        return 100
+
+    fileobj = io.BytesIO()
+    with zipfile.ZipFile(fileobj, 'w') as zip_obj:
+        zinfo = Z.member_info(filename, arcname)
+        with open(filename, 'rb') as src:
+            Z.copy_stored(zip_obj, zinfo, src, _copy_range=fake_copy_range)
+
+    assert copied == [os.path.getsize(filename)]
+    assert fileobj.getvalue() == serial_archive(large_files[:1],
+                                                zipfile.ZIP_STORED)
+
+
+class TestCopyRange(object):
+    """
+    Tests for :py:func:`betareduce._zip.copy_range`
+    """
+
+    @pytest.fixture
+    def files(self, tmpdir):
+        src = tmpdir.join('src')
+        src.write_binary(b'0123456789')
+        with open(str(src), 'rb') as src, \
+                open(str(tmpdir.join('dest')), 'w+b') as dest:
+            dest.write(b'header')
+            yield src, dest
+
+    def read(self, dest):
+        dest.seek(0)
+        return dest.read()
+
+    def failing(self, error):
+        def copier(src, dest, offset, position, count):
+            raise OSError(error, os.strerror(error))
+        return copier
+
+    def partial(self, src, dest, offset, position, count):
+        return Z._sendfile(src, dest, offset, position, min(count, 3))
+
+    @pytest.mark.parametrize('copier', Z.COPIERS)
+    def test_copies(self, files, copier):
+        """
+        :py:func:`betareduce._zip.copy_range` copies with each of
+        :py:data:`betareduce._zip.COPIERS` and leaves the destination
+        after what it copied.
+        """
+        src, dest = files
+        assert Z.copy_range(src, dest, 10, _copiers=[copier]) == 10
+        assert dest.tell() == 16
+        assert self.read(dest) == b'header0123456789'
+
+    def test_next_copier(self, files):
+        """
+        :py:func:`betareduce._zip.copy_range` carries on with the next
+        copier when one can't copy between the files.
+        """
+        src, dest = files
+        copiers = [self.failing(errno.EXDEV), self.partial]
+        assert Z.copy_range(src, dest, 10, _copiers=copiers) == 10
+        assert self.read(dest) == b'header0123456789'
+
+    def test_short(self, files):
+        """
+        :py:func:`betareduce._zip.copy_range` stops at the end of the
+        source.
+        """
+        src, dest = files
+        assert Z.copy_range(src, dest, 20) == 10
+        assert self.read(dest) == b'header0123456789'
+
+    def test_unsupported(self, files):
+        """
+        :py:func:`betareduce._zip.copy_range` reports copying nothing
+        when no copier can copy between the files, or they aren't
+        files at all.
+        """
+        src, dest = files
+        copiers = [self.failing(errno.EINVAL), self.failing(errno.ENOSYS)]
+        assert Z.copy_range(src, dest, 10, _copiers=copiers) == 0
+        assert dest.tell() == 6
+        assert Z.copy_range(src, io.BytesIO(), 10) == 0
+
+    def test_error(self, files):
+        """
+        :py:func:`betareduce._zip.copy_range` raises other errors.
+        """
+        src, dest = files
+        with pytest.raises(OSError):
+            Z.copy_range(src, dest, 10,
+                         _copiers=[self.failing(errno.ENOSPC)])
+
+
+@pytest.mark.parametrize('size,offset', [
+    (10, 3),
+    (Z.MAP_THRESHOLD, 3),
+    (Z.MAP_THRESHOLD + 5, mmap.ALLOCATIONGRANULARITY * 3 + 1),
+])
+def test_read_chunks(tmpdir, monkeypatch, size, offset):
+    """
+    :py:func:`betareduce._zip.read_chunks` yields a file's contents
+    from an offset, memory-mapped a window at a time or not.
+    """
+    monkeypatch.setattr(Z, 'MAP_WINDOW', mmap.ALLOCATIONGRANULARITY * 2)
+    path = tmpdir.join('data')
+    data = bytes(range(256)) * (size // 256 + 1)
+    path.write_binary(data[:size])
+    with open(str(path), 'rb') as f:
+        chunks = Z.read_chunks(f, size, offset=offset)
+        assert b''.join(bytes(chunk) for chunk in chunks) == (
+            data[offset:size])
+
+
+def test_read_chunks_unmappable(tmpdir):
+    """
+    :py:func:`betareduce._zip.read_chunks` reads files it can't map.
+    """
+    def fake_mmap(fileno, length, access, offset):
+        raise OSError(errno.ENODEV, 'unmappable')
+
+    path = tmpdir.join('data')
+    path.write_binary(b'x' * Z.MAP_THRESHOLD)
+    with open(str(path), 'rb') as f:
+        assert sum(len(chunk) for chunk in Z.read_chunks(
+            f, Z.MAP_THRESHOLD, _mmap=fake_mmap)) == Z.MAP_THRESHOLD
@@ -7,6 +7,7 @@ setup(name="betareduce",
           'console_scripts':
           [
               'betareduce = betareduce._cli:run',
+              'betareduce-batch = betareduce._cli:run_batch',
           ],
       },
       packages=find_packages())